@@ -1,4 +1,9 @@
-from typing import Optional, List
+import heapq
+import os
+import sys
+import tempfile
+from array import array
+from typing import Dict, Iterable, Iterator, Optional, List, Tuple
 
 
 class BED:
@@ -28,9 +33,294 @@ def load_bed(bed_file: str):
             if line.startswith("#") or line.startswith("browser") or line.startswith("track"):
                 header.append(line)
             else:
-                line = line.split("\t")
-                entry = BED.Entry(chrom=line[0], chrom_start=int(line[1]), chrom_end=int(line[2]), name=line[3],
-                                  score=line[4], strand=line[5], thick_start=int(line[6]), thick_end=int(line[7]))
+                line = line.rstrip("\n").split("\t")
+                # only the first three BED columns are required, the remaining columns get BED-style defaults
+                chrom_start = int(line[1])
+                chrom_end = int(line[2])
+                entry = BED.Entry(chrom=line[0], chrom_start=chrom_start, chrom_end=chrom_end,
+                                  name=line[3] if len(line) > 3 else "", score=line[4] if len(line) > 4 else "",
+                                  strand=line[5] if len(line) > 5 else "",
+                                  thick_start=int(line[6]) if len(line) > 6 else chrom_start,
+                                  thick_end=int(line[7]) if len(line) > 7 else chrom_end)
                 entries.append(entry)
 
         return BED(bed_file, header, entries)
+
+
+# BED intervals stored per chromosome as parallel arrays instead of one BED.Entry per line. Only the coordinates are
+# kept (the name, score and strand columns are not used for coverage BED files); thickStart/thickEnd are optional.
+class ColumnarBED:
+    class Chromosome:
+        def __init__(self, chrom: str, include_thick: bool = False) -> None:
+            self.chrom: str = chrom
+            self.starts: array = array("q")
+            self.ends: array = array("q")
+            self.thick_starts: Optional[array] = array("q") if include_thick else None
+            self.thick_ends: Optional[array] = array("q") if include_thick else None
+
+        def __len__(self) -> int:
+            return len(self.starts)
+
+    def __init__(self, file_path: Optional[str], header: List[str],
+                 chromosomes: Dict[str, 'ColumnarBED.Chromosome']) -> None:
+        self.file_path: Optional[str] = file_path
+        # header lines are only read when the whole file is loaded
+        self.header: List[str] = header
+        self.chromosomes: Dict[str, ColumnarBED.Chromosome] = chromosomes
+
+    def __len__(self) -> int:
+        return sum(len(chromosome) for chromosome in self.chromosomes.values())
+
+
+bed_index_extension = ".idx"
+_bed_index_header = "#columnar_bed_index"
+bed_columns_extension = ".columns"
+_bed_columns_header = "#columnar_bed_columns"
+
+
+# The sidecar index of a BED file lists the byte ranges (offset and length) of the lines of every chromosome, one line
+# per contiguous run of lines. It records the size and modification time of the BED file it was built from and is
+# ignored once the BED file changes.
+def _get_bed_index_path(bed_file: str) -> str:
+    return bed_file + bed_index_extension
+
+
+def _read_bed_index(bed_file: str) -> Optional[Dict[str, List[Tuple[int, int]]]]:
+    index_path = _get_bed_index_path(bed_file)
+    if not os.path.exists(index_path):
+        return None
+    bed_stat = os.stat(bed_file)
+    with open(index_path, "r") as sr:
+        signature = sr.readline().rstrip("\n").split("\t")
+        if signature != [_bed_index_header, str(bed_stat.st_size), str(bed_stat.st_mtime_ns)]:
+            return None
+        ranges: Dict[str, List[Tuple[int, int]]] = {}
+        for line in sr:
+            chrom, offset, length = line.rstrip("\n").split("\t")
+            if chrom not in ranges:
+                ranges[chrom] = []
+            ranges[chrom].append((int(offset), int(length)))
+        return ranges
+
+
+def _write_bed_index(bed_file: str, ranges: List[Tuple[str, int, int]]) -> None:
+    bed_stat = os.stat(bed_file)
+    try:
+        with open(_get_bed_index_path(bed_file), "w") as sw:
+            sw.write(f"{_bed_index_header}\t{bed_stat.st_size}\t{bed_stat.st_mtime_ns}\n")
+            for chrom, offset, length in ranges:
+                sw.write(f"{chrom}\t{offset}\t{length}\n")
+    except OSError:
+        # the index only speeds up later loads, a read-only BED folder is not an error
+        pass
+
+
+# Parses the BED lines in data (starting at byte offset in the file) into chromosomes. Returns the header lines and the
+# byte range of every contiguous run of lines of the same chromosome.
+def _parse_bed_data(data: bytes, offset: int, chromosomes: Dict[str, ColumnarBED.Chromosome],
+                    include_thick: bool) -> Tuple[List[str], List[Tuple[str, int, int]]]:
+    header = []
+    ranges = []
+    current_chrom = None
+    current_chromosome = None
+    range_start = offset
+    line_start = offset
+    for line in data.splitlines(keepends=True):
+        line_end = line_start + len(line)
+        if line.startswith((b"#", b"browser", b"track")):
+            header.append(line.decode())
+        elif line.strip():
+            split = line.rstrip(b"\r\n").split(b"\t", 8 if include_thick else 3)
+            chrom = split[0].decode()
+            if chrom != current_chrom:
+                if current_chrom is not None:
+                    ranges.append((current_chrom, range_start, line_start - range_start))
+                current_chrom = chrom
+                range_start = line_start
+                if chrom not in chromosomes:
+                    chromosomes[chrom] = ColumnarBED.Chromosome(chrom, include_thick)
+                current_chromosome = chromosomes[chrom]
+            chrom_start = int(split[1])
+            chrom_end = int(split[2])
+            current_chromosome.starts.append(chrom_start)
+            current_chromosome.ends.append(chrom_end)
+            if include_thick:
+                current_chromosome.thick_starts.append(int(split[6]) if len(split) > 6 else chrom_start)
+                current_chromosome.thick_ends.append(int(split[7]) if len(split) > 7 else chrom_end)
+        line_start = line_end
+    if current_chrom is not None:
+        ranges.append((current_chrom, range_start, line_start - range_start))
+    return header, ranges
+
+
+# The sidecar column cache of a BED file holds the parsed arrays of a full load, so that reloading an unchanged BED file
+# reads the arrays back with array.fromfile instead of parsing every line. Like the index, it records the size and
+# modification time of the BED file (and the byte order of the arrays) and is ignored once the BED file changes. The
+# signature line is followed by the header lines, then by one "chrom<TAB>count" line per chromosome followed by its
+# starts and ends (and thickStarts and thickEnds when they were loaded).
+def _get_bed_columns_path(bed_file: str) -> str:
+    return bed_file + bed_columns_extension
+
+
+def _get_bed_columns_signature(bed_file: str) -> List[str]:
+    bed_stat = os.stat(bed_file)
+    return [_bed_columns_header, str(bed_stat.st_size), str(bed_stat.st_mtime_ns), sys.byteorder]
+
+
+def _read_bed_columns(bed_file: str,
+                      include_thick: bool) -> Optional[Tuple[List[str], Dict[str, ColumnarBED.Chromosome]]]:
+    columns_path = _get_bed_columns_path(bed_file)
+    if not os.path.exists(columns_path):
+        return None
+    try:
+        with open(columns_path, "rb") as sr:
+            signature = sr.readline().decode().rstrip("\n").split("\t")
+            if signature[:4] != _get_bed_columns_signature(bed_file) or len(signature) != 7:
+                return None
+            has_thick = signature[4] == "thick"
+            if include_thick and not has_thick:
+                return None
+            header = sr.read(int(signature[5])).decode().splitlines(keepends=True)
+            chromosomes: Dict[str, ColumnarBED.Chromosome] = {}
+            for _ in range(int(signature[6])):
+                chrom, count = sr.readline().decode().rstrip("\n").split("\t")
+                chromosome = ColumnarBED.Chromosome(chrom, include_thick)
+                chromosome.starts.fromfile(sr, int(count))
+                chromosome.ends.fromfile(sr, int(count))
+                if include_thick:
+                    chromosome.thick_starts.fromfile(sr, int(count))
+                    chromosome.thick_ends.fromfile(sr, int(count))
+                elif has_thick:
+                    sr.seek(2 * int(count) * chromosome.starts.itemsize, os.SEEK_CUR)
+                chromosomes[chrom] = chromosome
+            return header, chromosomes
+    except (OSError, ValueError, EOFError):
+        # a truncated or otherwise unreadable cache is rebuilt from the BED file
+        return None
+
+
+def _write_bed_columns(bed_file: str, header: List[str], chromosomes: Dict[str, ColumnarBED.Chromosome],
+                       include_thick: bool) -> None:
+    columns_path = _get_bed_columns_path(bed_file)
+    header_data = "".join(header).encode()
+    signature = _get_bed_columns_signature(bed_file) + ["thick" if include_thick else "",
+                                                        str(len(header_data)), str(len(chromosomes))]
+    try:
+        with open(columns_path + ".tmp", "wb") as sw:
+            sw.write(("\t".join(signature) + "\n").encode())
+            sw.write(header_data)
+            for chrom, chromosome in chromosomes.items():
+                sw.write(f"{chrom}\t{len(chromosome)}\n".encode())
+                chromosome.starts.tofile(sw)
+                chromosome.ends.tofile(sw)
+                if include_thick:
+                    chromosome.thick_starts.tofile(sw)
+                    chromosome.thick_ends.tofile(sw)
+        os.replace(columns_path + ".tmp", columns_path)
+    except OSError:
+        # like the index, the cache only speeds up later loads
+        pass
+
+
+# Loads a BED file into per-chromosome arrays. When only some chromosomes are requested and a valid index exists, only
+# the byte ranges of those chromosomes are read. Full loads read the column cache when it is valid; otherwise they parse
+# the file and, with write_index, write the index and the column cache for the next load.
+def load_columnar_bed(bed_file: str, chromosomes: Optional[Iterable[str]] = None, include_thick: bool = False,
+                      write_index: bool = True) -> ColumnarBED:
+    loaded_chromosomes: Dict[str, ColumnarBED.Chromosome] = {}
+    if chromosomes is not None:
+        index = _read_bed_index(bed_file)
+        if index is not None:
+            with open(bed_file, "rb") as sr:
+                for chrom in chromosomes:
+                    for offset, length in index.get(chrom, []):
+                        sr.seek(offset)
+                        _parse_bed_data(sr.read(length), offset, loaded_chromosomes, include_thick)
+            return ColumnarBED(bed_file, [], loaded_chromosomes)
+    else:
+        cached_columns = _read_bed_columns(bed_file, include_thick)
+        if cached_columns is not None:
+            header, loaded_chromosomes = cached_columns
+            return ColumnarBED(bed_file, header, loaded_chromosomes)
+
+    with open(bed_file, "rb") as sr:
+        header, ranges = _parse_bed_data(sr.read(), 0, loaded_chromosomes, include_thick)
+    if write_index:
+        _write_bed_index(bed_file, ranges)
+        _write_bed_columns(bed_file, header, loaded_chromosomes, include_thick)
+    if chromosomes is not None:
+        requested_chromosomes = set(chromosomes)
+        loaded_chromosomes = {chrom: chromosome for chrom, chromosome in loaded_chromosomes.items()
+                              if chrom in requested_chromosomes}
+    return ColumnarBED(bed_file, header, loaded_chromosomes)
+
+
+def _write_bed_sort_run(records: Iterable[Tuple[str, int, int, int]], run_path: str) -> None:
+    with open(run_path, "w") as sw:
+        for chrom, chrom_start, line_number, chrom_end in records:
+            sw.write(f"{chrom}\t{chrom_start}\t{line_number}\t{chrom_end}\n")
+
+
+def _read_bed_sort_run(run_path: str) -> Iterator[Tuple[str, int, int, int]]:
+    with open(run_path, "r") as sr:
+        for line in sr:
+            chrom, chrom_start, line_number, chrom_end = line.rstrip("\n").split("\t")
+            yield chrom, int(chrom_start), int(line_number), int(chrom_end)
+
+
+# Yields the intervals (chrom, chromStart, chromEnd) of a BED file sorted by chromosome name, then start, then position
+# in the file, in bounded memory. At most buffer_size intervals are sorted in memory at a time and written to a
+# temporary run file; the runs are then merged with a heap, at most max_merge_width runs at once (larger run counts are
+# merged in several passes). Files that fit in a single buffer are sorted without temporary files.
+def iter_sorted_bed_intervals(bed_file: str, buffer_size: int = 1000000, temp_directory: Optional[str] = None,
+                              max_merge_width: int = 64) -> Iterator[Tuple[str, int, int]]:
+    if buffer_size <= 0:
+        raise Exception(f"Invalid BED sort buffer size ({buffer_size})")
+    if max_merge_width < 2:
+        raise Exception(f"Invalid BED sort merge width ({max_merge_width})")
+
+    with tempfile.TemporaryDirectory(dir=temp_directory) as run_directory:
+        run_paths: List[str] = []
+        buffer: List[Tuple[str, int, int, int]] = []
+        with open(bed_file, "rb") as sr:
+            for line_number, line in enumerate(sr):
+                if line.startswith((b"#", b"browser", b"track")) or not line.strip():
+                    continue
+                split = line.split(b"\t", 3)
+                buffer.append((split[0].decode(), int(split[1]), line_number, int(split[2])))
+                if len(buffer) >= buffer_size:
+                    buffer.sort()
+                    run_paths.append(os.path.join(run_directory, f"run{len(run_paths)}.txt"))
+                    _write_bed_sort_run(buffer, run_paths[-1])
+                    buffer = []
+        buffer.sort()
+
+        if not run_paths:
+            for chrom, chrom_start, _, chrom_end in buffer:
+                yield chrom, chrom_start, chrom_end
+            return
+
+        if buffer:
+            run_paths.append(os.path.join(run_directory, f"run{len(run_paths)}.txt"))
+            _write_bed_sort_run(buffer, run_paths[-1])
+            buffer = []
+
+        merged_run_count = 0
+        while len(run_paths) > max_merge_width:
+            next_run_paths = []
+            for i in range(0, len(run_paths), max_merge_width):
+                group = run_paths[i:i + max_merge_width]
+                if len(group) == 1:
+                    next_run_paths.append(group[0])
+                    continue
+                merged_run_path = os.path.join(run_directory, f"merged{merged_run_count}.txt")
+                merged_run_count += 1
+                _write_bed_sort_run(heapq.merge(*(_read_bed_sort_run(run_path) for run_path in group)),
+                                    merged_run_path)
+                for run_path in group:
+                    os.remove(run_path)
+                next_run_paths.append(merged_run_path)
+            run_paths = next_run_paths
+
+        for chrom, chrom_start, _, chrom_end in heapq.merge(*(_read_bed_sort_run(run_path) for run_path in run_paths)):
+            yield chrom, chrom_start, chrom_end
@@ -4,6 +4,7 @@ from glob import glob
 from typing import List, Dict, Optional, Set
 
 from AMPPanelDesignLib.Enums import MoleculeType
+from AMPPanelDesignLib.PrimerName import PrimerName, parse_primer_name
 
 
 class Primer:
@@ -13,6 +14,11 @@ class Primer:
         self.name: str = name
         self.sequence: str = sequence
         self.boost_level: Decimal = boost_level
+        self.parsed_name: PrimerName = parse_primer_name(name)
+
+    @property
+    def gene(self) -> str:
+        return self.parsed_name.gene
 
     def __eq__(self, other: 'Primer') -> bool:
         return self.start == other.start \
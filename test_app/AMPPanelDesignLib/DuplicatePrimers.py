@@ -0,0 +1,119 @@
+import os
+from typing import Dict, Iterable, List, Set, Tuple
+
+from AMPPanelDesignLib.CTF import CTF
+from AMPPanelDesignLib.PrimerDimers import reverse_complement
+
+
+def canonical_sequence(sequence: str) -> str:
+    # the same for a sequence and its reverse complement
+    sequence = sequence.upper()
+    return min(sequence, reverse_complement(sequence))
+
+
+class RepositoryPrimer:
+    def __init__(self, name: str, sequence: str) -> None:
+        self.name: str = name
+        self.sequence: str = sequence
+        self.design_ids: Set[str] = set()
+
+
+class PrimerCollision:
+    # exact: identical sequences, reverse_complement: one sequence is the reverse complement of the other,
+    # contained / contained_reverse_complement: primer_a (or its reverse complement) is part of primer_b
+    columns = ["collision_type", "primer_a", "sequence_a", "designs_a", "primer_b", "sequence_b", "designs_b"]
+
+    def __init__(self, collision_type: str, primer_a: RepositoryPrimer, primer_b: RepositoryPrimer) -> None:
+        self.collision_type: str = collision_type
+        self.primer_a: RepositoryPrimer = primer_a
+        self.primer_b: RepositoryPrimer = primer_b
+
+    def __str__(self) -> str:
+        return "\t".join([self.collision_type, self.primer_a.name, self.primer_a.sequence,
+                          ",".join(sorted(self.primer_a.design_ids)), self.primer_b.name, self.primer_b.sequence,
+                          ",".join(sorted(self.primer_b.design_ids))])
+
+
+def collect_repository_primers(ctfs: Iterable[CTF]) -> List[RepositoryPrimer]:
+    # the same primer (name and sequence) used by several designs is a single entry
+    primers: Dict[Tuple[str, str], RepositoryPrimer] = {}
+    for ctf in ctfs:
+        for primer_pair in ctf.primer_pairs:
+            for primer in (primer_pair.gsp1, primer_pair.gsp2):
+                key = (primer.name, primer.sequence.upper())
+                if key not in primers:
+                    primers[key] = RepositoryPrimer(primer.name, primer.sequence.upper())
+                primers[key].design_ids.add(ctf.id)
+    return [primers[key] for key in sorted(primers)]
+
+
+# Primers with different names whose sequences are identical or reverse complements of each other. Primers are grouped
+# by their canonical sequence in a hash table, so this takes a single pass over the primers.
+def find_identical_primers(primers: List[RepositoryPrimer]) -> List[PrimerCollision]:
+    canonical_groups: Dict[str, List[RepositoryPrimer]] = {}
+    for primer in primers:
+        canonical = canonical_sequence(primer.sequence)
+        if canonical not in canonical_groups:
+            canonical_groups[canonical] = []
+        canonical_groups[canonical].append(primer)
+
+    collisions = []
+    for group in canonical_groups.values():
+        for i, primer_a in enumerate(group):
+            for primer_b in group[i + 1:]:
+                if primer_a.name == primer_b.name and primer_a.sequence == primer_b.sequence:
+                    continue
+                collision_type = "exact" if primer_a.sequence == primer_b.sequence else "reverse_complement"
+                collisions.append(PrimerCollision(collision_type, primer_a, primer_b))
+    return collisions
+
+
+# Primers whose sequence (or its reverse complement) is a proper substring of another primer. Every primer of at least
+# min_contained_length bases is indexed in a hash table by the first min_contained_length bases of its sequence and of
+# its reverse complement. A window of that length is then slid over every primer; each hit is a candidate occurrence
+# and is verified by comparing the full sequence at that position. This finds the same matches as an Aho-Corasick
+# automaton over all primers, in time proportional to the total sequence length plus the number of candidates, while
+# only storing two hash entries per primer.
+def find_contained_primers(primers: List[RepositoryPrimer], min_contained_length: int = 15) -> List[PrimerCollision]:
+    seeds: Dict[str, List[Tuple[int, str, str]]] = {}
+    for primer_index, primer in enumerate(primers):
+        if len(primer.sequence) < min_contained_length:
+            continue
+        for collision_type, sequence in (("contained", primer.sequence),
+                                         ("contained_reverse_complement", reverse_complement(primer.sequence))):
+            seed = sequence[:min_contained_length]
+            if seed not in seeds:
+                seeds[seed] = []
+            seeds[seed].append((primer_index, collision_type, sequence))
+
+    collisions = []
+    found_pairs: Set[Tuple[int, int]] = set()
+    for container_index, container in enumerate(primers):
+        container_sequence = container.sequence
+        for position in range(len(container_sequence) - min_contained_length + 1):
+            seed_hits = seeds.get(container_sequence[position:position + min_contained_length])
+            if seed_hits is None:
+                continue
+            for primer_index, collision_type, sequence in seed_hits:
+                if len(sequence) >= len(container_sequence) or (primer_index, container_index) in found_pairs:
+                    continue
+                if container_sequence.startswith(sequence, position):
+                    found_pairs.add((primer_index, container_index))
+                    collisions.append(PrimerCollision(collision_type, primers[primer_index], container))
+    return collisions
+
+
+def find_duplicate_primers(ctfs: Iterable[CTF], min_contained_length: int = 15) -> List[PrimerCollision]:
+    primers = collect_repository_primers(ctfs)
+    return find_identical_primers(primers) + find_contained_primers(primers, min_contained_length)
+
+
+def write_primer_collision_report(collisions: List[PrimerCollision], file_path: str) -> None:
+    output_directory = os.path.dirname(file_path)
+    if output_directory and not os.path.exists(output_directory):
+        os.makedirs(output_directory)
+
+    with open(file_path, "w") as sw:
+        sw.write("\t".join(PrimerCollision.columns) + "\n")
+        for collision in collisions:
+            sw.write(str(collision) + "\n")
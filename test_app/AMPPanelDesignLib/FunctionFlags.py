@@ -0,0 +1,69 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+# Registry of GTF function flags (the comma separated values of the "function" attribute). Every flag is interned and
+# assigned its own bit, so a set of flags is a single integer: unions, removals and membership tests are bitwise
+# operations and can be reduced over all entries of a GTF with |. Flags not known in advance get the next free bit the
+# first time they are seen, which means masks are only meaningful within one process.
+class FunctionFlagRegistry:
+    def __init__(self, flags: Iterable[str] = ()) -> None:
+        self._bits: Dict[str, int] = {}
+        self._flags: List[str] = []
+        self._masks: Dict[str, int] = {}
+        self._texts: Dict[Tuple[int, Optional[str]], str] = {}
+        for flag in flags:
+            self.bit(flag)
+
+    def bit(self, flag: str) -> int:
+        bit = self._bits.get(flag)
+        if bit is None:
+            bit = 1 << len(self._flags)
+            self._bits[flag] = bit
+            self._flags.append(flag)
+        return bit
+
+    def mask(self, flags: Iterable[str]) -> int:
+        mask = 0
+        for flag in flags:
+            mask |= self.bit(flag)
+        return mask
+
+    # mask of a comma separated function attribute value
+    def parse(self, text: str) -> int:
+        mask = self._masks.get(text)
+        if mask is None:
+            mask = self.mask(text.split(","))
+            self._masks[text] = mask
+        return mask
+
+    # flags of a mask in registration order
+    def flags(self, mask: int) -> List[str]:
+        return [flag for i, flag in enumerate(self._flags) if mask >> i & 1]
+
+    # Comma separated function attribute value of a mask. When the mask was derived from original_text, the flags of
+    # original_text that are still set keep their original order and flags that were added are appended in
+    # registration order, so an unchanged mask gives back exactly original_text.
+    def format(self, mask: int, original_text: Optional[str] = None) -> str:
+        text = self._texts.get((mask, original_text))
+        if text is None:
+            if original_text is None:
+                text = ",".join(self.flags(mask))
+            elif mask == self.parse(original_text):
+                text = original_text
+            else:
+                flags = [flag for flag in original_text.split(",") if mask & self._bits[flag]]
+                flags.extend(self.flags(mask & ~self.parse(original_text)))
+                text = ",".join(flags)
+            self._texts[(mask, original_text)] = text
+        return text
+
+
+function_flag_registry = FunctionFlagRegistry(["SNV", "CNV", "CNV_NO_DISPLAY", "SEX_ID", "INTERGENIC_FUSION",
+                                               "DNA_ANOMALY", "INTERNAL_TANDEM_DUPLICATION"])
+snv_flag = function_flag_registry.bit("SNV")
+cnv_flag = function_flag_registry.bit("CNV")
+cnv_no_display_flag = function_flag_registry.bit("CNV_NO_DISPLAY")
+sex_id_flag = function_flag_registry.bit("SEX_ID")
+intergenic_fusion_flag = function_flag_registry.bit("INTERGENIC_FUSION")
+dna_anomaly_flag = function_flag_registry.bit("DNA_ANOMALY")
+internal_tandem_duplication_flag = function_flag_registry.bit("INTERNAL_TANDEM_DUPLICATION")
@@ -1,15 +1,43 @@
 import os
-
+from collections import OrderedDict
+from functools import reduce
 from glob import glob
+from operator import or_
+
+from typing import Iterator, List, Optional, Dict, FrozenSet, Tuple
+
+from AMPPanelDesignLib.FunctionFlags import function_flag_registry
+from AMPPanelDesignLib.IntervalIndex import IntervalIndex
 
-from typing import List, Optional, Set, Dict
+
+def _split_gtf_attributes(attribute_text: str) -> List[Tuple[str, str]]:
+    attributes = []
+    for attr in attribute_text.rstrip(";").split(";"):
+        attr = attr.strip().split(" ", 1)
+        attributes.append((attr[0].strip(), attr[1].strip('"')))
+    return attributes
 
 
 class GTF:
     class Entry:
+        # Attributes are either given as a dict or as the raw attribute column of a GTF line. The raw text is only
+        # parsed the first time an attribute is read, since most entries of a loaded GTF are never looked at in
+        # detail. The parsed attributes should be treated as read-only: the function flags are cached on first use.
         class Attribute:
-            def __init__(self, attributes: Dict[str, str]) -> None:
-                self.items: Dict[str, str] = attributes
+            def __init__(self, attributes: Optional[Dict[str, str]] = None, raw_text: Optional[str] = None) -> None:
+                if attributes is None and raw_text is None:
+                    raise Exception("GTF entry attributes or raw attribute text must be provided")
+                self._items: Optional[Dict[str, str]] = attributes
+                self._raw_text: Optional[str] = raw_text
+                self._function: Optional[FrozenSet[str]] = None
+                self._function_mask: Optional[int] = None
+
+            @property
+            def items(self) -> Dict[str, str]:
+                if self._items is None:
+                    self._items = dict(_split_gtf_attributes(self._raw_text))
+                    self._raw_text = None
+                return self._items
 
             @property
             def name(self) -> str:
@@ -28,8 +56,17 @@ class GTF:
                 return self.items["transcript_id"]
 
             @property
-            def function(self) -> Set[str]:
-                return set(self.items["function"].split(","))
+            def function(self) -> FrozenSet[str]:
+                if self._function is None:
+                    self._function = frozenset(self.items["function"].split(","))
+                return self._function
+
+            # function flags as a bitmask of function_flag_registry
+            @property
+            def function_mask(self) -> int:
+                if self._function_mask is None:
+                    self._function_mask = function_flag_registry.parse(self.items["function"])
+                return self._function_mask
 
             @property
             def target_roi(self) -> Optional[str]:
@@ -46,7 +83,8 @@ class GTF:
                 return "; ".join(f"{key} \"{self.items[key]}\"" for key in self.items) + ";"
 
         def __init__(self, seqname: str, source: str, feature: str, start: int, end: int, score: str, strand: str,
-                     frame: str, attributes: Dict) -> None:
+                     frame: str, attributes: Optional[Dict[str, str]] = None,
+                     raw_attributes: Optional[str] = None) -> None:
             self.seqname: str = seqname
             self.source: str = source
             self.feature: str = feature
@@ -55,7 +93,7 @@ class GTF:
             self.score: str = score
             self.strand: str = strand
             self.frame: str = frame
-            self.attributes: GTF.Entry.Attribute = GTF.Entry.Attribute(attributes)
+            self.attributes: GTF.Entry.Attribute = GTF.Entry.Attribute(attributes, raw_attributes)
 
         def __str__(self) -> str:
             return "\t".join([self.seqname, self.source, self.feature, str(self.start), str(self.end), self.score,
@@ -65,6 +103,50 @@ class GTF:
         self.entries = entries  # type: List[GTF.Entry]
         self.id = design_id  # type: Optional[str]
         self.file_path = file_path  # type: Optional[str]
+        # primer_bind entries per seqname and their interval indices, built on first use. The entries should not be
+        # modified after the first positional query.
+        self._primer_bind_entries = None  # type: Optional[Dict[str, List[GTF.Entry]]]
+        self._primer_bind_indices = {}  # type: Dict[str, IntervalIndex]
+
+    # union of the function flags of all entries, e.g. gtf.function_mask & snv_flag tells whether any entry is an SNV
+    # target
+    @property
+    def function_mask(self) -> int:
+        return reduce(or_, (entry.attributes.function_mask for entry in self.entries), 0)
+
+    def _primer_bind_index(self, seqname: str) -> Optional[IntervalIndex]:
+        if self._primer_bind_entries is None:
+            self._primer_bind_entries = {}
+            for entry in self.entries:
+                if entry.feature == "primer_bind":
+                    if entry.seqname not in self._primer_bind_entries:
+                        self._primer_bind_entries[entry.seqname] = []
+                    self._primer_bind_entries[entry.seqname].append(entry)
+        if seqname not in self._primer_bind_entries:
+            return None
+        if seqname not in self._primer_bind_indices:
+            self._primer_bind_indices[seqname] = IntervalIndex((entry.start, entry.end, entry)
+                                                               for entry in self._primer_bind_entries[seqname])
+        return self._primer_bind_indices[seqname]
+
+    # Positional queries over primer_bind entries. Coordinates are 1-based and inclusive like the GTF start/end
+    # columns, and entries are returned sorted by start.
+    def overlapping_entries(self, seqname: str, start: int, end: int) -> List['GTF.Entry']:
+        index = self._primer_bind_index(seqname)
+        return index.overlapping(start, end)[::-1] if index is not None else []
+
+    def entries_containing(self, seqname: str, start: int, end: int) -> List['GTF.Entry']:
+        index = self._primer_bind_index(seqname)
+        return index.containing(start, end)[::-1] if index is not None else []
+
+    def entries_contained_in(self, seqname: str, start: int, end: int) -> List['GTF.Entry']:
+        index = self._primer_bind_index(seqname)
+        return index.contained_in(start, end) if index is not None else []
+
+    # closest primer_bind entry to a position as a (distance, entry) tuple
+    def nearest_entry(self, seqname: str, position: int) -> Optional[Tuple[int, 'GTF.Entry']]:
+        index = self._primer_bind_index(seqname)
+        return index.nearest(position) if index is not None else None
 
     def write(self, file_path: str) -> None:
         output_directory = os.path.dirname(file_path)
@@ -76,11 +158,16 @@ class GTF:
                 sw.write(str(entry) + "\n")
 
 
-def load_gtf(gtf_file_path: str) -> GTF:
-    design_id = os.path.basename(gtf_file_path).split("_")[-1].split("-")[0]
+def get_gtf_design_id(gtf_file_path: str) -> str:
+    return os.path.basename(gtf_file_path).split("_")[-1].split("-")[0]
+
+
+# Reads the entries of a GTF file one line at a time. With strict=True, the attributes of every line are parsed while
+# loading and duplicate attributes are reported as errors. Otherwise, attributes are parsed on first access and the last
+# value of a duplicate attribute is used.
+def iter_gtf_entries(gtf_file_path: str, strict: bool = False) -> Iterator[GTF.Entry]:
     with open(gtf_file_path, 'r') as sr:
         line_count = 0
-        entries = []
         for line in sr:
             line_count += 1
             if line.startswith("#"):
@@ -88,29 +175,103 @@ def load_gtf(gtf_file_path: str) -> GTF:
             line = line.strip().split("#", 1)[0].split("\t")
             if len(line) != 9:
                 raise Exception(f"Invalid line {line_count} in {gtf_file_path} with {len(line)} fields (expecting 9).")
-            attributes = {}
-            for attr in line[8].rstrip(";").split(";"):
-                attr = attr.strip().split(" ", 1)
-                attr_key = attr[0].strip()
-                attr_value = attr[1].strip('"')
-                if attr_key in attributes:
-                    raise Exception(f"Duplicate attribute {attr_key} found on line {line_count} in {gtf_file_path}.")
-                attributes[attr_key] = attr_value
+            if strict:
+                attributes = {}
+                for attr_key, attr_value in _split_gtf_attributes(line[8]):
+                    if attr_key in attributes:
+                        raise Exception(f"Duplicate attribute {attr_key} found on line {line_count} in "
+                                        f"{gtf_file_path}.")
+                    attributes[attr_key] = attr_value
+                raw_attributes = None
+            else:
+                attributes = None
+                raw_attributes = line[8]
+
+            yield GTF.Entry(seqname=line[0], source=line[1], feature=line[2], start=int(line[3]), end=int(line[4]),
+                            score=line[5], strand=line[6], frame=line[7], attributes=attributes,
+                            raw_attributes=raw_attributes)
 
-            entry = GTF.Entry(seqname=line[0], source=line[1], feature=line[2], start=int(line[3]), end=int(line[4]),
-                              score=line[5], strand=line[6], frame=line[7], attributes=attributes)
-            entries.append(entry)
 
-        return GTF(entries, design_id, gtf_file_path)
+def load_gtf(gtf_file_path: str, strict: bool = False) -> GTF:
+    return GTF(list(iter_gtf_entries(gtf_file_path, strict)), get_gtf_design_id(gtf_file_path), gtf_file_path)
 
 
-def load_all_gtfs(gtf_folder_path: str) -> Dict[str, GTF]:
+# Entries of a GTF file that are read again from the file every time they are iterated instead of being kept in memory.
+# Only iteration is supported, so a GTF opened this way can be walked by the workflow steps that loop over its entries
+# but not indexed or counted.
+class GTFFileEntries:
+    def __init__(self, gtf_file_path: str, strict: bool = False) -> None:
+        self.gtf_file_path: str = gtf_file_path
+        self.strict: bool = strict
+
+    def __iter__(self) -> Iterator[GTF.Entry]:
+        return iter_gtf_entries(self.gtf_file_path, self.strict)
+
+
+# GTF whose entries are streamed from the file (see GTFFileEntries), for GTF files too large to load
+def open_gtf(gtf_file_path: str, strict: bool = False) -> GTF:
+    return GTF(GTFFileEntries(gtf_file_path, strict), get_gtf_design_id(gtf_file_path), gtf_file_path)
+
+
+def _find_gtf_files(gtf_folder_path: str) -> List[str]:
+    return [gtf for walk_result in os.walk(gtf_folder_path) for gtf in glob(os.path.join(walk_result[0], "*.gtf"))]
+
+
+def load_all_gtfs(gtf_folder_path: str, strict: bool = False) -> Dict[str, GTF]:
     designs = {}
-    gtf_search_results = [gtf for walk_result in os.walk(gtf_folder_path) for gtf in
-                          glob(os.path.join(walk_result[0], "*.gtf"))]
+    gtf_search_results = _find_gtf_files(gtf_folder_path)
     for gtf in gtf_search_results:
-        gtf = load_gtf(gtf)
+        gtf = load_gtf(gtf, strict)
         if gtf.id in designs:
             raise Exception(f"Duplicate GTF design ID {gtf.id} found in {gtf_folder_path}")
         designs[gtf.id] = gtf
     return designs
+
+
+# Read-only mapping of design ID to GTF for a folder of GTF files. Only the file paths are indexed up front; a GTF is
+# parsed the first time it is accessed and the most recently used parsed GTFs are kept in memory (at most
+# max_cached_gtfs of them), so callers that only need a few designs do not pay for loading the whole repository.
+class GTFRepository:
+    def __init__(self, gtf_folder_path: str, strict: bool = False, max_cached_gtfs: int = 32) -> None:
+        if max_cached_gtfs <= 0:
+            raise Exception(f"Invalid GTF repository cache size ({max_cached_gtfs})")
+        self.folder_path: str = gtf_folder_path
+        self.strict: bool = strict
+        self.max_cached_gtfs: int = max_cached_gtfs
+        self._file_paths: Dict[str, str] = {}
+        self._cache: OrderedDict = OrderedDict()
+        for gtf_file_path in _find_gtf_files(gtf_folder_path):
+            design_id = get_gtf_design_id(gtf_file_path)
+            if design_id in self._file_paths:
+                raise Exception(f"Duplicate GTF design ID {design_id} found in {gtf_folder_path}")
+            self._file_paths[design_id] = gtf_file_path
+
+    def __contains__(self, design_id: str) -> bool:
+        return design_id in self._file_paths
+
+    def __len__(self) -> int:
+        return len(self._file_paths)
+
+    def __iter__(self):
+        return iter(self._file_paths)
+
+    def file_path(self, design_id: str) -> str:
+        return self._file_paths[design_id]
+
+    def __getitem__(self, design_id: str) -> GTF:
+        gtf = self._cache.get(design_id)
+        if gtf is not None:
+            self._cache.move_to_end(design_id)
+            return gtf
+        gtf = load_gtf(self._file_paths[design_id], self.strict)
+        self._cache[design_id] = gtf
+        if len(self._cache) > self.max_cached_gtfs:
+            self._cache.popitem(last=False)
+        return gtf
+
+    def get(self, design_id: str, default: Optional[GTF] = None) -> Optional[GTF]:
+        return self[design_id] if design_id in self._file_paths else default
+
+
+def index_all_gtfs(gtf_folder_path: str, strict: bool = False, max_cached_gtfs: int = 32) -> GTFRepository:
+    return GTFRepository(gtf_folder_path, strict, max_cached_gtfs)
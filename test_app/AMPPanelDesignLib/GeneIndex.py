@@ -0,0 +1,86 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from AMPPanelDesignLib.CTF import CTF, PrimerPair
+from AMPPanelDesignLib.Enums import MoleculeType
+
+
+# Maps every gene in a design repository to the designs and primer pairs that cover it, split by molecule type:
+# gene -> molecule type -> design ID -> primer pairs. Gene names are normalized through the aliased gene names
+# lookup (see configs/aliased_gene_names.txt) and compared case-insensitively.
+class GeneIndex:
+    def __init__(self, ctf_repository: Dict[str, CTF], aliased_gene_names: Optional[Dict[str, str]] = None) -> None:
+        self._aliased_gene_names: Dict[str, str] = {alias.upper(): replacement.upper() for alias, replacement
+                                                    in (aliased_gene_names or {}).items()}
+        self._index: Dict[str, Dict[MoleculeType, Dict[str, List[PrimerPair]]]] = {}
+        for design_id in sorted(ctf_repository):
+            ctf = ctf_repository[design_id]
+            molecule_types = ctf.header.molecule_types
+            for primer_pair in ctf.primer_pairs:
+                gene = self.normalize(GeneIndex.primer_pair_gene(primer_pair))
+                if gene not in self._index:
+                    self._index[gene] = {}
+                for molecule_type in molecule_types:
+                    if molecule_type not in self._index[gene]:
+                        self._index[gene][molecule_type] = {}
+                    if design_id not in self._index[gene][molecule_type]:
+                        self._index[gene][molecule_type][design_id] = []
+                    self._index[gene][molecule_type][design_id].append(primer_pair)
+
+    @staticmethod
+    def primer_pair_gene(primer_pair: PrimerPair) -> str:
+        return primer_pair.gene_name or primer_pair.gsp1.gene
+
+    def normalize(self, gene: str) -> str:
+        gene = gene.strip().upper()
+        return self._aliased_gene_names.get(gene, gene)
+
+    def __contains__(self, gene: str) -> bool:
+        return self.normalize(gene) in self._index
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    @property
+    def genes(self) -> List[str]:
+        return sorted(self._index)
+
+    def designs(self, gene: str, molecule_type: MoleculeType) -> Dict[str, List[PrimerPair]]:
+        return self._index.get(self.normalize(gene), {}).get(molecule_type, {})
+
+    # All primer pairs covering a gene for a molecule type. Primer pairs found in several designs are only returned
+    # once (the copy from the design with the lowest design ID is used).
+    def primer_pairs(self, gene: str, molecule_type: MoleculeType) -> List[PrimerPair]:
+        primer_pairs = []
+        added_primer_pairs = set()
+        for design_primer_pairs in self.designs(gene, molecule_type).values():
+            for primer_pair in design_primer_pairs:
+                primer_pair_key = (primer_pair.gsp1_name, primer_pair.gsp2_name)
+                if primer_pair_key not in added_primer_pairs:
+                    added_primer_pairs.add(primer_pair_key)
+                    primer_pairs.append(primer_pair)
+        return primer_pairs
+
+    # Builds a raw CTF containing all primer pairs that cover the requested genes. Returns the CTF and the list of
+    # requested genes that are not covered by any design of the requested molecule type.
+    def assemble_ctf(self, design_id: str, genes: Iterable[str], molecule_type: MoleculeType,
+                     project_name: str = "") -> Tuple[CTF, List[str]]:
+        primer_pairs = []
+        added_primer_pairs = set()
+        missing_genes = []
+        for gene in genes:
+            gene_primer_pairs = self.primer_pairs(gene, molecule_type)
+            if not gene_primer_pairs:
+                missing_genes.append(gene)
+            for primer_pair in gene_primer_pairs:
+                primer_pair_key = (primer_pair.gsp1_name, primer_pair.gsp2_name)
+                if primer_pair_key not in added_primer_pairs:
+                    added_primer_pairs.add(primer_pair_key)
+                    primer_pairs.append(primer_pair)
+
+        header = {"ProjectName": project_name,
+                  "PartNumber": "",
+                  "ProjectVersion": "",
+                  "MoleculeType": molecule_type.value,
+                  "TotalGsp1Concentration": "",
+                  "TotalGsp2Concentration": ""}
+        return CTF(design_id, None, header, primer_pairs), missing_genes
@@ -0,0 +1,223 @@
+from array import array
+from bisect import bisect_left
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple
+
+from AMPPanelDesignLib.CTF import CTF
+from AMPPanelDesignLib.Enums import MoleculeType
+
+
+# Sparse matrix in compressed sparse row format. The column indices of row i are indices[indptr[i]:indptr[i + 1]]
+# (sorted) and the matching values are data[indptr[i]:indptr[i + 1]].
+class CSRMatrix:
+    def __init__(self, n_rows: int, n_cols: int, indptr: array, indices: array, data: array) -> None:
+        if len(indptr) != n_rows + 1:
+            raise Exception(f"Invalid CSR matrix: expected {n_rows + 1} row pointers, got {len(indptr)}")
+        if len(indices) != len(data):
+            raise Exception(f"Invalid CSR matrix: {len(indices)} column indices but {len(data)} values")
+        self.n_rows: int = n_rows
+        self.n_cols: int = n_cols
+        self.indptr: array = indptr
+        self.indices: array = indices
+        self.data: array = data
+
+    @staticmethod
+    def from_rows(rows: Iterable[Iterable[int]], n_cols: int) -> 'CSRMatrix':
+        # builds a 0/1 matrix from the column indices of the non-zero entries of each row
+        indptr = array("q", [0])
+        indices = array("q")
+        for row in rows:
+            indices.extend(sorted(set(row)))
+            indptr.append(len(indices))
+        return CSRMatrix(len(indptr) - 1, n_cols, indptr, indices, array("q", [1] * len(indices)))
+
+    @property
+    def nnz(self) -> int:
+        return len(self.indices)
+
+    def row(self, i: int) -> List[Tuple[int, int]]:
+        return list(zip(self.indices[self.indptr[i]:self.indptr[i + 1]], self.data[self.indptr[i]:self.indptr[i + 1]]))
+
+    def row_nnz(self) -> array:
+        return array("q", (self.indptr[i + 1] - self.indptr[i] for i in range(self.n_rows)))
+
+    def column_nnz(self) -> array:
+        counts = array("q", [0] * self.n_cols)
+        for j in self.indices:
+            counts[j] += 1
+        return counts
+
+    def transpose(self) -> 'CSRMatrix':
+        # counting sort of the entries by column, which keeps the row indices of every column sorted
+        counts = self.column_nnz()
+        indptr = array("q", [0] * (self.n_cols + 1))
+        for j in range(self.n_cols):
+            indptr[j + 1] = indptr[j] + counts[j]
+        next_position = array("q", indptr[:-1])
+        indices = array("q", [0] * self.nnz)
+        data = array("q", [0] * self.nnz)
+        for i in range(self.n_rows):
+            for k in range(self.indptr[i], self.indptr[i + 1]):
+                j = self.indices[k]
+                indices[next_position[j]] = i
+                data[next_position[j]] = self.data[k]
+                next_position[j] += 1
+        return CSRMatrix(self.n_cols, self.n_rows, indptr, indices, data)
+
+    # Sparse matrix product self * other (Gustavson's algorithm). Every row of the result is accumulated in a dense
+    # work array, touching only the columns reachable through the non-zero entries of the row. With
+    # upper_triangle=True only the entries with a column index >= the row index are computed, which halves the work
+    # for symmetric products such as A * A^T. Entries smaller than min_value are dropped from the result, which keeps
+    # the memory use of products between matrices with a few very dense columns under control.
+    def multiply(self, other: 'CSRMatrix', upper_triangle: bool = False,
+                 min_value: Optional[int] = None) -> 'CSRMatrix':
+        if self.n_cols != other.n_rows:
+            raise Exception(f"Cannot multiply a {self.n_rows}x{self.n_cols} matrix by a {other.n_rows}x{other.n_cols} "
+                            f"matrix")
+        indptr = array("q", [0])
+        indices = array("q")
+        data = array("q")
+        accumulator = array("q", [0] * other.n_cols)
+        touched_in_row = array("q", [-1] * other.n_cols)
+        for i in range(self.n_rows):
+            touched_columns = []
+            for k in range(self.indptr[i], self.indptr[i + 1]):
+                value = self.data[k]
+                other_row = self.indices[k]
+                other_row_start = other.indptr[other_row]
+                other_row_end = other.indptr[other_row + 1]
+                if upper_triangle:
+                    # the columns of each row are sorted, so skip straight to the first column >= i
+                    other_row_start = bisect_left(other.indices, i, other_row_start, other_row_end)
+                for other_k in range(other_row_start, other_row_end):
+                    j = other.indices[other_k]
+                    if touched_in_row[j] != i:
+                        touched_in_row[j] = i
+                        touched_columns.append(j)
+                    accumulator[j] += value * other.data[other_k]
+            touched_columns.sort()
+            for j in touched_columns:
+                if accumulator[j] != 0 and (min_value is None or accumulator[j] >= min_value):
+                    indices.append(j)
+                    data.append(accumulator[j])
+                accumulator[j] = 0
+            indptr.append(len(indices))
+        return CSRMatrix(self.n_rows, other.n_cols, indptr, indices, data)
+
+
+class _DisjointSets:
+    def __init__(self, size: int) -> None:
+        self._parents: array = array("q", range(size))
+
+    def find(self, i: int) -> int:
+        root = i
+        while self._parents[root] != root:
+            root = self._parents[root]
+        while self._parents[i] != root:
+            self._parents[i], i = root, self._parents[i]
+        return root
+
+    def union(self, i: int, j: int) -> None:
+        root_i = self.find(i)
+        root_j = self.find(j)
+        if root_i != root_j:
+            self._parents[max(root_i, root_j)] = min(root_i, root_j)
+
+
+class DesignOverlap:
+    columns = ["design_a", "design_b", "shared_primer_pairs", "design_a_primer_pairs", "design_b_primer_pairs",
+               "jaccard", "containment"]
+
+    def __init__(self, design_a: str, design_b: str, shared_primer_pairs: int, design_a_primer_pairs: int,
+                 design_b_primer_pairs: int) -> None:
+        self.design_a: str = design_a
+        self.design_b: str = design_b
+        self.shared_primer_pairs: int = shared_primer_pairs
+        self.design_a_primer_pairs: int = design_a_primer_pairs
+        self.design_b_primer_pairs: int = design_b_primer_pairs
+
+    @property
+    def jaccard(self) -> float:
+        return self.shared_primer_pairs / (self.design_a_primer_pairs + self.design_b_primer_pairs
+                                           - self.shared_primer_pairs)
+
+    @property
+    def containment(self) -> float:
+        # fraction of the smaller design that is also part of the other design
+        return self.shared_primer_pairs / min(self.design_a_primer_pairs, self.design_b_primer_pairs)
+
+    def __str__(self) -> str:
+        return "\t".join([self.design_a, self.design_b, str(self.shared_primer_pairs), str(self.design_a_primer_pairs),
+                          str(self.design_b_primer_pairs), f"{self.jaccard:.4f}", f"{self.containment:.4f}"])
+
+
+# Design-by-primer-pair incidence matrix of a design repository: entry (i, j) is 1 when design i contains primer pair
+# j. Primer pairs are identified the same way as in CTF.primer_pair_set. The pairwise overlap of all designs is the
+# product A * A^T, whose entry (i, j) is the number of primer pairs shared by designs i and j, and the column sums of A
+# give the number of designs reusing each primer pair.
+class DesignIncidenceMatrix:
+    def __init__(self, ctf_repository: Dict[str, CTF], molecule_type: Optional[MoleculeType] = None) -> None:
+        self.design_ids: List[str] = []
+        self._primer_pair_columns: Dict[Hashable, int] = {}
+        rows = []
+        for design_id in sorted(ctf_repository):
+            ctf = ctf_repository[design_id]
+            if molecule_type is not None and molecule_type not in ctf.header.molecule_types:
+                continue
+            row = []
+            for primer_pair in ctf.primer_pair_set:
+                if primer_pair not in self._primer_pair_columns:
+                    self._primer_pair_columns[primer_pair] = len(self._primer_pair_columns)
+                row.append(self._primer_pair_columns[primer_pair])
+            self.design_ids.append(design_id)
+            rows.append(row)
+        self.matrix: CSRMatrix = CSRMatrix.from_rows(rows, len(self._primer_pair_columns))
+        self._overlap_matrices: Dict[int, CSRMatrix] = {}
+
+    @property
+    def primer_pair_count(self) -> int:
+        return self.matrix.n_cols
+
+    # Upper triangle of A * A^T without the entries below min_shared_primer_pairs. The diagonal holds the design sizes.
+    def overlap_matrix(self, min_shared_primer_pairs: int = 1) -> CSRMatrix:
+        if min_shared_primer_pairs not in self._overlap_matrices:
+            self._overlap_matrices[min_shared_primer_pairs] = self.matrix.multiply(
+                self.matrix.transpose(), upper_triangle=True, min_value=min_shared_primer_pairs)
+        return self._overlap_matrices[min_shared_primer_pairs]
+
+    def _overlap_entries(self, min_shared_primer_pairs: int) -> Iterable[Tuple[int, int, int]]:
+        overlap_matrix = self.overlap_matrix(min_shared_primer_pairs)
+        for i in range(overlap_matrix.n_rows):
+            for j, shared_primer_pairs in overlap_matrix.row(i):
+                if j != i:
+                    yield i, j, shared_primer_pairs
+
+    # Every pair of different designs sharing at least min_shared_primer_pairs primer pairs
+    def design_overlaps(self, min_shared_primer_pairs: int = 1) -> Iterable[DesignOverlap]:
+        design_sizes = self.matrix.row_nnz()
+        for i, j, shared_primer_pairs in self._overlap_entries(min_shared_primer_pairs):
+            yield DesignOverlap(self.design_ids[i], self.design_ids[j], shared_primer_pairs, design_sizes[i],
+                                design_sizes[j])
+
+    # number of primer pairs (value) used by exactly n designs (key)
+    def primer_reuse_histogram(self) -> Dict[int, int]:
+        histogram = {}
+        for design_count in self.matrix.column_nnz():
+            histogram[design_count] = histogram.get(design_count, 0) + 1
+        return dict(sorted(histogram.items()))
+
+    # Groups of designs connected by overlaps where at least min_containment of the smaller design is part of the other
+    # design. Designs that are not redundant with any other design are not returned.
+    def redundancy_clusters(self, min_containment: float = 0.9) -> List[List[str]]:
+        design_sizes = self.matrix.row_nnz()
+        disjoint_sets = _DisjointSets(len(self.design_ids))
+        for i, j, shared_primer_pairs in self._overlap_entries(1):
+            if shared_primer_pairs >= min_containment * min(design_sizes[i], design_sizes[j]):
+                disjoint_sets.union(i, j)
+
+        clusters: Dict[int, List[str]] = {}
+        for i, design_id in enumerate(self.design_ids):
+            root = disjoint_sets.find(i)
+            if root not in clusters:
+                clusters[root] = []
+            clusters[root].append(design_id)
+        return [cluster for cluster in clusters.values() if len(cluster) > 1]
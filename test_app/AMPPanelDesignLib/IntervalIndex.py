@@ -0,0 +1,126 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+
+# Static index over closed intervals [start, end] on a single sequence. Intervals are kept in arrays sorted by start
+# and searched as an implicit balanced binary tree: the root of the intervals i..j-1 is their middle interval and
+# subtree_max_ends holds, at the position of each root, the largest end in its subtree. A query visits only subtrees
+# that start at or before the query end and reach the query start, so it takes O((k + 1) log n) for k results however
+# long the intervals are. A running maximum of the ends (max_ends[i] is the largest end among intervals 0..i) answers
+# nearest queries in constant time after the bisect.
+class IntervalIndex:
+    def __init__(self, intervals: Iterable[Tuple[int, int, Any]]) -> None:
+        sorted_intervals = sorted(intervals, key=lambda interval: (interval[0], interval[1]))
+        self._starts: array = array("q", (interval[0] for interval in sorted_intervals))
+        self._ends: array = array("q", (interval[1] for interval in sorted_intervals))
+        self._values: List[Any] = [interval[2] for interval in sorted_intervals]
+        self._max_ends: array = array("q")
+        self._max_end_indices: array = array("q")
+        for i, end in enumerate(self._ends):
+            if i == 0 or end > self._max_ends[-1]:
+                self._max_ends.append(end)
+                self._max_end_indices.append(i)
+            else:
+                self._max_ends.append(self._max_ends[-1])
+                self._max_end_indices.append(self._max_end_indices[-1])
+        self._subtree_max_ends: array = array("q", self._ends)
+        if self._values:
+            self._build_subtree_max_ends(0, len(self._values))
+
+    def _build_subtree_max_ends(self, low: int, high: int) -> int:
+        middle = (low + high) // 2
+        max_end = self._ends[middle]
+        if low < middle:
+            max_end = max(max_end, self._build_subtree_max_ends(low, middle))
+        if middle + 1 < high:
+            max_end = max(max_end, self._build_subtree_max_ends(middle + 1, high))
+        self._subtree_max_ends[middle] = max_end
+        return max_end
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    # indices of the intervals up to last_index that end at or after min_end, from the last to the first
+    def _scan_back(self, last_index: int, min_end: int) -> Iterable[int]:
+        # (low, high) is a subtree to search, (index, -1) an interval to report once its right subtree is done
+        stack = [(0, len(self._values))]
+        while stack:
+            low, high = stack.pop()
+            if high < 0:
+                yield low
+                continue
+            if low >= high or low > last_index:
+                continue
+            middle = (low + high) // 2
+            if self._subtree_max_ends[middle] < min_end:
+                continue
+            stack.append((low, middle))
+            if middle <= last_index:
+                if self._ends[middle] >= min_end:
+                    stack.append((middle, -1))
+                stack.append((middle + 1, high))
+
+    # intervals that share at least one position with [start, end]
+    def overlapping(self, start: int, end: int) -> List[Any]:
+        last_index = bisect_right(self._starts, end) - 1
+        return [self._values[i] for i in self._scan_back(last_index, start)]
+
+    # intervals that completely contain [start, end]
+    def containing(self, start: int, end: int) -> List[Any]:
+        last_index = bisect_right(self._starts, start) - 1
+        return [self._values[i] for i in self._scan_back(last_index, end)]
+
+    # intervals that lie completely inside [start, end]
+    def contained_in(self, start: int, end: int) -> List[Any]:
+        first_index = bisect_left(self._starts, start)
+        last_index = bisect_right(self._starts, end)
+        return [self._values[i] for i in range(first_index, last_index) if self._ends[i] <= end]
+
+    # the interval closest to position, as a (distance, value) tuple. Overlapping intervals have a distance of 0.
+    def nearest(self, position: int) -> Optional[Tuple[int, Any]]:
+        if not self._values:
+            return None
+        last_index = bisect_right(self._starts, position) - 1
+        if last_index >= 0 and self._max_ends[last_index] >= position:
+            return 0, self._values[next(iter(self._scan_back(last_index, position)))]
+        best = None
+        if last_index >= 0:
+            # every interval starting at or before position ends before it, so the closest one is the one with the
+            # largest end
+            best = (position - self._max_ends[last_index], self._values[self._max_end_indices[last_index]])
+        if last_index + 1 < len(self._values):
+            right_distance = self._starts[last_index + 1] - position
+            if best is None or right_distance < best[0]:
+                best = (right_distance, self._values[last_index + 1])
+        return best
+
+
+# Collection of IntervalIndex objects, one per chromosome/seqname
+class GenomicIntervalIndex:
+    def __init__(self, intervals: Iterable[Tuple[str, int, int, Any]]) -> None:
+        per_chromosome_intervals: Dict[str, List[Tuple[int, int, Any]]] = {}
+        for chrom, start, end, value in intervals:
+            if chrom not in per_chromosome_intervals:
+                per_chromosome_intervals[chrom] = []
+            per_chromosome_intervals[chrom].append((start, end, value))
+        self._indices: Dict[str, IntervalIndex] = {chrom: IntervalIndex(chrom_intervals)
+                                                   for chrom, chrom_intervals in per_chromosome_intervals.items()}
+
+    def __contains__(self, chrom: str) -> bool:
+        return chrom in self._indices
+
+    def __getitem__(self, chrom: str) -> IntervalIndex:
+        return self._indices[chrom]
+
+    def overlapping(self, chrom: str, start: int, end: int) -> List[Any]:
+        return self._indices[chrom].overlapping(start, end) if chrom in self._indices else []
+
+    def containing(self, chrom: str, start: int, end: int) -> List[Any]:
+        return self._indices[chrom].containing(start, end) if chrom in self._indices else []
+
+    def contained_in(self, chrom: str, start: int, end: int) -> List[Any]:
+        return self._indices[chrom].contained_in(start, end) if chrom in self._indices else []
+
+    def nearest(self, chrom: str, position: int) -> Optional[Tuple[int, Any]]:
+        return self._indices[chrom].nearest(position) if chrom in self._indices else None
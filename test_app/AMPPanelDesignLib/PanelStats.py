@@ -0,0 +1,181 @@
+import os
+from operator import itemgetter
+from typing import Dict, Iterable, List, Set, Tuple, Union
+
+from AMPPanelDesignLib.BED import BED, ColumnarBED
+from AMPPanelDesignLib.GTF import GTF
+
+
+class BedTarget:
+    def __init__(self, chrom: str, start: int, end: int, name: str) -> None:
+        self.chrom: str = chrom
+        # BED coordinates (0-based start, exclusive end)
+        self.start: int = start
+        self.end: int = end
+        self.name: str = name
+
+    def __str__(self) -> str:
+        return "\t".join([self.chrom, str(self.start), str(self.end), self.name])
+
+
+# Footprint of a panel on one chromosome. Base counts are counted once however many intervals cover a base.
+class ChromosomeStats:
+    columns = ["chromosome", "bed_targets", "targeted_bases", "primers", "primer_bases", "covered_target_bases",
+               "primer_overlap_bases", "unreached_targets"]
+
+    def __init__(self, chrom: str) -> None:
+        self.chrom: str = chrom
+        self.bed_targets: int = 0
+        # bases covered by at least one BED target
+        self.targeted_bases: int = 0
+        self.primers: int = 0
+        # bases covered by at least one primer
+        self.primer_bases: int = 0
+        # targeted bases that are also covered by a primer
+        self.covered_target_bases: int = 0
+        # bases covered by two or more primers
+        self.primer_overlap_bases: int = 0
+        self.unreached_targets: int = 0
+
+    def add(self, chromosome_stats: 'ChromosomeStats') -> None:
+        self.bed_targets += chromosome_stats.bed_targets
+        self.targeted_bases += chromosome_stats.targeted_bases
+        self.primers += chromosome_stats.primers
+        self.primer_bases += chromosome_stats.primer_bases
+        self.covered_target_bases += chromosome_stats.covered_target_bases
+        self.primer_overlap_bases += chromosome_stats.primer_overlap_bases
+        self.unreached_targets += chromosome_stats.unreached_targets
+
+    def __str__(self) -> str:
+        return "\t".join([self.chrom, str(self.bed_targets), str(self.targeted_bases), str(self.primers),
+                          str(self.primer_bases), str(self.covered_target_bases), str(self.primer_overlap_bases),
+                          str(self.unreached_targets)])
+
+
+class PanelStats:
+    def __init__(self, chromosomes: Dict[str, ChromosomeStats], unreached_targets: List[BedTarget]) -> None:
+        self.chromosomes: Dict[str, ChromosomeStats] = chromosomes
+        # BED targets that no primer reaches, in BED order
+        self.unreached_targets: List[BedTarget] = unreached_targets
+
+    @property
+    def total(self) -> ChromosomeStats:
+        total = ChromosomeStats("total")
+        for chromosome_stats in self.chromosomes.values():
+            total.add(chromosome_stats)
+        return total
+
+
+def _iter_bed_targets(bed: Union[BED, ColumnarBED]) -> Iterable[BedTarget]:
+    if isinstance(bed, ColumnarBED):
+        for chrom, chromosome in bed.chromosomes.items():
+            for start, end in zip(chromosome.starts, chromosome.ends):
+                yield BedTarget(chrom, start, end, "")
+    else:
+        for entry in bed.entries:
+            yield BedTarget(entry.chrom, entry.chrom_start, entry.chrom_end, entry.name)
+
+
+_bed_event = 0
+_primer_event = 1
+_reach_event = 2
+
+
+# Computes the panel footprint with one sweep over the sorted start and end points of all BED targets and primer_bind
+# entries of each chromosome, keeping a running depth of targets, primers and primer reach. Every stretch between two
+# consecutive points is counted once with the depths that apply to it. A primer reaches the bases it binds plus
+# max_target_distance bases in the direction it reads (downstream on the + strand, upstream on the - strand), the
+# window GTF cleaning searches for a target ROI; a BED target is reached when any of its bases is. GTF coordinates
+# (1-based, inclusive) are converted to BED coordinates.
+def calculate_panel_stats(gtf: GTF, bed: Union[BED, ColumnarBED], max_target_distance: int = 0) -> PanelStats:
+    chromosomes: Dict[str, ChromosomeStats] = {}
+    # chromosome -> (position, event type, depth change, BED target index)
+    events: Dict[str, List[Tuple[int, int, int, int]]] = {}
+    bed_targets = list(_iter_bed_targets(bed))
+    for target_index, bed_target in enumerate(bed_targets):
+        if bed_target.chrom not in chromosomes:
+            chromosomes[bed_target.chrom] = ChromosomeStats(bed_target.chrom)
+            events[bed_target.chrom] = []
+        chromosomes[bed_target.chrom].bed_targets += 1
+        events[bed_target.chrom].append((bed_target.start, _bed_event, 1, target_index))
+        events[bed_target.chrom].append((bed_target.end, _bed_event, -1, target_index))
+
+    for entry in gtf.entries:
+        if entry.feature != "primer_bind":
+            continue
+        if entry.seqname not in chromosomes:
+            chromosomes[entry.seqname] = ChromosomeStats(entry.seqname)
+            events[entry.seqname] = []
+        chromosomes[entry.seqname].primers += 1
+        start = entry.start - 1
+        end = entry.end
+        events[entry.seqname].append((start, _primer_event, 1, -1))
+        events[entry.seqname].append((end, _primer_event, -1, -1))
+        if entry.strand == "+":
+            end += max_target_distance
+        elif entry.strand == "-":
+            start -= max_target_distance
+        events[entry.seqname].append((start, _reach_event, 1, -1))
+        events[entry.seqname].append((end, _reach_event, -1, -1))
+
+    is_reached = [False] * len(bed_targets)
+    for chrom, chromosome_events in events.items():
+        chromosome_stats = chromosomes[chrom]
+        chromosome_events.sort(key=itemgetter(0))
+        depths = [0, 0, 0]
+        # open targets that have not been reached yet
+        open_targets: Set[int] = set()
+        previous_position = None
+        for position, event_type, depth_change, target_index in chromosome_events:
+            if previous_position is not None and position > previous_position:
+                length = position - previous_position
+                bed_depth, primer_depth, reach_depth = depths
+                if bed_depth > 0:
+                    chromosome_stats.targeted_bases += length
+                    if primer_depth > 0:
+                        chromosome_stats.covered_target_bases += length
+                    if reach_depth > 0 and open_targets:
+                        for open_target_index in open_targets:
+                            is_reached[open_target_index] = True
+                        open_targets.clear()
+                if primer_depth > 0:
+                    chromosome_stats.primer_bases += length
+                    if primer_depth > 1:
+                        chromosome_stats.primer_overlap_bases += length
+            previous_position = position
+
+            depths[event_type] += depth_change
+            if event_type == _bed_event:
+                if depth_change > 0:
+                    open_targets.add(target_index)
+                else:
+                    open_targets.discard(target_index)
+
+    unreached_targets = []
+    for target_index, bed_target in enumerate(bed_targets):
+        if not is_reached[target_index]:
+            chromosomes[bed_target.chrom].unreached_targets += 1
+            unreached_targets.append(bed_target)
+    return PanelStats(chromosomes, unreached_targets)
+
+
+def _create_output_directory(file_path: str) -> None:
+    output_directory = os.path.dirname(file_path)
+    if output_directory and not os.path.exists(output_directory):
+        os.makedirs(output_directory)
+
+
+def write_panel_stats(panel_stats: PanelStats, file_path: str) -> None:
+    _create_output_directory(file_path)
+    with open(file_path, "w") as sw:
+        sw.write("\t".join(ChromosomeStats.columns) + "\n")
+        for chromosome_stats in panel_stats.chromosomes.values():
+            sw.write(str(chromosome_stats) + "\n")
+        sw.write(str(panel_stats.total) + "\n")
+
+
+def write_unreached_targets(panel_stats: PanelStats, file_path: str) -> None:
+    _create_output_directory(file_path)
+    with open(file_path, "w") as sw:
+        for bed_target in panel_stats.unreached_targets:
+            sw.write(str(bed_target) + "\n")
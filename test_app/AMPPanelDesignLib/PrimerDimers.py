@@ -0,0 +1,106 @@
+import os
+from typing import Dict, List, Tuple
+
+from AMPPanelDesignLib.CTF import CTF, Primer
+
+_complement_table = str.maketrans("ACGTacgt", "TGCAtgca")
+_complements = {"A": "T", "C": "G", "G": "C", "T": "A"}
+
+
+def reverse_complement(sequence: str) -> str:
+    return sequence.translate(_complement_table)[::-1]
+
+
+class PrimerDimer:
+    columns = ["primer_type", "three_prime_primer", "three_prime_pool", "partner_primer", "partner_pool",
+               "match_length", "match_gc_count", "three_prime_primer_sequence", "partner_primer_sequence"]
+
+    def __init__(self, primer_type: str, three_prime_primer: Primer, three_prime_pool: str, partner_primer: Primer,
+                 partner_pool: str, match_length: int, match_gc_count: int) -> None:
+        self.primer_type: str = primer_type
+        # primer whose 3' end anneals to the partner primer
+        self.three_prime_primer: Primer = three_prime_primer
+        self.three_prime_pool: str = three_prime_pool
+        self.partner_primer: Primer = partner_primer
+        self.partner_pool: str = partner_pool
+        # number of consecutive complementary bases starting at the 3' end of three_prime_primer
+        self.match_length: int = match_length
+        self.match_gc_count: int = match_gc_count
+
+    def __str__(self) -> str:
+        return "\t".join([self.primer_type, self.three_prime_primer.name, self.three_prime_pool,
+                          self.partner_primer.name, self.partner_pool, str(self.match_length),
+                          str(self.match_gc_count), self.three_prime_primer.sequence, self.partner_primer.sequence])
+
+
+# Finds primers whose 3' end is complementary to a primer from a different pool. The reverse complement of the last
+# k-mer (k = min_match_length) of every primer is put in a hash table, then every k-mer of every primer is looked up in
+# it. A hit means the 3' end of the indexed primer can anneal to the scanned primer; the match is then extended base by
+# base towards the 5' end of the indexed primer. This takes time proportional to the total primer length plus the
+# number of hits instead of comparing every pair of primers. GSP1 and GSP2 primers are used in separate reactions and
+# are only screened against primers of the same type.
+def find_primer_dimers(pools: List[CTF], min_match_length: int = 8,
+                       cross_pool_only: bool = True) -> List[PrimerDimer]:
+    if min_match_length <= 0:
+        raise Exception(f"Invalid minimum primer dimer match length ({min_match_length})")
+
+    # primer type -> (pool ID, primer, upper case sequence)
+    primers: Dict[str, List[Tuple[str, Primer, str]]] = {"gsp1": [], "gsp2": []}
+    for pool in pools:
+        added_primers = set()
+        for primer_pair in pool.primer_pairs:
+            for primer_type, primer in (("gsp1", primer_pair.gsp1), ("gsp2", primer_pair.gsp2)):
+                if (primer_type, primer.name, primer.sequence) not in added_primers:
+                    added_primers.add((primer_type, primer.name, primer.sequence))
+                    primers[primer_type].append((pool.id, primer, primer.sequence.upper()))
+
+    primer_dimers = []
+    for primer_type, typed_primers in primers.items():
+        three_prime_kmers: Dict[str, List[int]] = {}
+        for primer_index, (_, _, sequence) in enumerate(typed_primers):
+            if len(sequence) >= min_match_length:
+                kmer = reverse_complement(sequence[-min_match_length:])
+                if kmer not in three_prime_kmers:
+                    three_prime_kmers[kmer] = []
+                three_prime_kmers[kmer].append(primer_index)
+
+        best_matches: Dict[Tuple[int, int], Tuple[int, int]] = {}
+        for partner_index, (partner_pool, _, partner_sequence) in enumerate(typed_primers):
+            for position in range(len(partner_sequence) - min_match_length + 1):
+                kmer_hits = three_prime_kmers.get(partner_sequence[position:position + min_match_length])
+                if kmer_hits is None:
+                    continue
+                for primer_index in kmer_hits:
+                    pool, _, sequence = typed_primers[primer_index]
+                    if primer_index == partner_index or (cross_pool_only and pool == partner_pool):
+                        continue
+                    # base -1 - j of the 3' primer pairs with base position + j of the partner
+                    match_length = min_match_length
+                    while match_length < len(sequence) and position + match_length < len(partner_sequence) \
+                            and sequence[-1 - match_length] == _complements.get(
+                                partner_sequence[position + match_length]):
+                        match_length += 1
+                    if match_length > best_matches.get((primer_index, partner_index), (0, 0))[0]:
+                        match_gc_count = sum(1 for base in sequence[-match_length:] if base in "GC")
+                        best_matches[(primer_index, partner_index)] = (match_length, match_gc_count)
+
+        for (primer_index, partner_index), (match_length, match_gc_count) in best_matches.items():
+            pool, primer, _ = typed_primers[primer_index]
+            partner_pool, partner_primer, _ = typed_primers[partner_index]
+            primer_dimers.append(PrimerDimer(primer_type, primer, pool, partner_primer, partner_pool, match_length,
+                                             match_gc_count))
+
+    primer_dimers.sort(key=lambda dimer: (-dimer.match_length, -dimer.match_gc_count, dimer.primer_type,
+                                          dimer.three_prime_primer.name, dimer.partner_primer.name))
+    return primer_dimers
+
+
+def write_primer_dimer_report(primer_dimers: List[PrimerDimer], file_path: str) -> None:
+    output_directory = os.path.dirname(file_path)
+    if output_directory and not os.path.exists(output_directory):
+        os.makedirs(output_directory)
+
+    with open(file_path, "w") as sw:
+        sw.write("\t".join(PrimerDimer.columns) + "\n")
+        for primer_dimer in primer_dimers:
+            sw.write(str(primer_dimer) + "\n")
@@ -0,0 +1,81 @@
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from AMPPanelDesignLib.IntervalIndex import GenomicIntervalIndex
+
+
+# Fields encoded in a primer name such as EPOR_chr19_11489372_25_-_A1_GSP2:
+# <gene>_<chromosome>_<start>_<length>_<strand>_<version>_<GSP>. Names are parsed from the right so that gene names
+# containing underscores are kept whole. Names that do not follow this format only get a gene (the text before the
+# first underscore, as used historically) and no coordinates.
+class PrimerName:
+    def __init__(self, name: str, gene: str, chromosome: Optional[str] = None, start: Optional[int] = None,
+                 length: Optional[int] = None, strand: Optional[str] = None, version: Optional[str] = None,
+                 gsp: Optional[str] = None) -> None:
+        self.name: str = name
+        self.gene: str = gene
+        self.chromosome: Optional[str] = chromosome
+        self.start: Optional[int] = start
+        self.length: Optional[int] = length
+        self.strand: Optional[str] = strand
+        self.version: Optional[str] = version
+        self.gsp: Optional[str] = gsp
+
+    @property
+    def has_coordinates(self) -> bool:
+        return self.chromosome is not None
+
+    @property
+    def end(self) -> Optional[int]:
+        # last position covered by the primer
+        return self.start + self.length - 1 if self.has_coordinates else None
+
+
+# parsed names by primer name. Primers are shared by many designs, so every name is only parsed once per process.
+_parsed_primer_names: Dict[str, PrimerName] = {}
+
+
+def parse_primer_name(name: str) -> PrimerName:
+    parsed_name = _parsed_primer_names.get(name)
+    if parsed_name is None:
+        parsed_name = _parse_primer_name(name)
+        _parsed_primer_names[name] = parsed_name
+    return parsed_name
+
+
+def _parse_primer_name(name: str) -> PrimerName:
+    split = name.rsplit("_", 6)
+    if len(split) == 7:
+        gene, chromosome, start, length, strand, version, gsp = split
+        if gene and chromosome and start.isdigit() and length.isdigit() and strand in ("+", "-"):
+            return PrimerName(name=name, gene=gene, chromosome=chromosome, start=int(start), length=int(length),
+                              strand=strand, version=version, gsp=gsp)
+    return PrimerName(name=name, gene=name.split("_")[0])
+
+
+# Per-chromosome index of the primer coordinates encoded in primer names. Each chromosome keeps its primers sorted by
+# start position and is searched with bisect (see IntervalIndex), so finding the primers near a position takes
+# logarithmic time plus the number of primers found. Positions use the coordinate system of the primer names.
+class PrimerCoordinateIndex:
+    def __init__(self, ctf_repository: Dict[str, 'CTF']) -> None:
+        self._index: GenomicIntervalIndex = GenomicIntervalIndex(
+            (parsed_name.chromosome, parsed_name.start, parsed_name.end, (design_id, parsed_name))
+            for design_id, parsed_name in PrimerCoordinateIndex._repository_primer_names(ctf_repository))
+
+    @staticmethod
+    def _repository_primer_names(ctf_repository: Dict[str, 'CTF']) -> Iterable[Tuple[str, PrimerName]]:
+        for design_id in sorted(ctf_repository):
+            added_primers = set()
+            for primer_pair in ctf_repository[design_id].primer_pairs:
+                for primer in (primer_pair.gsp1, primer_pair.gsp2):
+                    if primer.name not in added_primers and primer.parsed_name.has_coordinates:
+                        added_primers.add(primer.name)
+                        yield design_id, primer.parsed_name
+
+    # (design ID, parsed primer name) of every primer within distance bp of position
+    def primers_near(self, chromosome: str, position: int, distance: int = 0) -> List[Tuple[str, PrimerName]]:
+        return sorted(self._index.overlapping(chromosome, position - distance, position + distance),
+                      key=lambda value: (value[0], value[1].start, value[1].name))
+
+    def designs_near(self, chromosome: str, position: int, distance: int = 0) -> Set[str]:
+        return set(design_id for design_id, _ in self._index.overlapping(chromosome, position - distance,
+                                                                         position + distance))
@@ -0,0 +1,215 @@
+import math
+import os
+from array import array
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from AMPPanelDesignLib.CTF import CTF, Primer
+
+# SantaLucia (1998) unified nearest-neighbor parameters for Watson-Crick pairs: enthalpy (kcal/mol), entropy (cal/K/mol)
+# and free energy at 37C (kcal/mol) of every 5'->3' dinucleotide step
+_nearest_neighbor_parameters = {
+    "AA": (-7.9, -22.2, -1.00), "TT": (-7.9, -22.2, -1.00),
+    "AT": (-7.2, -20.4, -0.88),
+    "TA": (-7.2, -21.3, -0.58),
+    "CA": (-8.5, -22.7, -1.45), "TG": (-8.5, -22.7, -1.45),
+    "GT": (-8.4, -22.4, -1.44), "AC": (-8.4, -22.4, -1.44),
+    "CT": (-7.8, -21.0, -1.28), "AG": (-7.8, -21.0, -1.28),
+    "GA": (-8.2, -22.2, -1.30), "TC": (-8.2, -22.2, -1.30),
+    "CG": (-10.6, -27.2, -2.17),
+    "GC": (-9.8, -24.4, -2.24),
+    "GG": (-8.0, -19.9, -1.84), "CC": (-8.0, -19.9, -1.84),
+}
+# initiation parameters (enthalpy, entropy) for each terminal base pair
+_terminal_gc_initiation = (0.1, -2.8)
+_terminal_at_initiation = (2.3, 4.1)
+_gas_constant = 1.987
+
+# Sequences are packed into one byte buffer of base codes (A=0, C=1, G=2, T=3, anything else=4) and every dinucleotide
+# step is looked up by code_1 * 5 + code_2 in flat parameter tables
+_base_codes = "ACGT"
+_ambiguous_code = 4
+_code_table = bytes(_base_codes.index(chr(c)) if chr(c) in _base_codes else _ambiguous_code for c in range(256))
+_step_enthalpies = [None] * 25
+_step_entropies = [None] * 25
+_step_free_energies = [None] * 25
+for _step, (_enthalpy, _entropy, _free_energy) in _nearest_neighbor_parameters.items():
+    _step_code = _base_codes.index(_step[0]) * 5 + _base_codes.index(_step[1])
+    _step_enthalpies[_step_code] = _enthalpy
+    _step_entropies[_step_code] = _entropy
+    _step_free_energies[_step_code] = _free_energy
+
+
+class PrimerMetrics:
+    def __init__(self, sequence: str, length: int, gc_content: float, max_homopolymer: int,
+                 three_prime_delta_g: Optional[float], tm: Optional[float]) -> None:
+        self.sequence: str = sequence
+        self.length: int = length
+        # fraction of G and C bases
+        self.gc_content: float = gc_content
+        # length of the longest run of a single base
+        self.max_homopolymer: int = max_homopolymer
+        # free energy (kcal/mol) of the last 5 bases of the 3' end. More negative values are more stable.
+        self.three_prime_delta_g: Optional[float] = three_prime_delta_g
+        # nearest-neighbor melting temperature (C). None when the sequence contains ambiguous bases.
+        self.tm: Optional[float] = tm
+
+
+# metrics of every (sequence, primer concentration, sodium concentration) evaluated so far in this process
+_primer_metrics_cache: Dict[Tuple[str, float, float], PrimerMetrics] = {}
+
+
+# Calculates the metrics of many sequences at once. Every unique sequence is only evaluated once per process, so
+# re-checking a CTF or checking designs that share primers is nearly free.
+def calculate_primer_metrics(sequences: Iterable[str], primer_concentration: float = 50e-9,
+                             sodium_concentration: float = 0.05) -> Dict[str, PrimerMetrics]:
+    requested_sequences = {sequence: sequence.upper() for sequence in sequences}
+    new_sequences = sorted(set(sequence for sequence in requested_sequences.values()
+                               if (sequence, primer_concentration, sodium_concentration) not in _primer_metrics_cache))
+    if new_sequences:
+        for sequence, metrics in zip(new_sequences, _calculate_packed_primer_metrics(new_sequences, primer_concentration,
+                                                                                     sodium_concentration)):
+            _primer_metrics_cache[(sequence, primer_concentration, sodium_concentration)] = metrics
+    return {sequence: _primer_metrics_cache[(upper_sequence, primer_concentration, sodium_concentration)]
+            for sequence, upper_sequence in requested_sequences.items()}
+
+
+def _calculate_packed_primer_metrics(sequences: List[str], primer_concentration: float,
+                                     sodium_concentration: float) -> List[PrimerMetrics]:
+    packed_codes = "".join(sequences).encode("ascii", errors="replace").translate(_code_table)
+    offsets = array("q", [0])
+    for sequence in sequences:
+        offsets.append(offsets[-1] + len(sequence))
+
+    metrics = []
+    for i, sequence in enumerate(sequences):
+        start = offsets[i]
+        end = offsets[i + 1]
+        length = end - start
+        # base counting runs over the packed buffer in C
+        gc_count = packed_codes.count(1, start, end) + packed_codes.count(2, start, end)
+        is_ambiguous = packed_codes.count(_ambiguous_code, start, end) > 0
+
+        max_homopolymer = 1 if length else 0
+        homopolymer = 1
+        enthalpy = 0.0
+        entropy = 0.0
+        three_prime_delta_g = 0.0
+        for position in range(start + 1, end):
+            previous_code = packed_codes[position - 1]
+            code = packed_codes[position]
+            if code == previous_code:
+                homopolymer += 1
+                if homopolymer > max_homopolymer:
+                    max_homopolymer = homopolymer
+            else:
+                homopolymer = 1
+            step_code = previous_code * 5 + code
+            if _step_enthalpies[step_code] is not None:
+                enthalpy += _step_enthalpies[step_code]
+                entropy += _step_entropies[step_code]
+                if position >= end - 4:
+                    three_prime_delta_g += _step_free_energies[step_code]
+
+        tm = None
+        if not is_ambiguous and length > 1:
+            for terminal_code in (packed_codes[start], packed_codes[end - 1]):
+                initiation_enthalpy, initiation_entropy = \
+                    _terminal_gc_initiation if terminal_code in (1, 2) else _terminal_at_initiation
+                enthalpy += initiation_enthalpy
+                entropy += initiation_entropy
+            # salt correction of the entropy and non self-complementary strands at equal concentration
+            entropy += 0.368 * (length - 1) * math.log(sodium_concentration)
+            tm = enthalpy * 1000 / (entropy + _gas_constant * math.log(primer_concentration / 4)) - 273.15
+
+        metrics.append(PrimerMetrics(sequence=sequence,
+                                     length=length,
+                                     gc_content=gc_count / length if length else 0.0,
+                                     max_homopolymer=max_homopolymer,
+                                     three_prime_delta_g=three_prime_delta_g if length >= 5 else None,
+                                     tm=tm))
+    return metrics
+
+
+class PrimerQCSpec:
+    def __init__(self, min_length: int = 15, max_length: int = 40, min_gc_content: float = 0.2,
+                 max_gc_content: float = 0.8, max_homopolymer: int = 6, min_three_prime_delta_g: float = -10.0,
+                 min_tm: float = 50.0, max_tm: float = 75.0) -> None:
+        self.min_length: int = min_length
+        self.max_length: int = max_length
+        self.min_gc_content: float = min_gc_content
+        self.max_gc_content: float = max_gc_content
+        self.max_homopolymer: int = max_homopolymer
+        # 3' ends more stable (more negative) than this are prone to mispriming
+        self.min_three_prime_delta_g: float = min_three_prime_delta_g
+        self.min_tm: float = min_tm
+        self.max_tm: float = max_tm
+
+    def get_failures(self, metrics: PrimerMetrics) -> List[str]:
+        failures = []
+        if not self.min_length <= metrics.length <= self.max_length:
+            failures.append(f"length {metrics.length} outside [{self.min_length}, {self.max_length}]")
+        if not self.min_gc_content <= metrics.gc_content <= self.max_gc_content:
+            failures.append(f"GC content {metrics.gc_content:.2f} outside [{self.min_gc_content}, "
+                            f"{self.max_gc_content}]")
+        if metrics.max_homopolymer > self.max_homopolymer:
+            failures.append(f"homopolymer run of {metrics.max_homopolymer} > {self.max_homopolymer}")
+        if metrics.three_prime_delta_g is not None and metrics.three_prime_delta_g < self.min_three_prime_delta_g:
+            failures.append(f"3' end dG {metrics.three_prime_delta_g:.2f} < {self.min_three_prime_delta_g}")
+        if metrics.tm is None:
+            failures.append("Tm could not be calculated (ambiguous bases)")
+        elif not self.min_tm <= metrics.tm <= self.max_tm:
+            failures.append(f"Tm {metrics.tm:.1f} outside [{self.min_tm}, {self.max_tm}]")
+        return failures
+
+
+class PrimerQCRecord:
+    columns = ["design_id", "primer_type", "primer_name", "sequence", "length", "gc_content", "max_homopolymer",
+               "three_prime_delta_g", "tm", "qc_status", "qc_failures"]
+
+    def __init__(self, design_id: str, primer_type: str, primer: Primer, metrics: PrimerMetrics,
+                 failures: List[str]) -> None:
+        self.design_id: str = design_id
+        self.primer_type: str = primer_type
+        self.primer: Primer = primer
+        self.metrics: PrimerMetrics = metrics
+        self.failures: List[str] = failures
+
+    @property
+    def passed(self) -> bool:
+        return not self.failures
+
+    def __str__(self) -> str:
+        three_prime_delta_g = self.metrics.three_prime_delta_g
+        return "\t".join([self.design_id, self.primer_type, self.primer.name, self.primer.sequence,
+                          str(self.metrics.length), f"{self.metrics.gc_content:.3f}", str(self.metrics.max_homopolymer),
+                          f"{three_prime_delta_g:.2f}" if three_prime_delta_g is not None else "",
+                          f"{self.metrics.tm:.1f}" if self.metrics.tm is not None else "",
+                          "PASS" if self.passed else "FAIL", "; ".join(self.failures)])
+
+
+# QC records for every unique GSP1 and GSP2 primer of the CTFs
+def check_primers(ctfs: Iterable[CTF], spec: PrimerQCSpec) -> List[PrimerQCRecord]:
+    primers = []
+    for ctf in ctfs:
+        added_primers = set()
+        for primer_pair in ctf.primer_pairs:
+            for primer_type, primer in (("gsp1", primer_pair.gsp1), ("gsp2", primer_pair.gsp2)):
+                if (primer.name, primer.sequence) not in added_primers:
+                    added_primers.add((primer.name, primer.sequence))
+                    primers.append((ctf.id, primer_type, primer))
+
+    metrics = calculate_primer_metrics(primer.sequence for _, _, primer in primers)
+    return [PrimerQCRecord(design_id, primer_type, primer, metrics[primer.sequence],
+                           spec.get_failures(metrics[primer.sequence]))
+            for design_id, primer_type, primer in primers]
+
+
+def write_primer_qc_report(records: List[PrimerQCRecord], file_path: str) -> None:
+    output_directory = os.path.dirname(file_path)
+    if output_directory and not os.path.exists(output_directory):
+        os.makedirs(output_directory)
+
+    with open(file_path, "w") as sw:
+        sw.write("\t".join(PrimerQCRecord.columns) + "\n")
+        for record in records:
+            sw.write(str(record) + "\n")
@@ -0,0 +1,141 @@
+from hashlib import blake2b
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from AMPPanelDesignLib.CTF import CTF, Primer, PrimerPair
+from AMPPanelDesignLib.Enums import MoleculeType
+
+_HASH_BITS = 64
+
+
+def _primer_key(primer: Primer) -> str:
+    # Decimal values that compare equal (e.g. 1 and 1.0) must produce the same key
+    return f"{primer.name}\t{primer.sequence}\t{primer.start}\t{primer.stop}\t{primer.boost_level.normalize()}"
+
+
+# Stable 64 bit hash of a primer pair. Two primer pairs get the same hash when they are equal by the same rules as
+# CTF.primer_pair_set, so sketch similarity agrees with the subset tests used when calculating raw materials.
+def primer_pair_hash(primer_pair: PrimerPair) -> int:
+    key = f"{_primer_key(primer_pair.gsp1)}\t{_primer_key(primer_pair.gsp2)}"
+    return int.from_bytes(blake2b(key.encode(), digest_size=_HASH_BITS // 8).digest(), "little")
+
+
+# MinHash sketch of a set of primer pairs using one permutation hashing: the hash space is split into num_bins equal
+# bins and every bin keeps the smallest hash that falls into it. This gives num_bins MinHash values from a single hash
+# per primer pair (instead of one hash per primer pair per value). Empty bins are filled by rotation densification, i.e.
+# they borrow the value of the next non-empty bin to the right, offset by the distance to it, so that sketches of
+# small sets can still be compared bin by bin.
+def sketch_primer_pairs(primer_pairs: Iterable[PrimerPair], num_bins: int = 128) -> Optional[Tuple[int, ...]]:
+    if num_bins <= 0 or num_bins & (num_bins - 1):
+        raise Exception(f"Invalid MinHash bin count ({num_bins}): must be a positive power of 2")
+    bin_bits = num_bins.bit_length() - 1
+    value_bits = _HASH_BITS - bin_bits
+    value_mask = (1 << value_bits) - 1
+
+    bins: List[Optional[int]] = [None] * num_bins
+    for primer_pair in primer_pairs:
+        primer_pair_hash_value = primer_pair_hash(primer_pair)
+        bin_index = primer_pair_hash_value >> value_bits
+        value = primer_pair_hash_value & value_mask
+        if bins[bin_index] is None or value < bins[bin_index]:
+            bins[bin_index] = value
+
+    if all(value is None for value in bins):
+        return None
+
+    sketch = []
+    for bin_index in range(num_bins):
+        distance = 0
+        while bins[(bin_index + distance) % num_bins] is None:
+            distance += 1
+        sketch.append(bins[(bin_index + distance) % num_bins] + (distance << value_bits))
+    return tuple(sketch)
+
+
+def estimate_jaccard(sketch_a: Tuple[int, ...], sketch_b: Tuple[int, ...]) -> float:
+    if len(sketch_a) != len(sketch_b):
+        raise Exception(f"Cannot compare MinHash sketches of different sizes ({len(sketch_a)}, {len(sketch_b)})")
+    return sum(1 for value_a, value_b in zip(sketch_a, sketch_b) if value_a == value_b) / len(sketch_a)
+
+
+class SimilarDesign:
+    columns = ["design_id", "jaccard", "containment", "shared_primer_pairs", "design_primer_pairs"]
+
+    def __init__(self, design: CTF, jaccard: float, containment: float, shared_primer_pairs: int) -> None:
+        self.design: CTF = design
+        # |query & design| / |query | design|
+        self.jaccard: float = jaccard
+        # fraction of the query primer pairs that the design already provides
+        self.containment: float = containment
+        self.shared_primer_pairs: int = shared_primer_pairs
+
+    def __str__(self) -> str:
+        return "\t".join([self.design.id, f"{self.jaccard:.4f}", f"{self.containment:.4f}",
+                          str(self.shared_primer_pairs), str(len(self.design.primer_pair_set))])
+
+
+# Locality sensitive hashing index over the MinHash sketches of a design repository. Sketches are split into bands of
+# rows_per_band values and every band is hashed into its own bucket table, so two designs land in at least one shared
+# bucket with probability 1 - (1 - J^rows_per_band)^bands for a Jaccard similarity J. Orders are often a union of
+# several inventoried designs, so the similarity to any single design is low. The defaults (64 bands of 2 rows) make
+# designs with J >= 0.3 candidates with > 99% probability and still find about half of the designs with J = 0.1.
+# Unrelated designs rarely share a bucket and candidates are re-ranked by their exact Jaccard similarity.
+class DesignSimilarityIndex:
+    def __init__(self, ctf_repository: Dict[str, CTF], molecule_type: Optional[MoleculeType] = None,
+                 bands: int = 64, rows_per_band: int = 2) -> None:
+        self.bands: int = bands
+        self.rows_per_band: int = rows_per_band
+        self.num_bins: int = bands * rows_per_band
+        self._designs: Dict[str, CTF] = {}
+        self._sketches: Dict[str, Tuple[int, ...]] = {}
+        self._buckets: List[Dict[Tuple[int, ...], List[str]]] = [{} for _ in range(bands)]
+        for design_id in sorted(ctf_repository):
+            ctf = ctf_repository[design_id]
+            if molecule_type is not None and molecule_type not in ctf.header.molecule_types:
+                continue
+            self.add(ctf)
+
+    def __len__(self) -> int:
+        return len(self._sketches)
+
+    def _band_keys(self, sketch: Tuple[int, ...]) -> Iterable[Tuple[int, Tuple[int, ...]]]:
+        for band in range(self.bands):
+            yield band, sketch[band * self.rows_per_band:(band + 1) * self.rows_per_band]
+
+    def add(self, ctf: CTF) -> None:
+        if ctf.id in self._designs:
+            raise Exception(f"Duplicate CTF design ID {ctf.id} added to design similarity index")
+        sketch = sketch_primer_pairs(ctf.primer_pairs, self.num_bins)
+        if sketch is None:
+            return
+        self._designs[ctf.id] = ctf
+        self._sketches[ctf.id] = sketch
+        for band, band_key in self._band_keys(sketch):
+            if band_key not in self._buckets[band]:
+                self._buckets[band][band_key] = []
+            self._buckets[band][band_key].append(ctf.id)
+
+    def candidates(self, ctf: CTF) -> Set[str]:
+        sketch = sketch_primer_pairs(ctf.primer_pairs, self.num_bins)
+        if sketch is None:
+            return set()
+        candidates = set()
+        for band, band_key in self._band_keys(sketch):
+            candidates.update(self._buckets[band].get(band_key, []))
+        return candidates
+
+    # Nearest inventoried designs to a CTF, most similar first
+    def query(self, ctf: CTF, max_results: int = 10, min_jaccard: float = 0.0) -> List[SimilarDesign]:
+        query_primer_pairs = ctf.primer_pair_set
+        results = []
+        for design_id in self.candidates(ctf):
+            if design_id == ctf.id:
+                continue
+            design = self._designs[design_id]
+            shared_primer_pairs = len(query_primer_pairs & design.primer_pair_set)
+            jaccard = shared_primer_pairs / len(query_primer_pairs | design.primer_pair_set)
+            if jaccard < min_jaccard:
+                continue
+            results.append(SimilarDesign(design, jaccard, shared_primer_pairs / len(query_primer_pairs),
+                                         shared_primer_pairs))
+        results.sort(key=lambda result: (-result.jaccard, -result.containment, result.design.id))
+        return results[:max_results]
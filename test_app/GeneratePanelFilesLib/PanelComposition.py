@@ -0,0 +1,134 @@
+import heapq
+import os
+from decimal import Decimal
+from typing import Dict, List, Optional, Set, Tuple
+
+from AMPPanelDesignLib.BED import BED
+from AMPPanelDesignLib.CTF import CTF, PrimerPair
+from AMPPanelDesignLib.Enums import MoleculeType
+from AMPPanelDesignLib.IntervalIndex import GenomicIntervalIndex
+
+
+class RequestedRegion:
+    def __init__(self, chrom: str, start: int, end: int, name: str) -> None:
+        # BED coordinates (0-based start, exclusive end)
+        self.chrom: str = chrom
+        self.start: int = start
+        self.end: int = end
+        self.name: str = name
+
+    def __str__(self) -> str:
+        return "\t".join([self.chrom, str(self.start), str(self.end), self.name])
+
+
+class PanelComposition:
+    def __init__(self, ctf: CTF, selected_designs: List[CTF], uncovered_regions: List[RequestedRegion]) -> None:
+        self.ctf: CTF = ctf
+        self.selected_designs: List[CTF] = selected_designs
+        self.uncovered_regions: List[RequestedRegion] = uncovered_regions
+
+    def write_uncovered_regions(self, file_path: str) -> None:
+        output_directory = os.path.dirname(file_path)
+        if output_directory and not os.path.exists(output_directory):
+            os.makedirs(output_directory)
+
+        with open(file_path, "w") as sw:
+            for region in self.uncovered_regions:
+                sw.write(str(region) + "\n")
+
+
+def _primer_pair_target(primer_pair: PrimerPair) -> Optional[Tuple[str, int, int]]:
+    # CTF target coordinates are 0-based like BED coordinates. Some rows (e.g. sex ID tiles) do not have usable
+    # target coordinates and are ignored for coverage purposes.
+    if not primer_pair.target_chromosome or not primer_pair.target_start.isdigit() \
+            or not primer_pair.target_stop.isdigit():
+        return None
+    target_start = int(primer_pair.target_start)
+    target_stop = max(int(primer_pair.target_stop), target_start + 1)
+    return primer_pair.target_chromosome, target_start, target_stop - 1
+
+
+def _is_composable_design(ctf: CTF, molecule_type: Optional[MoleculeType]) -> bool:
+    if molecule_type is not None and molecule_type not in ctf.header.molecule_types:
+        return False
+    ctf_gsp1_pool_concentration = ctf.header.total_gsp1_concentration or Decimal(100)
+    ctf_gsp2_pool_concentration = ctf.header.total_gsp2_concentration or Decimal(100)
+    return ctf_gsp1_pool_concentration == Decimal(100) and ctf_gsp2_pool_concentration == Decimal(100)
+
+
+# Chooses a small set of inventoried designs whose primer pair targets cover the requested regions. This is a weighted
+# set cover problem where every requested region is an element, every design is a set containing the regions that at
+# least one of its primer pair targets overlaps, and the cost of a design is its number of primer pairs. We use the
+# greedy approximation (repeatedly pick the design with the lowest cost per newly covered region) with a lazy priority
+# queue: the number of newly covered regions of a design can only go down as other designs are picked, so a design
+# popped from the queue only needs to be re-scored when its saved score is stale.
+def select_covering_designs(regions: List[RequestedRegion], designs: List[CTF]) -> (List[CTF], Set[int]):
+    target_index = GenomicIntervalIndex(
+        (target[0], target[1], target[2], design_index)
+        for design_index, design in enumerate(designs)
+        for target in (_primer_pair_target(primer_pair) for primer_pair in design.primer_pairs)
+        if target is not None)
+
+    design_regions: Dict[int, Set[int]] = {}
+    for region_index, region in enumerate(regions):
+        for design_index in set(target_index.overlapping(region.chrom, region.start, region.end - 1)):
+            if design_index not in design_regions:
+                design_regions[design_index] = set()
+            design_regions[design_index].add(region_index)
+
+    queue: List[Tuple[float, int, int]] = []
+    for design_index, covered_regions in design_regions.items():
+        cost = len(designs[design_index].primer_pair_set)
+        heapq.heappush(queue, (cost / len(covered_regions), design_index, len(covered_regions)))
+
+    covered: Set[int] = set()
+    selected: List[CTF] = []
+    while queue and len(covered) < len(regions):
+        _, design_index, saved_gain = heapq.heappop(queue)
+        gain = len(design_regions[design_index] - covered)
+        if gain == 0:
+            continue
+        if gain != saved_gain:
+            cost = len(designs[design_index].primer_pair_set)
+            heapq.heappush(queue, (cost / gain, design_index, gain))
+            continue
+        selected.append(designs[design_index])
+        covered.update(design_regions[design_index])
+
+    return selected, covered
+
+
+def load_requested_regions(bed: BED) -> List[RequestedRegion]:
+    return [RequestedRegion(entry.chrom, entry.chrom_start, entry.chrom_end,
+                            entry.name or f"{entry.chrom}:{entry.chrom_start}-{entry.chrom_end}")
+            for entry in bed.entries]
+
+
+# Builds a raw CTF for a BED of requested regions out of the primer pairs of inventoried designs. Primer pairs shared by
+# several selected designs are only added once. Regions that none of the designs reach are returned so that they can be
+# designed separately.
+def compose_panel(design_id: str, project_name: str, bed: BED, ctf_repository: Dict[str, CTF],
+                  molecule_type: Optional[MoleculeType]) -> PanelComposition:
+    regions = load_requested_regions(bed)
+    designs = [ctf for _, ctf in sorted(ctf_repository.items()) if _is_composable_design(ctf, molecule_type)]
+    selected_designs, covered = select_covering_designs(regions, designs)
+
+    primer_pairs: List[PrimerPair] = []
+    added_primer_pairs = set()
+    for design in selected_designs:
+        for primer_pair in design.primer_pairs:
+            primer_pair_key = (primer_pair.gsp1, primer_pair.gsp2)
+            if primer_pair_key not in added_primer_pairs:
+                added_primer_pairs.add(primer_pair_key)
+                primer_pairs.append(primer_pair)
+
+    header = {"ProjectName": project_name,
+              "PartNumber": "",
+              "ProjectVersion": "",
+              "MoleculeType": molecule_type.value if molecule_type is not None else "",
+              "TotalGsp1Concentration": "",
+              "TotalGsp2Concentration": "",
+              "ComposedFrom": ",".join(design.id for design in selected_designs)}
+    ctf = CTF(design_id, None, header, primer_pairs)
+    uncovered_regions = [region for region_index, region in enumerate(regions) if region_index not in covered]
+    return PanelComposition(ctf, selected_designs, uncovered_regions)
@@ -0,0 +1,82 @@
+import os
+from collections import OrderedDict
+from typing import Dict, FrozenSet, Optional, Tuple
+
+from AMPPanelDesignLib.CTF import CTF, load_all_ctfs
+from AMPPanelDesignLib.Enums import WorkflowType
+from AMPPanelDesignLib.GTF import GTFRepository, index_all_gtfs
+from GeneratePanelFilesLib.Logger import Logger
+from GeneratePanelFilesLib.WorkflowSteps.CalculateRawMaterialVolumes import ComponentCTFSolver
+
+# (path, size, modification time) of every file of a folder with a given extension
+_FolderSignature = FrozenSet[Tuple[str, int, int]]
+
+
+def _get_folder_signature(folder_path: str, extension: str) -> _FolderSignature:
+    file_paths = [os.path.join(directory, file_name) for directory, _, file_names in os.walk(folder_path)
+                  for file_name in file_names if file_name.lower().endswith(extension)]
+    return frozenset((file_path, file_stat.st_size, file_stat.st_mtime_ns)
+                     for file_path, file_stat in ((file_path, os.stat(file_path)) for file_path in file_paths))
+
+
+def _normalize_folder_path(folder_path: str) -> str:
+    return os.path.normpath(os.path.abspath(folder_path))
+
+
+# primer pairs and header of a cleaned CTF, so the same CTF loaded and cleaned again maps to the same solver
+def _get_ctf_key(ctf: CTF) -> Tuple:
+    return ctf.id, tuple(sorted(ctf.header.items.items())), tuple(str(primer_pair) for primer_pair in ctf.primer_pairs)
+
+
+# State kept between runs of the panel file generator by a long-lived caller such as the GUI. Design repositories are
+# loaded once per folder and only reloaded when a CTF (or GTF) file of the folder is added, removed or modified. One
+# ComponentCTFSolver is kept per cleaned CTF and workflow (at most max_solvers, least recently used first out), so a
+# run that only changes the pinned or excluded designs re-solves with the compatibility graph and the subgraph
+# solutions of the previous runs instead of starting over.
+class PanelFileSession:
+    def __init__(self, max_solvers: int = 4) -> None:
+        self.max_solvers: int = max_solvers
+        self._ctf_repositories: Dict[str, Tuple[_FolderSignature, Dict[str, CTF]]] = {}
+        self._gtf_repositories: Dict[Tuple[str, bool], Tuple[_FolderSignature, GTFRepository]] = {}
+        # (CTF key, workflow, design repository folder, spike-in folder, cache size) -> solver
+        self._solvers: 'OrderedDict[Tuple, ComponentCTFSolver]' = OrderedDict()
+
+    def load_ctf_repository(self, folder_path: str) -> Dict[str, CTF]:
+        folder_key = _normalize_folder_path(folder_path)
+        signature = _get_folder_signature(folder_path, ".ctf")
+        if folder_key in self._ctf_repositories and self._ctf_repositories[folder_key][0] == signature:
+            return self._ctf_repositories[folder_key][1]
+        # solvers built from the previous contents of the folder are out of date
+        for solver_key in [solver_key for solver_key in self._solvers if folder_key in solver_key[2:4]]:
+            del self._solvers[solver_key]
+        self._ctf_repositories[folder_key] = (signature, load_all_ctfs(folder_path))
+        return self._ctf_repositories[folder_key][1]
+
+    def index_gtf_repository(self, folder_path: str, strict: bool = False) -> GTFRepository:
+        repository_key = (_normalize_folder_path(folder_path), strict)
+        signature = _get_folder_signature(folder_path, ".gtf")
+        if repository_key not in self._gtf_repositories or self._gtf_repositories[repository_key][0] != signature:
+            self._gtf_repositories[repository_key] = (signature, index_all_gtfs(folder_path, strict))
+        return self._gtf_repositories[repository_key][1]
+
+    def get_solver(self, raw_ctf: CTF, workflow_type: WorkflowType, design_repository_folder_path: str,
+                   spike_in_folder_path: Optional[str], logger: Optional[Logger] = None,
+                   max_solver_cache_bytes: Optional[int] = None) -> ComponentCTFSolver:
+        ctf_library = self.load_ctf_repository(design_repository_folder_path)
+        spike_in_library = self.load_ctf_repository(spike_in_folder_path) if spike_in_folder_path is not None else None
+        solver_key = (_get_ctf_key(raw_ctf), workflow_type, _normalize_folder_path(design_repository_folder_path),
+                      _normalize_folder_path(spike_in_folder_path) if spike_in_folder_path is not None else None,
+                      max_solver_cache_bytes)
+        solver = self._solvers.get(solver_key)
+        if solver is None:
+            solver = ComponentCTFSolver(raw_ctf, workflow_type, ctf_library, spike_in_library, logger,
+                                        max_solver_cache_bytes)
+            self._solvers[solver_key] = solver
+            while len(self._solvers) > self.max_solvers:
+                self._solvers.popitem(last=False)
+        else:
+            if logger is not None:
+                logger.message("Reusing the design solver of a previous run for this CTF.")
+            solver.logger = logger
+            self._solvers.move_to_end(solver_key)
+        return solver
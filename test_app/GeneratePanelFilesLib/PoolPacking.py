@@ -0,0 +1,182 @@
+from math import ceil
+from typing import Dict, List, Optional
+
+from AMPPanelDesignLib.CTF import PrimerPair
+from GeneratePanelFilesLib.Logger import Logger
+
+
+class GeneGroup:
+    def __init__(self, gene_name: str, primer_pairs: List[PrimerPair]) -> None:
+        self.gene_name: str = gene_name
+        self.primer_pairs: List[PrimerPair] = primer_pairs
+        self.gsp1_count: int = len(set(primer_pair.gsp1 for primer_pair in primer_pairs))
+        self.gsp2_count: int = len(set(primer_pair.gsp2 for primer_pair in primer_pairs))
+
+    @property
+    def size(self) -> int:
+        return len(self.primer_pairs)
+
+
+class Pool:
+    def __init__(self, capacity: int) -> None:
+        self.capacity: int = capacity
+        self.gene_groups: List[GeneGroup] = []
+        self.size: int = 0
+        self.gsp1_count: int = 0
+        self.gsp2_count: int = 0
+
+    @property
+    def free_space(self) -> int:
+        return self.capacity - self.size
+
+    @property
+    def load(self) -> (int, int):
+        return max(self.gsp1_count, self.gsp2_count), self.size
+
+    @property
+    def primer_pairs(self) -> List[PrimerPair]:
+        return [primer_pair for gene_group in self.gene_groups for primer_pair in gene_group.primer_pairs]
+
+    def add(self, gene_group: GeneGroup) -> None:
+        if gene_group.size > self.free_space:
+            raise Exception(f"Gene {gene_group.gene_name} ({gene_group.size} primer pairs) does not fit in a pool with "
+                            f"{self.free_space} primer pairs of free space.")
+        self.gene_groups.append(gene_group)
+        self.size += gene_group.size
+        self.gsp1_count += gene_group.gsp1_count
+        self.gsp2_count += gene_group.gsp2_count
+
+    def remove(self, gene_group: GeneGroup) -> None:
+        self.gene_groups.remove(gene_group)
+        self.size -= gene_group.size
+        self.gsp1_count -= gene_group.gsp1_count
+        self.gsp2_count -= gene_group.gsp2_count
+
+
+class PoolPackingResult:
+    def __init__(self, pools: List[Pool], lower_bound: int, split_genes: List[str]) -> None:
+        self.pools: List[Pool] = pools
+        self.lower_bound: int = lower_bound
+        self.split_genes: List[str] = split_genes
+
+    @property
+    def primer_pair_count(self) -> int:
+        return sum(pool.size for pool in self.pools)
+
+    def log_summary(self, logger: Logger) -> None:
+        logger.message(f"Packed {self.primer_pair_count} spike-in primer pairs into {len(self.pools)} pool(s) "
+                       f"(lower bound {self.lower_bound}).")
+        if self.split_genes:
+            logger.message(f"Genes with more primer pairs than fit in a single pool: {', '.join(self.split_genes)}")
+
+
+# Keeps track of the pools that still have free space, bucketed by the amount of free space left. Pool capacity is a
+# small fixed number (550 primer pairs), so finding the best fitting pool for a gene is a scan over at most `capacity`
+# buckets, which keeps best-fit decreasing at O(n log n) for the initial sort and O(1) per placed gene afterwards.
+class _FreeSpaceIndex:
+    def __init__(self, capacity: int) -> None:
+        self._buckets: List[List[Pool]] = [[] for _ in range(capacity + 1)]
+
+    def add(self, pool: Pool) -> None:
+        if pool.free_space > 0:
+            self._buckets[pool.free_space].append(pool)
+
+    def pop_best_fit(self, size: int) -> Optional[Pool]:
+        for free_space in range(size, len(self._buckets)):
+            if self._buckets[free_space]:
+                return self._buckets[free_space].pop()
+        return None
+
+
+def _best_fit_decreasing(gene_groups: List[GeneGroup], pools: List[Pool], capacity: int) -> None:
+    free_space_index = _FreeSpaceIndex(capacity)
+    for pool in pools:
+        free_space_index.add(pool)
+    for gene_group in sorted(gene_groups, key=lambda group: (-group.size, group.gene_name)):
+        pool = free_space_index.pop_best_fit(gene_group.size)
+        if pool is None:
+            pool = Pool(capacity)
+            pools.append(pool)
+        pool.add(gene_group)
+        free_space_index.add(pool)
+
+
+# Tries to empty the least full pools by moving their genes into the free space of the other pools (best-fit, largest
+# genes first). A pool is only removed if all of its genes can be moved, otherwise the moves are rolled back.
+def _eliminate_pools(pools: List[Pool], lower_bound: int) -> List[Pool]:
+    for candidate in sorted(pools, key=lambda pool: pool.size):
+        if len(pools) <= lower_bound:
+            break
+        other_pools = [pool for pool in pools if pool is not candidate]
+        moves = []
+        for gene_group in sorted(candidate.gene_groups, key=lambda group: -group.size):
+            target_pool = min((pool for pool in other_pools if pool.free_space >= gene_group.size),
+                              key=lambda pool: pool.free_space, default=None)
+            if target_pool is None:
+                break
+            target_pool.add(gene_group)
+            moves.append((gene_group, target_pool))
+        if len(moves) == len(candidate.gene_groups):
+            pools = other_pools
+        else:
+            for gene_group, target_pool in moves:
+                target_pool.remove(gene_group)
+    return pools
+
+
+# Local search that evens out the GSP1/GSP2 primer counts across pools. Each step moves one gene from the most loaded
+# pool to the least loaded pool, picking the gene that brings the two pools closest to each other. The search stops
+# when no move improves the balance or after max_moves moves.
+def _balance_pools(pools: List[Pool], max_moves: int) -> None:
+    for _ in range(max_moves):
+        if len(pools) < 2:
+            return
+        heaviest_pool = max(pools, key=lambda pool: pool.load)
+        lightest_pool = min(pools, key=lambda pool: pool.load)
+        heaviest_load = heaviest_pool.load[0]
+        lightest_load = lightest_pool.load[0]
+        best_gene_group = None
+        best_spread = heaviest_load - lightest_load
+        for gene_group in heaviest_pool.gene_groups:
+            if gene_group.size > lightest_pool.free_space:
+                continue
+            gene_load = max(gene_group.gsp1_count, gene_group.gsp2_count)
+            spread = abs((heaviest_load - gene_load) - (lightest_load + gene_load))
+            if spread < best_spread:
+                best_gene_group = gene_group
+                best_spread = spread
+        if best_gene_group is None:
+            return
+        heaviest_pool.remove(best_gene_group)
+        lightest_pool.add(best_gene_group)
+
+
+# Packs per-gene primer pair lists into as few pools as possible while keeping all primer pairs for a gene in the same
+# pool. Genes with more primer pairs than fit in a single pool are split into full pools plus a remainder that is packed
+# like any other gene. The number of pools used is reported together with the lower bound ceil(total / capacity).
+def pack_primer_pairs(per_gene_primer_pairs: Dict[str, List[PrimerPair]], capacity: int,
+                      max_balancing_moves: Optional[int] = None) -> PoolPackingResult:
+    pools: List[Pool] = []
+    gene_groups: List[GeneGroup] = []
+    split_genes: List[str] = []
+    for gene_name, primer_pairs in per_gene_primer_pairs.items():
+        full_pool_count = len(primer_pairs) // capacity
+        if full_pool_count and len(primer_pairs) > capacity:
+            split_genes.append(gene_name)
+        for i in range(full_pool_count):
+            pool = Pool(capacity)
+            pool.add(GeneGroup(gene_name, primer_pairs[i * capacity:(i + 1) * capacity]))
+            pools.append(pool)
+        remainder = primer_pairs[full_pool_count * capacity:]
+        if remainder:
+            gene_groups.append(GeneGroup(gene_name, remainder))
+
+    total_primer_pairs = sum(len(primer_pairs) for primer_pairs in per_gene_primer_pairs.values())
+    lower_bound = ceil(total_primer_pairs / capacity)
+
+    _best_fit_decreasing(gene_groups, pools, capacity)
+    pools = _eliminate_pools(pools, lower_bound)
+    _balance_pools(pools, max_balancing_moves if max_balancing_moves is not None else len(gene_groups))
+
+    pools.sort(key=lambda pool: (-pool.size, pool.gene_groups[0].gene_name))
+    return PoolPackingResult(pools, lower_bound, split_genes)
@@ -0,0 +1,119 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
+from glob import glob
+from typing import Dict, List, Optional, Set, TextIO
+
+from AMPPanelDesignLib.CTF import CTF, load_ctf
+from AMPPanelDesignLib.Enums import WorkflowType, DiseaseType
+from GeneratePanelFilesLib.WorkflowSteps.CalculateRawMaterialVolumes import get_raw_materials, _calculate_fill_volumes
+from GeneratePanelFilesLib.WorkflowSteps.CleanCTF import clean_ctf
+
+
+class QuoteResult:
+    columns = ["CTF File", "Design ID", "Inventoried Parts", "Inventoried Designs", "Spike-In Pools", "Primer Pairs",
+               "Primer Pairs From Inventory", "Unique GSP2 Primers", "Actual Fill Volume mL", "Nominal Fill Volume uL",
+               "Solve Time s", "Error"]
+
+    def __init__(self, ctf_file_path: str, design_id: Optional[str] = None, inventoried_parts: Optional[int] = None,
+                 inventoried_designs: Optional[int] = None, spike_in_pools: Optional[int] = None,
+                 primer_pairs: Optional[int] = None, primer_pairs_from_inventory: Optional[int] = None,
+                 unique_gsp2_count: Optional[int] = None, actual_fill_volume_ml: Optional[Decimal] = None,
+                 nominal_fill_volume_ul: Optional[Decimal] = None, solve_time_s: Optional[float] = None,
+                 error: Optional[str] = None) -> None:
+        self.ctf_file_path: str = ctf_file_path
+        self.design_id: Optional[str] = design_id
+        self.inventoried_parts: Optional[int] = inventoried_parts
+        self.inventoried_designs: Optional[int] = inventoried_designs
+        self.spike_in_pools: Optional[int] = spike_in_pools
+        self.primer_pairs: Optional[int] = primer_pairs
+        self.primer_pairs_from_inventory: Optional[int] = primer_pairs_from_inventory
+        self.unique_gsp2_count: Optional[int] = unique_gsp2_count
+        self.actual_fill_volume_ml: Optional[Decimal] = actual_fill_volume_ml
+        self.nominal_fill_volume_ul: Optional[Decimal] = nominal_fill_volume_ul
+        self.solve_time_s: Optional[float] = solve_time_s
+        self.error: Optional[str] = error
+
+    def __str__(self) -> str:
+        values = [self.ctf_file_path, self.design_id, self.inventoried_parts, self.inventoried_designs,
+                  self.spike_in_pools, self.primer_pairs, self.primer_pairs_from_inventory, self.unique_gsp2_count,
+                  self.actual_fill_volume_ml, self.nominal_fill_volume_ul,
+                  f"{self.solve_time_s:.3f}" if self.solve_time_s is not None else None, self.error]
+        return "\t".join("" if value is None else str(value) for value in values)
+
+
+# The design repository is loaded once by the parent process and handed to every worker process through the pool
+# initializer, so workers never reload it. On platforms that fork, the workers share the parent's copy.
+_warm_repository: Dict[str, object] = {}
+
+
+def _initialize_worker(workflow: WorkflowType, disease: DiseaseType, ctf_repository: Dict[str, CTF],
+                       spike_in_repository: Optional[Dict[str, CTF]], excluded_designs: Optional[Set[str]],
+                       do_clean_ctf: bool) -> None:
+    _warm_repository["workflow"] = workflow
+    _warm_repository["disease"] = disease
+    _warm_repository["ctf_repository"] = ctf_repository
+    _warm_repository["spike_in_repository"] = spike_in_repository
+    _warm_repository["excluded_designs"] = excluded_designs
+    _warm_repository["do_clean_ctf"] = do_clean_ctf
+
+
+def _quote_ctf(ctf_file_path: str) -> QuoteResult:
+    result = QuoteResult(ctf_file_path)
+    try:
+        ctf = load_ctf(ctf_file_path)
+        result.design_id = ctf.id
+        if _warm_repository["do_clean_ctf"]:
+            ctf = clean_ctf(ctf)
+        result.primer_pairs = len(ctf.primer_pair_set)
+        result.unique_gsp2_count = ctf.unique_gsp2_count
+
+        start_time = time.perf_counter()
+        gsp1_raw_materials, gsp2_raw_materials, spike_in_ctfs = \
+            get_raw_materials(raw_ctf=ctf, workflow_type=_warm_repository["workflow"],
+                              ctf_library=_warm_repository["ctf_repository"],
+                              spike_in_library=_warm_repository["spike_in_repository"],
+                              excluded_designs=_warm_repository["excluded_designs"])
+        result.solve_time_s = time.perf_counter() - start_time
+
+        inventoried_raw_materials = [raw_material for raw_material in gsp1_raw_materials + gsp2_raw_materials
+                                     if not raw_material.is_spike_in and raw_material.design_id is not None]
+        result.inventoried_parts = len(set(raw_material.part_number for raw_material in inventoried_raw_materials))
+        result.inventoried_designs = len(set(raw_material.design_id for raw_material in inventoried_raw_materials))
+        result.spike_in_pools = len(spike_in_ctfs)
+        result.primer_pairs_from_inventory = result.primer_pairs - sum(
+            len(spike_in_ctf.primer_pair_set) for spike_in_ctf in spike_in_ctfs if not spike_in_ctf.file_path)
+
+        result.actual_fill_volume_ml, result.nominal_fill_volume_ul = _calculate_fill_volumes(
+            _warm_repository["workflow"], _warm_repository["disease"], ctf.unique_gsp2_count)
+    except Exception as e:
+        result.error = str(e)
+    return result
+
+
+def find_candidate_ctfs(candidate_folder_path: str) -> List[str]:
+    return sorted(ctf for walk_result in os.walk(candidate_folder_path)
+                  for ctf in glob(os.path.join(walk_result[0], "*.ctf")))
+
+
+# Quotes every candidate CTF against the same warm design repository without writing any per-panel files. Candidates
+# are processed in parallel by max_workers processes (one process per CPU by default, or in-process if max_workers is 1)
+# and the results are returned in the same order as candidate_ctf_paths.
+def quote_ctfs(candidate_ctf_paths: List[str], workflow: WorkflowType, disease: DiseaseType,
+               ctf_repository: Dict[str, CTF], spike_in_repository: Optional[Dict[str, CTF]] = None,
+               excluded_designs: Optional[Set[str]] = None, do_clean_ctf: bool = True,
+               max_workers: Optional[int] = None) -> List[QuoteResult]:
+    initializer_args = (workflow, disease, ctf_repository, spike_in_repository, excluded_designs, do_clean_ctf)
+    if max_workers == 1 or len(candidate_ctf_paths) < 2:
+        _initialize_worker(*initializer_args)
+        return [_quote_ctf(ctf_file_path) for ctf_file_path in candidate_ctf_paths]
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_initialize_worker,
+                             initargs=initializer_args) as executor:
+        return list(executor.map(_quote_ctf, candidate_ctf_paths))
+
+
+def write_quote_results(writer: TextIO, results: List[QuoteResult]) -> None:
+    writer.write("\t".join(QuoteResult.columns) + "\n")
+    for result in results:
+        writer.write(str(result) + "\n")
@@ -0,0 +1,38 @@
+import os
+from typing import Optional, Union
+
+from AMPPanelDesignLib.BED import BED, ColumnarBED
+from AMPPanelDesignLib.GTF import GTF
+from AMPPanelDesignLib.PanelInfo import PanelInfo
+from AMPPanelDesignLib.PanelStats import PanelStats, calculate_panel_stats, write_panel_stats, \
+    write_unreached_targets
+from GeneratePanelFilesLib.Logger import Logger
+
+
+def calculate_panel_stats_step(logger: Logger, panel_info: PanelInfo, gtf: GTF, bed: Optional[Union[BED, ColumnarBED]],
+                               output_directory: str) -> Optional[PanelStats]:
+    logger.message("Calculating panel footprint and coverage statistics...")
+    if panel_info is None:
+        logger.warning("No Panel Info config file provided, skipping panel statistics.")
+        return None
+    elif gtf is None:
+        logger.warning("No GTF file available, skipping panel statistics.")
+        return None
+    elif bed is None:
+        logger.warning("No loaded target coverage file available, skipping panel statistics.")
+        return None
+
+    panel_stats = calculate_panel_stats(gtf, bed, panel_info.max_target_roi_distance)
+    panel_stats_file_path = os.path.join(output_directory, f"{panel_info.panel_id}.panel_stats.txt")
+    logger.message(f"Writing panel statistics to {panel_stats_file_path}")
+    write_panel_stats(panel_stats, panel_stats_file_path)
+    total = panel_stats.total
+    logger.message(f"{total.targeted_bases} targeted bases on {len(panel_stats.chromosomes)} chromosome(s), "
+                   f"{total.covered_target_bases} of them covered by primers.")
+    if panel_stats.unreached_targets:
+        unreached_targets_file_path = os.path.join(output_directory, f"{panel_info.panel_id}.unreached_targets.bed")
+        write_unreached_targets(panel_stats, unreached_targets_file_path)
+        logger.warning(f"{len(panel_stats.unreached_targets)} of {total.bed_targets} BED target(s) are not reached "
+                       f"by any primer within {panel_info.max_target_roi_distance} bases. See "
+                       f"{unreached_targets_file_path}")
+    return panel_stats
@@ -1,7 +1,9 @@
 import copy
 import os
+import sys
+from collections import OrderedDict
 from decimal import Decimal, ROUND_DOWN
-from typing import List, Dict, Set, FrozenSet
+from typing import List, Dict, Set, FrozenSet, Optional
 
 from AMPPanelDesignLib.CTF import CTF, PrimerPair
 from AMPPanelDesignLib.Enums import DiseaseType
@@ -10,41 +12,167 @@ from AMPPanelDesignLib.InventoryTracking import InventoryTracking
 from AMPPanelDesignLib.PanelInfo import PanelInfo
 from AMPPanelDesignLib.PanelInfo import RawMaterialInfo, catalog_panel_lookup, CatalogPanelPart, CatalogPanelSubPart
 from GeneratePanelFilesLib.Logger import Logger
+from GeneratePanelFilesLib.PoolPacking import pack_primer_pairs
+
+
+class SubgraphSolutionCache:
+    # Bounded memo table for CTFCompatibilityGraph. Keys are integer bitmasks of the nodes in a subgraph and values are
+    # integer bitmasks of the optimal solution for that subgraph, so each entry costs a couple of small ints instead of
+    # two frozensets of CTF objects. Entries are evicted in least-recently-used order once the estimated memory used by
+    # the table exceeds max_bytes. An evicted subgraph is simply re-solved if it is encountered again.
+    default_max_bytes: int = 256 * 1024 * 1024
+
+    # approximate per-entry overhead of an OrderedDict slot (hash table entry + linked list node) in CPython
+    _entry_overhead_bytes: int = 100
+
+    def __init__(self, max_bytes: Optional[int] = None) -> None:
+        self.max_bytes: int = max_bytes if max_bytes is not None else SubgraphSolutionCache.default_max_bytes
+        self._entries: OrderedDict = OrderedDict()
+        self._entry_bytes: Dict[int, int] = {}
+        self.current_bytes: int = 0
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+        self.peak_entries: int = 0
+        self.peak_bytes: int = 0
+
+    def get(self, key: int) -> Optional[int]:
+        value = self._entries.get(key, None)
+        if value is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: int, value: int) -> None:
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return
+        entry_bytes = sys.getsizeof(key) + sys.getsizeof(value) + SubgraphSolutionCache._entry_overhead_bytes
+        self._entries[key] = value
+        self._entry_bytes[key] = entry_bytes
+        self.current_bytes += entry_bytes
+        while self.current_bytes > self.max_bytes and len(self._entries) > 1:
+            evicted_key, _ = self._entries.popitem(last=False)
+            self.current_bytes -= self._entry_bytes.pop(evicted_key)
+            self.evictions += 1
+        self.peak_entries = max(self.peak_entries, len(self._entries))
+        self.peak_bytes = max(self.peak_bytes, self.current_bytes)
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def log_statistics(self, logger: Logger) -> None:
+        logger.message(f"Subgraph solution cache: {self.hits} hits / {self.hits + self.misses} lookups "
+                       f"({self.hit_rate:.1%} hit rate), {self.evictions} evictions, peak {self.peak_entries} entries "
+                       f"(~{self.peak_bytes / (1024 * 1024):.1f} MiB of {self.max_bytes / (1024 * 1024):.1f} MiB cap)")
 
 
 # The purpose of this graph is to help find the set of CTFs with the greatest combined GSP1/2 primer count while resolving
 # all conflicts/incompatibilities between CTF files so that the final set does not contain any duplicate GSP1/2 primers.
 class CTFCompatibilityGraph:
-    def __init__(self) -> None:
-        self._graph: Dict[CTF, Set[CTF]] = {}
+    def __init__(self, max_cache_bytes: Optional[int] = None) -> None:
+        self._nodes: List[CTF] = []
+        self._node_indices: Dict[CTF, int] = {}
+        self._adjacency: List[int] = []
+        self._primer_counts: List[int] = []
+        self._solved_subgraphs: SubgraphSolutionCache = SubgraphSolutionCache(max_cache_bytes)
 
     # Each node in this graph is a CTF. Edges between nodes represent compatibility between two CTFs. Two CTFs are
     # considered compatible if their unique GSP1/2 primer sets are completely disjoint, meaning they do not share any
-    # GSP1/2 primers. The graph is represented by an adjacency list that is implemented using a Dict[CTF, Set[CTF]].
+    # GSP1/2 primers. Every CTF is assigned a bit position in the order it was added, and the graph is represented by
+    # an adjacency list of integer bitmasks (bit i of self._adjacency[j] is set if nodes i and j are compatible).
     # Upon adding a new CTF to this graph, the new CTF is compared against all previously added CTFs to
     # check whether or not they are compatible. If the CTFs are compatible, then both CTFs are added to each other's
     # edge lists.
     def add(self, new_ctf: CTF) -> None:
-        if new_ctf in self._graph:
+        if new_ctf in self._node_indices:
             raise Exception(f"Cannot add same CTF {new_ctf.file_path or '[NO FILE PATH]'} twice.")
 
-        compatible_ctfs = set()
-        for ctf in self._graph:
+        new_index = len(self._nodes)
+        new_bit = 1 << new_index
+        compatible_nodes = 0
+        for index, ctf in enumerate(self._nodes):
             if new_ctf.unique_gsp1_primers.isdisjoint(ctf.unique_gsp1_primers) \
                     and new_ctf.unique_gsp2_primers.isdisjoint(ctf.unique_gsp2_primers):
-                compatible_ctfs.add(ctf)
-                self._graph[ctf].add(new_ctf)
-        self._graph[new_ctf] = compatible_ctfs
-
-    def get_largest_ctf_set(self) -> FrozenSet[CTF]:
-        solved_subgraphs = {}
-        solution = self._get_largest_ctf_set(self._graph, solved_subgraphs)
-        return solution
+                compatible_nodes |= 1 << index
+                self._adjacency[index] |= new_bit
+        self._nodes.append(new_ctf)
+        self._node_indices[new_ctf] = new_index
+        self._adjacency.append(compatible_nodes)
+        self._primer_counts.append(len(new_ctf.primer_pair_set))
+
+    def __contains__(self, ctf: CTF) -> bool:
+        return ctf in self._node_indices
+
+    # Finds the largest CTF set that contains every CTF in required_ctfs and none of the CTFs in excluded_ctfs.
+    # Before solving, the graph is pruned down to the nodes that are compatible with every required CTF, because any
+    # node that conflicts with a required CTF can never be part of the solution. The required CTFs themselves are
+    # removed from the search and added back to the solution afterwards.
+    # The solution of a sub-graph only depends on which nodes it contains, so the memo table is kept on the graph and
+    # reused between calls. Re-solving after a pin changes only has to solve the sub-graphs that were not already
+    # explored by a previous call.
+    def get_largest_ctf_set(self, logger: Optional[Logger] = None, required_ctfs: Optional[Set[CTF]] = None,
+                            excluded_ctfs: Optional[Set[CTF]] = None) -> FrozenSet[CTF]:
+        required_nodes = self._mask_from_nodes(required_ctfs or set())
+        excluded_nodes = self._mask_from_nodes(excluded_ctfs or set())
+        if required_nodes & excluded_nodes:
+            conflicting_ctfs = ", ".join(sorted(ctf.id for ctf in self._nodes_from_mask(required_nodes & excluded_nodes)))
+            raise Exception(f"CTFs cannot be both required and excluded: {conflicting_ctfs}")
+
+        allowed_nodes = ((1 << len(self._nodes)) - 1) & ~excluded_nodes & ~required_nodes
+        remaining_required_nodes = required_nodes
+        while remaining_required_nodes:
+            node_bit = remaining_required_nodes & -remaining_required_nodes
+            remaining_required_nodes ^= node_bit
+            node = node_bit.bit_length() - 1
+            incompatible_required_nodes = required_nodes & ~node_bit & ~self._adjacency[node]
+            if incompatible_required_nodes:
+                conflicting_ctfs = ", ".join(sorted(ctf.id for ctf in self._nodes_from_mask(incompatible_required_nodes)))
+                raise Exception(f"Required CTF {self._nodes[node].id} shares GSP1/2 primers with required CTF(s) "
+                                f"{conflicting_ctfs}")
+            allowed_nodes &= self._adjacency[node]
+
+        solution = self._get_largest_ctf_set(allowed_nodes, self._solved_subgraphs) if allowed_nodes else 0
+        if logger is not None:
+            self._solved_subgraphs.log_statistics(logger)
+        return frozenset(self._nodes_from_mask(solution | required_nodes))
+
+    def _mask_from_nodes(self, ctfs: Set[CTF]) -> int:
+        mask = 0
+        for ctf in ctfs:
+            if ctf not in self._node_indices:
+                raise Exception(f"CTF {ctf.file_path or ctf.id} is not part of the compatibility graph.")
+            mask |= 1 << self._node_indices[ctf]
+        return mask
+
+    def _nodes_from_mask(self, mask: int) -> List[CTF]:
+        nodes = []
+        while mask:
+            lowest_bit = mask & -mask
+            nodes.append(self._nodes[lowest_bit.bit_length() - 1])
+            mask ^= lowest_bit
+        return nodes
+
+    def _primer_count(self, mask: int) -> int:
+        count = 0
+        while mask:
+            lowest_bit = mask & -mask
+            count += self._primer_counts[lowest_bit.bit_length() - 1]
+            mask ^= lowest_bit
+        return count
 
     # This recursive protected method contains the main algorithm for solving the problem of finding the set of
     # non-overlapping CTFs from a graph with the greatest number of unique GSP1/2 primers. This is a top-down dynamic
     # programming algorithm that seeks to break down the graph into many sub-graphs. The optimal solution to this
-    # graph is the union of the optimal solutions of its sub-graphs.
+    # graph is the union of the optimal solutions of its sub-graphs. A (sub-)graph is identified by the bitmask of the
+    # nodes it contains; its edges are always the edges of self._adjacency restricted to those nodes.
     # 1. Given a graph, iterate through each of its nodes to find all candidate solutions.
     # 1a. If the iterated node is adjacent to all other nodes in the graph, then it is guaranteed to be included
     #     in all solutions for this graph
@@ -57,64 +185,56 @@ class CTFCompatibilityGraph:
     #    the optimal solutions for each of the sub-graphs. Sort the list to find the solution with the greatest number
     #    of unique GSP1/2 primers. In case of a tie, choose the solution with the fewest number of CTF files.
     # 3b. It is possible that the same sub-graph will be examined multiple times. Rather than attempting to
-    #     recalculate the solution for the sub-graph again each time, we will save the solution and reuse it everytime
-    #     we encounter the same sub-graph.
-    def _get_largest_ctf_set(self, graph: Dict[CTF, Set[CTF]], solved_subgraphs: Dict[FrozenSet[CTF], FrozenSet[CTF]]) -> FrozenSet[CTF]:
-        graph_nodes = frozenset(graph.keys())
+    #     recalculate the solution for the sub-graph again each time, we will save the solution in a bounded cache and
+    #     reuse it every time we encounter the same sub-graph (unless it has since been evicted from the cache).
+    def _get_largest_ctf_set(self, graph_nodes: int, solved_subgraphs: SubgraphSolutionCache) -> int:
         # If we've already solved this subgraph, don't bother solving it again and just use the saved solution
-        if graph_nodes in solved_subgraphs:
-            return solved_subgraphs[graph_nodes]
-
-        base_solution: Set[CTF] = set()
-        candidate_solutions: Set[FrozenSet[CTF]] = set()
-        for node in graph_nodes:
-            adjacent_nodes = self._graph[node].intersection(graph_nodes)
+        saved_solution = solved_subgraphs.get(graph_nodes)
+        if saved_solution is not None:
+            return saved_solution
+
+        graph_node_count = bin(graph_nodes).count("1")
+        base_solution = 0
+        candidate_solutions: Set[int] = set()
+        remaining_nodes = graph_nodes
+        while remaining_nodes:
+            node_bit = remaining_nodes & -remaining_nodes
+            remaining_nodes ^= node_bit
+            node = node_bit.bit_length() - 1
+            adjacent_nodes = self._adjacency[node] & graph_nodes
             # If this node is adjacent to all other nodes in this graph then it is guaranteed to appear in the
             # final solution for this graph, so don't bother solving its subgraph.
-            if len(adjacent_nodes) == len(graph_nodes) - 1:
-                base_solution.add(node)
+            if bin(adjacent_nodes).count("1") == graph_node_count - 1:
+                base_solution |= node_bit
             # If this node does not have any adjacent nodes, then it is a candidate solution all by itself.
-            elif not any(adjacent_nodes):
-                candidate_solutions.add(frozenset({node}))
+            elif not adjacent_nodes:
+                candidate_solutions.add(node_bit)
             # If this node does have adjacent nodes but is not adjacent to all other nodes in this graph, then we need
             # to find the best solution from this subgraph.
             else:
-                subgraph = {node: adjacent_nodes}
-                for compatible_node in adjacent_nodes:
-                    subgraph[compatible_node] = self._graph[compatible_node].intersection(adjacent_nodes)
-                    subgraph[compatible_node].add(node)
-                subgraph_solution = frozenset(self._get_largest_ctf_set(subgraph, solved_subgraphs))
+                subgraph_solution = self._get_largest_ctf_set(adjacent_nodes | node_bit, solved_subgraphs)
                 candidate_solutions.add(subgraph_solution)
 
         optimal_solution = base_solution
-        if any(candidate_solutions):
+        if candidate_solutions:
             # The best candidate solution is the one with the most unique GSP primers, and the # of least CTFs in case
             # of a tie. If there are multiple solutions with identical GSP primer counts and # of CTFs, a solution will
             # be chosen arbitrarily
-            def primer_count(ctf_set): return sum([len(ctf.primer_pair_set) for ctf in ctf_set])
-
-            def ctf_count(ctf_set): return len(ctf_set)
+            best_candidate = min(candidate_solutions,
+                                 key=lambda candidate: (-self._primer_count(candidate), bin(candidate).count("1")))
+            optimal_solution = base_solution | best_candidate
 
-            candidate_solutions_list = list(candidate_solutions)
-            candidate_solutions_list.sort(key=lambda candidate: (-primer_count(candidate), ctf_count(candidate)))
-            optimal_solution = base_solution.union(candidate_solutions_list[0])
-
-        solved_subgraphs[graph_nodes] = frozenset(optimal_solution)
-        return solved_subgraphs[graph_nodes]
+        solved_subgraphs.put(graph_nodes, optimal_solution)
+        return optimal_solution
 
 
 def get_raw_materials(raw_ctf: CTF, workflow_type: WorkflowType, ctf_library: Dict[str, CTF],
-                      spike_in_library: Dict[str, CTF]) -> (List[RawMaterialInfo], List[RawMaterialInfo], List[CTF]):
-    inventoried_ctfs, spike_in_ctfs = _calculate_component_ctfs(raw_ctf, workflow_type, ctf_library, spike_in_library)
-
-    gsp1_pool_concentration_um = raw_ctf.header.total_gsp1_concentration or Decimal(100)
-    gsp2_pool_concentration_um = raw_ctf.header.total_gsp2_concentration or _calculate_gsp2_pool_concentration(raw_ctf)
-    gsp1_reagent_info = _calculate_reagent_volumes(inventoried_ctfs, spike_in_ctfs, gsp1_pool_concentration_um,
-                                                   GSPType.GSP1)
-    gsp2_reagent_info = _calculate_reagent_volumes(inventoried_ctfs, spike_in_ctfs, gsp2_pool_concentration_um,
-                                                   GSPType.GSP2)
-
-    return gsp1_reagent_info, gsp2_reagent_info, list(spike_in_ctfs)
+                      spike_in_library: Dict[str, CTF], logger: Optional[Logger] = None,
+                      max_solver_cache_bytes: Optional[int] = None, pinned_designs: Optional[Set[str]] = None,
+                      excluded_designs: Optional[Set[str]] = None) -> (List[RawMaterialInfo], List[RawMaterialInfo],
+                                                                       List[CTF]):
+    solver = ComponentCTFSolver(raw_ctf, workflow_type, ctf_library, spike_in_library, logger, max_solver_cache_bytes)
+    return solver.get_raw_materials(pinned_designs, excluded_designs)
 
 
 def _calculate_gsp2_pool_concentration(ctf: CTF) -> Decimal:
@@ -126,58 +246,122 @@ def _calculate_gsp2_pool_concentration(ctf: CTF) -> Decimal:
         return Decimal(100)
 
 
-def _calculate_component_ctfs(raw_ctf: CTF, workflow_type: WorkflowType, ctf_library: Dict[str, CTF],
-                              spike_in_library: Dict[str, CTF]) -> (FrozenSet[CTF], FrozenSet[CTF]):
-    candidate_ctfs = CTFCompatibilityGraph()
+# Selects the inventoried CTFs (and pre-made spike-in CTFs) used to build a raw CTF. The candidate compatibility graph is
+# built once, so the same solver can be asked to re-solve with different pinned (must-include) and excluded
+# (must-exclude) designs without reloading the repository or rebuilding the graph. Designs are identified by either
+# their design ID or the path to their CTF file.
+class ComponentCTFSolver:
+    def __init__(self, raw_ctf: CTF, workflow_type: WorkflowType, ctf_library: Dict[str, CTF],
+                 spike_in_library: Optional[Dict[str, CTF]], logger: Optional[Logger] = None,
+                 max_solver_cache_bytes: Optional[int] = None) -> None:
+        self.raw_ctf: CTF = raw_ctf
+        self.logger: Optional[Logger] = logger
+        self._candidate_ctfs: CTFCompatibilityGraph = CTFCompatibilityGraph(max_cache_bytes=max_solver_cache_bytes)
+        self._spike_in_candidate_ctfs: Set[CTF] = set()
+        self._designs: Dict[str, CTF] = {}
+        self._matching_molecule_type: MoleculeType = get_matching_molecule_type(workflow_type)
+
+        for ctf in ctf_library.values():
+            self._register_design(ctf)
+            if self._is_candidate(ctf):
+                self._candidate_ctfs.add(ctf)
+
+        if spike_in_library:
+            for ctf in spike_in_library.values():
+                self._register_design(ctf)
+                if self._is_candidate(ctf):
+                    self._candidate_ctfs.add(ctf)
+                    self._spike_in_candidate_ctfs.add(ctf)
+
+    def _register_design(self, ctf: CTF) -> None:
+        self._designs.setdefault(ctf.id, ctf)
+        if ctf.file_path:
+            self._designs.setdefault(os.path.normpath(os.path.abspath(ctf.file_path)), ctf)
+
+    def _is_candidate(self, ctf: CTF) -> bool:
+        if self._matching_molecule_type not in ctf.header.molecule_types:
+            return False
+        ctf_gsp1_pool_concentration = ctf.header.total_gsp1_concentration or Decimal(100)
+        ctf_gsp2_pool_concentration = ctf.header.total_gsp2_concentration or Decimal(100)
+        if ctf_gsp1_pool_concentration != Decimal(100) or ctf_gsp2_pool_concentration != Decimal(100):
+            return False
+        return ctf.issubset(self.raw_ctf)
+
+    def _find_design(self, design: str) -> Optional[CTF]:
+        if design in self._designs:
+            return self._designs[design]
+        return self._designs.get(os.path.normpath(os.path.abspath(design)), None)
+
+    def _resolve_pinned_designs(self, pinned_designs: Set[str]) -> Set[CTF]:
+        pinned_ctfs = set()
+        for design in pinned_designs:
+            ctf = self._find_design(design)
+            if ctf is None:
+                raise Exception(f"Pinned design {design} was not found in the design repository or spike-in folder.")
+            if ctf not in self._candidate_ctfs:
+                raise Exception(f"Pinned design {design} cannot be used for {self.raw_ctf.file_path or self.raw_ctf.id}"
+                                f". Its primer pairs must be a subset of the CTF, its molecule type must match the "
+                                f"workflow and its GSP1/2 pool concentrations must be 100 uM.")
+            pinned_ctfs.add(ctf)
+        return pinned_ctfs
+
+    def _resolve_excluded_designs(self, excluded_designs: Set[str]) -> Set[CTF]:
+        # Excluded designs that are not candidates would never have been chosen anyway, so they are simply skipped
+        excluded_ctfs = set()
+        for design in excluded_designs:
+            ctf = self._find_design(design)
+            if ctf is not None and ctf in self._candidate_ctfs:
+                excluded_ctfs.add(ctf)
+        return excluded_ctfs
+
+    def solve(self, pinned_designs: Optional[Set[str]] = None,
+              excluded_designs: Optional[Set[str]] = None) -> (FrozenSet[CTF], FrozenSet[CTF]):
+        pinned_ctfs = self._resolve_pinned_designs(pinned_designs or set())
+        excluded_ctfs = self._resolve_excluded_designs(excluded_designs or set())
+        solution_ctf_set = self._candidate_ctfs.get_largest_ctf_set(self.logger, required_ctfs=pinned_ctfs,
+                                                                    excluded_ctfs=excluded_ctfs)
+        spike_in_ctfs = _calculate_spike_in_ctfs(solution_ctf_set, self.raw_ctf, self.logger)
+
+        inventoried_ctfs = set()
+        for ctf in solution_ctf_set:
+            if ctf in self._spike_in_candidate_ctfs:
+                spike_in_ctfs.add(ctf)
+            else:
+                inventoried_ctfs.add(ctf)
+
+        return frozenset(inventoried_ctfs), frozenset(spike_in_ctfs)
+
+    def get_raw_materials(self, pinned_designs: Optional[Set[str]] = None,
+                          excluded_designs: Optional[Set[str]] = None) -> (List[RawMaterialInfo],
+                                                                           List[RawMaterialInfo], List[CTF]):
+        inventoried_ctfs, spike_in_ctfs = self.solve(pinned_designs, excluded_designs)
 
+        raw_ctf = self.raw_ctf
+        gsp1_pool_concentration_um = raw_ctf.header.total_gsp1_concentration or Decimal(100)
+        gsp2_pool_concentration_um = raw_ctf.header.total_gsp2_concentration or \
+            _calculate_gsp2_pool_concentration(raw_ctf)
+        gsp1_reagent_info = _calculate_reagent_volumes(inventoried_ctfs, spike_in_ctfs, gsp1_pool_concentration_um,
+                                                       GSPType.GSP1)
+        gsp2_reagent_info = _calculate_reagent_volumes(inventoried_ctfs, spike_in_ctfs, gsp2_pool_concentration_um,
+                                                       GSPType.GSP2)
+
+        return gsp1_reagent_info, gsp2_reagent_info, list(spike_in_ctfs)
+
+
+def get_matching_molecule_type(workflow_type: WorkflowType) -> MoleculeType:
     if workflow_type in [WorkflowType.VARIANTPLEXSTANDARD, WorkflowType.VARIANTPLEXHGC2, WorkflowType.VARIANTPLEXHGC,
                          WorkflowType.VARIANTPLEXHS]:
-        matching_molecule_type = MoleculeType.DNA
+        return MoleculeType.DNA
     elif workflow_type is WorkflowType.LIQUIDPLEX:
-        matching_molecule_type = MoleculeType.CTDNA
+        return MoleculeType.CTDNA
     elif workflow_type is WorkflowType.FUSIONPLEX:
-        matching_molecule_type = MoleculeType.RNA
+        return MoleculeType.RNA
     else:
         raise Exception(f"Unrecognized workflow: {workflow_type}")
 
-    for ctf in ctf_library.values():
-        if matching_molecule_type not in ctf.header.molecule_types:
-            continue
-        ctf_gsp1_pool_concentration = ctf.header.total_gsp1_concentration or Decimal(100)
-        ctf_gsp2_pool_concentration = ctf.header.total_gsp2_concentration or Decimal(100)
-        if ctf_gsp1_pool_concentration != Decimal(100) or ctf_gsp2_pool_concentration != Decimal(100):
-            continue
-        if ctf.issubset(raw_ctf):
-            candidate_ctfs.add(ctf)
-
-    spike_in_candidate_ctfs = set()
-    if spike_in_library:
-        for ctf in spike_in_library.values():
-            if matching_molecule_type not in ctf.header.molecule_types:
-                continue
-            ctf_gsp1_pool_concentration = ctf.header.total_gsp1_concentration or Decimal(100)
-            ctf_gsp2_pool_concentration = ctf.header.total_gsp2_concentration or Decimal(100)
-            if ctf_gsp1_pool_concentration != Decimal(100) \
-                    or ctf_gsp2_pool_concentration != Decimal(100):
-                continue
-            if ctf.issubset(raw_ctf):
-                candidate_ctfs.add(ctf)
-                spike_in_candidate_ctfs.add(ctf)
-
-    solution_ctf_set = candidate_ctfs.get_largest_ctf_set()
-    spike_in_ctfs = _calculate_spike_in_ctfs(solution_ctf_set, raw_ctf)
-
-    inventoried_ctfs = set()
-    for ctf in solution_ctf_set:
-        if ctf in spike_in_candidate_ctfs:
-            spike_in_ctfs.add(ctf)
-        else:
-            inventoried_ctfs.add(ctf)
-
-    return frozenset(inventoried_ctfs), frozenset(spike_in_ctfs)
 
-
-def _calculate_spike_in_ctfs(inventoried_ctf_set: FrozenSet[CTF], raw_ctf: CTF) -> Set[CTF]:
+def _calculate_spike_in_ctfs(inventoried_ctf_set: FrozenSet[CTF], raw_ctf: CTF,
+                             logger: Optional[Logger] = None) -> Set[CTF]:
     inventoried_primer_pairs = set(
         [(primer_pair.gsp1, primer_pair.gsp2) for ctf in inventoried_ctf_set for primer_pair in ctf.primer_pairs])
     spike_in_ctfs = set()  # type: Set[CTF]
@@ -188,39 +372,18 @@ def _calculate_spike_in_ctfs(inventoried_ctf_set: FrozenSet[CTF], raw_ctf: CTF)
         per_gene_spike_ins = {}  # type: Dict[str, List[PrimerPair]]
         for primer_pair in raw_ctf.primer_pairs:
             if (primer_pair.gsp1, primer_pair.gsp2) not in inventoried_primer_pairs:
-                gene_name = primer_pair.gsp1_name.split("_")[0]
+                gene_name = primer_pair.gsp1.gene
                 if gene_name not in per_gene_spike_ins:
                     per_gene_spike_ins[gene_name] = []
                 per_gene_spike_ins[gene_name].append(primer_pair)
 
-        # Clean up the per-gene primer pair lists so that there are no lists with more than the maximum allowed number
-        # of primer pairs per CTF
+        # Pack the per-gene primer pair lists into as few spike-in CTFs as possible without exceeding the maximum
+        # allowed number of primer pairs per CTF. Genes are only split across CTFs if they do not fit in a single CTF.
         max_primer_pairs_per_ctf = 550
-        spike_in_primer_pair_lists = []  # type: List[List[PrimerPair]]
-        for per_gene_primer_pair_list in per_gene_spike_ins.values():
-            for _ in range(len(per_gene_primer_pair_list) // max_primer_pairs_per_ctf):
-                primer_pair_list = []  # type: List[PrimerPair]
-                for _ in range(max_primer_pairs_per_ctf):
-                    primer_pair_list.append(per_gene_primer_pair_list.pop())
-                spike_in_primer_pair_lists.append(per_gene_primer_pair_list)
-            if any(per_gene_primer_pair_list):
-                spike_in_primer_pair_lists.append(per_gene_primer_pair_list)
-
-        # Use first-fit-decreasing bin packing algorithm to group these primer pair lists in (approximately) as few CTF
-        # files as possible.
-        spike_in_primer_pair_lists.sort(key=lambda l: len(l), reverse=True)
-        spike_in_primer_pair_bins = [[]]  # type: List[List[PrimerPair]]
-        for primer_pair_list in spike_in_primer_pair_lists:
-            bin_found = False
-            for primer_pair_bin in spike_in_primer_pair_bins:
-                if bin_found:
-                    break
-                free_bin_space = max_primer_pairs_per_ctf - len(primer_pair_bin)
-                if free_bin_space >= len(primer_pair_list):
-                    primer_pair_bin.extend(primer_pair_list)
-                    bin_found = True
-            if not bin_found:
-                spike_in_primer_pair_bins.append(primer_pair_list)
+        packing_result = pack_primer_pairs(per_gene_spike_ins, max_primer_pairs_per_ctf)
+        if logger is not None:
+            packing_result.log_summary(logger)
+        spike_in_primer_pair_bins = [pool.primer_pairs for pool in packing_result.pools]
 
         # Create spike-in CTF files
         ctf_count = 0
@@ -404,9 +567,14 @@ def _calculate_fill_volumes(workflow: WorkflowType, disease: DiseaseType, unique
 
 
 def calculate_raw_material_volumes_step(logger: Logger, panel_info: PanelInfo, ctf: CTF, ctf_repository: Dict[str, CTF],
-                                        spike_in_repository: Dict[str, CTF],
-                                        output_directory: str) -> (PanelInfo, List[RawMaterialInfo],
-                                                                   List[RawMaterialInfo], List[CTF]):
+                                        spike_in_repository: Dict[str, CTF], output_directory: str,
+                                        max_solver_cache_bytes: Optional[int] = None,
+                                        pinned_designs: Optional[Set[str]] = None,
+                                        excluded_designs: Optional[Set[str]] = None,
+                                        solver: Optional[ComponentCTFSolver] = None) -> (PanelInfo,
+                                                                                         List[RawMaterialInfo],
+                                                                                         List[RawMaterialInfo],
+                                                                                         List[CTF]):
     logger.message("Calculating raw material volumes...")
     if panel_info is None:
         logger.warning("No Panel Info config file provided, skipping raw material volume calculation.")
@@ -424,10 +592,16 @@ def calculate_raw_material_volumes_step(logger: Logger, panel_info: PanelInfo, c
                 "ignored and recalculated from the input CTF file. Use the --no-volume-calculation flag or do "
                 "not provide an input CTF file if you wish to generate a BOM file using the volumes in the "
                 "Panel Info config file.")
-        gsp1_raw_materials, gsp2_raw_materials, spike_in_ctfs = get_raw_materials(raw_ctf=ctf,
-                                                                                  workflow_type=panel_info.workflow,
-                                                                                  ctf_library=ctf_repository,
-                                                                                  spike_in_library=spike_in_repository)
+        # a solver kept from a previous run (see PanelFileSession) is re-solved instead of building a new one
+        if solver is not None:
+            gsp1_raw_materials, gsp2_raw_materials, spike_in_ctfs = solver.get_raw_materials(pinned_designs,
+                                                                                             excluded_designs)
+        else:
+            gsp1_raw_materials, gsp2_raw_materials, spike_in_ctfs = \
+                get_raw_materials(raw_ctf=ctf, workflow_type=panel_info.workflow, ctf_library=ctf_repository,
+                                  spike_in_library=spike_in_repository, logger=logger,
+                                  max_solver_cache_bytes=max_solver_cache_bytes, pinned_designs=pinned_designs,
+                                  excluded_designs=excluded_designs)
 
         if len(gsp1_raw_materials) == 1 and len(gsp2_raw_materials) == 1 and len(spike_in_ctfs) == 1:
             logger.warning("No inventoried parts could be used, but the total number of primers is <= 550, meaning"
@@ -1,8 +1,10 @@
 import os
+import re
 from decimal import Decimal
-from typing import Dict, Tuple, Optional, List
+from typing import Dict, Tuple, Optional, List, Pattern
 
 from AMPPanelDesignLib.CTF import CTF, PrimerPair, Primer
+from AMPPanelDesignLib.PrimerQC import PrimerQCSpec, check_primers, write_primer_qc_report
 from GeneratePanelFilesLib.Logger import Logger
 from configs.ConfigurationFiles import ConfigurationFiles
 
@@ -96,53 +98,90 @@ aliased_gene_names_lookup = _load_aliased_gene_names()
 alternate_ctf_mappings = _load_ctf_alternate_mappings()
 
 
+# Rewrites the primer names of aliased genes. The pattern of every alias is compiled once and rewritten names are
+# cached, since the same primer names recur across the rows of a CTF and across CTFs. Like
+# str.replace(alias, replacement, 1), only the first occurrence of the alias in a primer name is rewritten.
+class AliasMatcher:
+    def __init__(self, aliased_gene_names: Dict[str, str]) -> None:
+        self._replacements: Dict[str, str] = dict(aliased_gene_names)
+        self._patterns: Dict[str, Tuple[Pattern, str]] = {
+            alias: (re.compile(re.escape(alias)), replacement.replace("\\", "\\\\"))
+            for alias, replacement in aliased_gene_names.items()}
+        self._rewritten_names: Dict[Tuple[str, str], str] = {}
+
+    # replacement gene name of gene_name, None if it is not aliased
+    def replacement(self, gene_name: str) -> Optional[str]:
+        return self._replacements.get(gene_name)
+
+    def rewrite_name(self, gene_name: str, primer_name: str) -> str:
+        rewritten_name = self._rewritten_names.get((gene_name, primer_name))
+        if rewritten_name is None:
+            pattern, replacement = self._patterns[gene_name]
+            rewritten_name = pattern.sub(replacement, primer_name, count=1)
+            self._rewritten_names[(gene_name, primer_name)] = rewritten_name
+        return rewritten_name
+
+
+alias_matcher = AliasMatcher(aliased_gene_names_lookup)
+
+
+def _alias_primer(primer: Primer, gene_name: str, aliased_primers: Dict[Tuple[str, Primer], Primer]) -> Primer:
+    aliased_primer = aliased_primers.get((gene_name, primer))
+    if aliased_primer is None:
+        name = alias_matcher.rewrite_name(gene_name, primer.name)
+        if name == primer.name:
+            aliased_primer = primer
+        else:
+            aliased_primer = Primer(start=primer.start, stop=primer.stop, name=name, sequence=primer.sequence,
+                                    boost_level=primer.boost_level)
+        aliased_primers[(gene_name, primer)] = aliased_primer
+    return aliased_primer
+
+
+def _alias_primer_pair(primer_pair: PrimerPair, gene_alias: str,
+                       aliased_primers: Dict[Tuple[str, Primer], Primer]) -> PrimerPair:
+    return PrimerPair(gene_name=gene_alias,
+                      ncbi_reference_sequence=primer_pair.ncbi_reference_sequence,
+                      target_exon=primer_pair.target_exon,
+                      target_chromosome=primer_pair.target_chromosome,
+                      target_start=primer_pair.target_start,
+                      target_stop=primer_pair.target_stop,
+                      target_strand=primer_pair.target_strand,
+                      target_name=primer_pair.target_name,
+                      assay_type=primer_pair.assay_type,
+                      direction=primer_pair.direction,
+                      gsp1=_alias_primer(primer_pair.gsp1, primer_pair.gene_name, aliased_primers),
+                      gsp1_tail=primer_pair.gsp1_tail,
+                      gsp2=_alias_primer(primer_pair.gsp2, primer_pair.gene_name, aliased_primers),
+                      cds_only=primer_pair.cds_only,
+                      primer_pair_functions=primer_pair.primer_pair_functions,
+                      snp_id_locations=primer_pair.snp_id_locations,
+                      primer_pair_notes=primer_pair.primer_pair_notes)
+
+
+# Cleaning is copy-on-write: primer pairs of genes that are not aliased are carried over as they are, so the cleaned
+# CTF shares them (and the alternate mapping primer pairs) with the raw CTF and the mapping table. Only aliased primer
+# pairs and primers whose name changes are copied. Primer pairs and primers are never modified after loading.
 def clean_ctf(ctf: CTF) -> CTF:
     cleaned_primer_pairs: List[PrimerPair] = []
     alternate_mappings: Dict[Tuple[str, str], PrimerPair] = {}
+    # aliased primer by (original gene name, original primer), so primers repeated across rows are copied once
+    aliased_primers: Dict[Tuple[str, Primer], Primer] = {}
 
     for primer_pair in ctf.primer_pairs:
-        gene_name = primer_pair.gene_name
-        gsp1_name = primer_pair.gsp1_name
-        gsp2_name = primer_pair.gsp2_name
-        if gene_name in aliased_gene_names_lookup:
-            gene_alias = aliased_gene_names_lookup[gene_name]
-            gsp1_name = gsp1_name.replace(gene_name, gene_alias, 1)
-            gsp2_name = gsp2_name.replace(gene_name, gene_alias, 1)
-            gene_name = gene_alias
-        new_primer_pair = PrimerPair(gene_name=gene_name,
-                                     ncbi_reference_sequence=primer_pair.ncbi_reference_sequence,
-                                     target_exon=primer_pair.target_exon,
-                                     target_chromosome=primer_pair.target_chromosome,
-                                     target_start=primer_pair.target_start,
-                                     target_stop=primer_pair.target_stop,
-                                     target_strand=primer_pair.target_strand,
-                                     target_name=primer_pair.target_name,
-                                     assay_type=primer_pair.assay_type,
-                                     direction=primer_pair.direction,
-                                     gsp1=Primer(start=primer_pair.gsp1.start,
-                                                 stop=primer_pair.gsp1.stop,
-                                                 name=gsp1_name,
-                                                 sequence=primer_pair.gsp1.sequence,
-                                                 boost_level=primer_pair.gsp1.boost_level),
-                                     gsp1_tail=primer_pair.gsp1_tail,
-                                     gsp2=Primer(start=primer_pair.gsp2.start,
-                                                 stop=primer_pair.gsp2.stop,
-                                                 name=gsp2_name,
-                                                 sequence=primer_pair.gsp2.sequence,
-                                                 boost_level=primer_pair.gsp2.boost_level),
-                                     cds_only=primer_pair.cds_only,
-                                     primer_pair_functions=primer_pair.primer_pair_functions,
-                                     snp_id_locations=primer_pair.snp_id_locations,
-                                     primer_pair_notes=primer_pair.primer_pair_notes)
-        new_primer_pair_key = (new_primer_pair.gsp1_name, new_primer_pair.gsp2_name)
-        if new_primer_pair_key in alternate_ctf_mappings:
-            alternate_mappings.update(alternate_ctf_mappings[new_primer_pair_key])
-        cleaned_primer_pairs.append(new_primer_pair)
-
-    for primer_pair in cleaned_primer_pairs:
+        gene_alias = alias_matcher.replacement(primer_pair.gene_name)
+        if gene_alias is not None:
+            primer_pair = _alias_primer_pair(primer_pair, gene_alias, aliased_primers)
         primer_pair_key = (primer_pair.gsp1_name, primer_pair.gsp2_name)
-        if primer_pair_key in alternate_mappings:
-            alternate_mappings.pop(primer_pair_key)
+        if primer_pair_key in alternate_ctf_mappings:
+            alternate_mappings.update(alternate_ctf_mappings[primer_pair_key])
+        cleaned_primer_pairs.append(primer_pair)
+
+    if alternate_mappings:
+        for primer_pair in cleaned_primer_pairs:
+            primer_pair_key = (primer_pair.gsp1_name, primer_pair.gsp2_name)
+            if primer_pair_key in alternate_mappings:
+                alternate_mappings.pop(primer_pair_key)
 
     for alternate_mapping_primer_pair in alternate_mappings.values():
         cleaned_primer_pairs.append(alternate_mapping_primer_pair)
@@ -150,7 +189,8 @@ def clean_ctf(ctf: CTF) -> CTF:
     return CTF(design_id=ctf.id, file_path=None, header=ctf.header.items, primer_pairs=cleaned_primer_pairs)
 
 
-def clean_ctf_step(logger: Logger, raw_ctf: CTF, output_directory: str) -> CTF:
+def clean_ctf_step(logger: Logger, raw_ctf: CTF, output_directory: str,
+                   primer_qc_spec: Optional[PrimerQCSpec] = None) -> CTF:
     logger.message("Cleaning CTF file...")
     if raw_ctf is None:
         logger.warning("No CTF file provided, skipping CTF cleaning.")
@@ -161,4 +201,14 @@ def clean_ctf_step(logger: Logger, raw_ctf: CTF, output_directory: str) -> CTF:
             cleaned_ctf.file_path = os.path.join(output_directory, f"{file_name}.cleaned{extension}")
             logger.message(f"Writing cleaned CTF to {cleaned_ctf.file_path}")
             cleaned_ctf.write(cleaned_ctf.file_path)
+            if primer_qc_spec is not None:
+                primer_qc_records = check_primers([cleaned_ctf], primer_qc_spec)
+                primer_qc_file_path = os.path.join(output_directory, f"{file_name}.primer_qc.txt")
+                logger.message(f"Writing primer QC report to {primer_qc_file_path}")
+                write_primer_qc_report(primer_qc_records, primer_qc_file_path)
+                failed_records = [record for record in primer_qc_records if not record.passed]
+                if failed_records:
+                    logger.warning(f"{len(failed_records)} of {len(primer_qc_records)} primers are out of spec: "
+                                   f"{', '.join(record.primer.name for record in failed_records[:10])}"
+                                   f"{', ...' if len(failed_records) > 10 else ''}")
             return cleaned_ctf
@@ -1,9 +1,15 @@
 import os
-from typing import Optional, List, Dict, Set
-
-from AMPPanelDesignLib.BED import BED
+from array import array
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from itertools import groupby
+from operator import itemgetter
+from typing import Optional, Iterable, List, Dict, Sequence, Set, Tuple, Union
+
+from AMPPanelDesignLib.BED import BED, ColumnarBED, iter_sorted_bed_intervals
 from AMPPanelDesignLib.Enums import WorkflowType, DiseaseType
-from AMPPanelDesignLib.GTF import GTF
+from AMPPanelDesignLib.FunctionFlags import function_flag_registry, cnv_no_display_flag, snv_flag
+from AMPPanelDesignLib.GTF import GTF, iter_gtf_entries, open_gtf
 from AMPPanelDesignLib.PanelInfo import PanelInfo
 from GeneratePanelFilesLib.Logger import Logger
 from configs.ConfigurationFiles import ConfigurationFiles
@@ -33,35 +39,157 @@ class GenomicInterval:
         return f"{self.chrom}:{self.start}-{self.end}"
 
 
-def _get_bed_targets(bed: BED) -> Dict[str, Dict[int, GenomicInterval]]:
-    merged_bed_intervals: Dict[str, Dict[int, GenomicInterval]] = {}
+# Merged BED intervals of one chromosome, stored as two parallel arrays sorted by start. Merging only absorbs intervals
+# that are contained in the previous one, so the starts are non-decreasing and the ends strictly increasing: the only
+# interval that can cover a coordinate is the last one starting at or before it, which is found with a bisect. Memory
+# is proportional to the number of intervals rather than the number of bases they span.
+class BedTargetIntervals:
+    def __init__(self, chrom: str, starts: array, ends: array) -> None:
+        self.chrom: str = chrom
+        self.starts: array = starts
+        self.ends: array = ends
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    # index of the interval covering coordinate (both ends included), or -1
+    def find_index(self, coordinate: int) -> int:
+        index = bisect_right(self.starts, coordinate) - 1
+        if index >= 0 and self.ends[index] >= coordinate:
+            return index
+        return -1
+
+    # target ROI (1-based start) of the interval covering coordinate
+    def find(self, coordinate: int) -> Optional[GenomicInterval]:
+        index = self.find_index(coordinate)
+        if index < 0:
+            return None
+        return self.target(index)
+
+    def target(self, index: int) -> GenomicInterval:
+        return GenomicInterval(self.chrom, self.starts[index] + 1, self.ends[index])
+
+    # Index of the first interval reached when walking at most max_distance bases away from coordinate, downstream on
+    # the + strand and upstream on the - strand, or -1. position is the bisect_right position of coordinate in the
+    # starts when it is already known.
+    def walk_to_index(self, coordinate: int, strand: str, max_distance: int, position: Optional[int] = None) -> int:
+        if position is None:
+            position = bisect_right(self.starts, coordinate)
+        # position - 1 is the last interval starting at or before the coordinate
+        if position > 0 and self.ends[position - 1] >= coordinate:
+            return position - 1
+        elif strand == "+":
+            if position < len(self.starts) and self.starts[position] - coordinate <= max_distance:
+                return self.find_index(self.starts[position])
+        elif position > 0 and coordinate - self.ends[position - 1] <= max_distance:
+            return position - 1
+        return -1
+
+    # bisect_right position of every coordinate, like a searchsorted over the starts. The coordinates are visited in
+    # sorted order and each bisect starts at the position of the previous coordinate, so k coordinates take
+    # O(k log n) whatever the number n of intervals.
+    def search_sorted(self, coordinates: List[int]) -> List[int]:
+        positions = [0] * len(coordinates)
+        position = 0
+        starts = self.starts
+        for coordinate_index in sorted(range(len(coordinates)), key=coordinates.__getitem__):
+            position = bisect_right(starts, coordinates[coordinate_index], position)
+            positions[coordinate_index] = position
+        return positions
+
+
+# Merges the intervals of one chromosome, given in order of their start. Only intervals contained in the last merged
+# interval are absorbed by it; any other interval starts a new merged interval.
+def _merge_sorted_bed_intervals(chrom: str, intervals: Iterable[Tuple[int, int]]) -> BedTargetIntervals:
+    merged_starts = array("q")
+    merged_ends = array("q")
+    for start, end in intervals:
+        if merged_starts and merged_starts[-1] <= start and end <= merged_ends[-1]:
+            continue
+        merged_starts.append(start)
+        merged_ends.append(end)
+    return BedTargetIntervals(chrom, merged_starts, merged_ends)
+
+
+def _merge_bed_intervals(chrom: str, starts: Sequence[int], ends: Sequence[int]) -> BedTargetIntervals:
+    return _merge_sorted_bed_intervals(chrom, ((starts[index], ends[index])
+                                               for index in sorted(range(len(starts)), key=starts.__getitem__)))
+
+
+def _get_bed_targets(bed: Union[BED, ColumnarBED]) -> Dict[str, BedTargetIntervals]:
+    if isinstance(bed, ColumnarBED):
+        return {chrom: _merge_bed_intervals(chrom, chromosome.starts, chromosome.ends)
+                for chrom, chromosome in bed.chromosomes.items()}
 
-    temp: Dict[str, List[GenomicInterval]] = {}
+    coordinates: Dict[str, Tuple[List[int], List[int]]] = {}
     for entry in bed.entries:
-        if entry.chrom not in temp:
-            temp[entry.chrom] = []
-        temp[entry.chrom].append(GenomicInterval(entry.chrom, entry.chrom_start, entry.chrom_end))
-
-    for chromosome in temp:
-        interval_list = temp[chromosome]
-        interval_list.sort(key=lambda genomic_interval: genomic_interval.start)
-        merged = [interval_list[0]]
-        for interval in interval_list:
-            if merged[-1].intersects_with(interval):
-                merged[-1] = merged[-1].merge(interval)
+        if entry.chrom not in coordinates:
+            coordinates[entry.chrom] = ([], [])
+        coordinates[entry.chrom][0].append(entry.chrom_start)
+        coordinates[entry.chrom][1].append(entry.chrom_end)
+    return {chrom: _merge_bed_intervals(chrom, starts, ends) for chrom, (starts, ends) in coordinates.items()}
+
+
+# Merged BED targets of a BED file too large to load, computed from an external merge sort of its intervals (see
+# iter_sorted_bed_intervals) with at most buffer_size intervals in memory at a time. The result is the same as
+# _get_bed_targets of the loaded file; only the merged intervals are kept.
+def sort_and_merge_bed_targets(bed_file: str, buffer_size: int = 1000000,
+                               temp_directory: Optional[str] = None) -> Dict[str, BedTargetIntervals]:
+    return {chrom: _merge_sorted_bed_intervals(chrom, ((start, end) for _, start, end in intervals))
+            for chrom, intervals in groupby(iter_sorted_bed_intervals(bed_file, buffer_size, temp_directory),
+                                            key=itemgetter(0))}
+
+
+def _get_unsupported_strand_error(entry: GTF.Entry) -> str:
+    return f"Unsupported strand type \"{entry.strand}\" detected in coverage BED file"
+
+
+def _get_missing_seqname_error(entry: GTF.Entry, bed_file_path: Optional[str]) -> str:
+    return f"GTF seqname ({entry.seqname}) not found in BED file {bed_file_path or ''}. " \
+           "Try increasing the Max Target ROI Distance."
+
+
+# Locates the BED targets of many GTF entries at once. The BED target searched for an entry is the first one reached
+# when walking away from the entry, downstream of its end on the + strand and upstream of its start on the - strand, at
+# most max_distance bases away. For each chromosome the entry anchors are located in the merged BED intervals with one
+# sorted sweep. An anchor inside an interval resolves to that interval; otherwise the nearest covered base in the walking
+# direction is the start of the next interval (+ strand) or the end of the previous one (- strand), which is then
+# checked against max_distance. The targets are the same as probing every base from 0 to max_distance. Returns the
+# error of every entry that cannot be searched and the index of its BED target in bed_targets[entry.seqname] (-1 when
+# no target is found).
+def locate_target_rois(entries: List[GTF.Entry], bed_targets: Dict[str, BedTargetIntervals], max_distance: int,
+                       bed_file_path: Optional[str]) -> Tuple[List[Optional[str]], List[int]]:
+    errors: List[Optional[str]] = [None] * len(entries)
+    target_indices: List[int] = [-1] * len(entries)
+    # seqname -> (entry indices, anchor coordinates)
+    batches: Dict[str, Tuple[List[int], List[int]]] = {}
+    if max_distance >= 0:
+        for entry_index, entry in enumerate(entries):
+            if entry.strand == "+":
+                coordinate = entry.end
+            elif entry.strand == "-":
+                coordinate = entry.start
             else:
-                merged.append(interval)
-        merged_bed_intervals[chromosome] = {}
-        for merged_interval in merged:
-            revised_merged_interval = GenomicInterval(merged_interval.chrom, merged_interval.start + 1,
-                                                      merged_interval.end)
-            for i in range(merged_interval.start, merged_interval.end + 1):
-                merged_bed_intervals[chromosome][i] = revised_merged_interval
+                errors[entry_index] = _get_unsupported_strand_error(entry)
+                continue
+            if entry.seqname not in bed_targets:
+                errors[entry_index] = _get_missing_seqname_error(entry, bed_file_path)
+                continue
+            if entry.seqname not in batches:
+                batches[entry.seqname] = ([], [])
+            batches[entry.seqname][0].append(entry_index)
+            batches[entry.seqname][1].append(coordinate)
 
-    return merged_bed_intervals
+    for seqname, (entry_indices, coordinates) in batches.items():
+        intervals = bed_targets[seqname]
+        for entry_index, coordinate, position in zip(entry_indices, coordinates, intervals.search_sorted(coordinates)):
+            target_indices[entry_index] = intervals.walk_to_index(coordinate, entries[entry_index].strand, max_distance,
+                                                                  position)
 
+    return errors, target_indices
 
-def _load_special_function_flags() -> Dict[str, Set[str]]:
+
+def _load_special_function_flags() -> Dict[str, int]:
     special_function_flags_file = ConfigurationFiles.special_gtf_function_flags_file
     special_function_flags = {}
     column_indices = None
@@ -74,7 +202,7 @@ def _load_special_function_flags() -> Dict[str, Set[str]]:
                 column_indices = {key.lower(): line.index(key) for key in line}
             else:
                 primer_name = line[column_indices["gsp2 primer name"]]
-                flags = set(line[column_indices["special function flags"]].split(","))
+                flags = function_flag_registry.parse(line[column_indices["special function flags"]])
                 special_function_flags[primer_name] = flags
     return special_function_flags
 
@@ -170,14 +298,145 @@ aliased_gene_names_lookup = _load_aliased_gene_names()
 alternate_gtf_mappings = _load_gtf_alternate_mappings()
 
 
-def clean_gtf(gtf: GTF, base_gtfs: Optional[Set[GTF]], workflow: WorkflowType, disease: DiseaseType, bed: BED,
-              max_distance: int, gtf_target_roi_buffer: Optional[int], analysis_version: str) -> GTF:
+# Everything that does not change between the entries of one GTF cleaning, resolved once: the workflow and analysis
+# version rules, the target ROI padding and the lookup tables. The lookup tables of this module are only read, so a plan
+# can be shared by the processes cleaning a GTF in parallel.
+class GTFCleaningPlan:
+    def __init__(self, workflow: WorkflowType, disease: DiseaseType, max_distance: int,
+                 gtf_target_roi_buffer: Optional[int], analysis_version: str, bed_file_path: Optional[str] = None,
+                 gtf_file_path: Optional[str] = None) -> None:
+        self.looks_up_target_rois: bool = workflow in [WorkflowType.VARIANTPLEXSTANDARD, WorkflowType.VARIANTPLEXHS,
+                                                       WorkflowType.VARIANTPLEXHGC,
+                                                       WorkflowType.VARIANTPLEXHGC2]
+        self.disease: DiseaseType = disease
+        # target ROI padding, None for diseases without a default padding
+        self.padding: Optional[int] = None
+        if gtf_target_roi_buffer is not None:
+            self.padding = gtf_target_roi_buffer
+        elif disease in [DiseaseType.GERMLINE, DiseaseType.SOLIDTUMOR, DiseaseType.SARCOMA]:
+            self.padding = 10
+        elif disease in [DiseaseType.BLOODCANCERS]:
+            self.padding = 20
+        # Ignore CNV_NO_DISPLAY if analysis version is 6.x
+        self.removed_function_flags: int = cnv_no_display_flag if int(analysis_version.split(".")[0]) < 7 else 0
+        self.max_distance: int = max_distance
+        self.bed_file_path: Optional[str] = bed_file_path
+        self.gtf_file_path: Optional[str] = gtf_file_path
+        self.aliased_gene_names: Dict[str, str] = aliased_gene_names_lookup
+        self.special_function_flags: Dict[str, int] = special_function_flags_lookup
+        self.special_target_rois: Dict[str, str] = special_target_roi_lookup
+        self.alternate_mappings: Dict[str, Dict[str, GTF.Entry]] = alternate_gtf_mappings
+
+    # Attributes of the cleaned entry, and whether its target_ROI still has to be looked up in the BED targets. The
+    # target_ROI is the last attribute, so it can be added to the returned attributes afterwards.
+    def clean_attributes(self, entry: GTF.Entry) -> Tuple[Dict[str, str], bool]:
+        items = entry.attributes.items
+        new_attributes = {}
+        name = items["name"]
+        gene_id = items.get("gene_id", "")
+        if gene_id in self.aliased_gene_names:
+            name = name.replace(gene_id, self.aliased_gene_names[gene_id], 1)
+            gene_id = self.aliased_gene_names[gene_id]
+        new_attributes["name"] = name
+        new_attributes["gene_id"] = gene_id
+        new_attributes["exon_number"] = items.get("exon_number", "")
+        new_attributes["transcript_id"] = items.get("transcript_id", "")
+
+        function_flags = entry.attributes.function_mask
+        if items["name"] in self.special_function_flags:
+            function_flags |= self.special_function_flags[items["name"]]
+        function_flags &= ~self.removed_function_flags
+        new_attributes["function"] = function_flag_registry.format(function_flags, items["function"])
+
+        if "variant" in items:
+            new_attributes["variant"] = items["variant"]
+        if "target_ROI" in items:
+            new_attributes = items["target_ROI"]
+
+        if "target_ROI" not in new_attributes and self.looks_up_target_rois and function_flags & snv_flag:
+            if self.padding is None:
+                raise Exception(f"Unrecognized disease type {self.disease}")
+            if items["name"] in self.special_target_rois:
+                new_attributes["target_ROI"] = self.special_target_rois[items["name"]]
+            else:
+                return new_attributes, True
+        return new_attributes, False
+
+    def target_roi(self, bed_targets: BedTargetIntervals, target_index: int) -> str:
+        return str(bed_targets.target(target_index).pad(padding_size=self.padding))
+
+    def target_roi_error(self, entry: GTF.Entry) -> str:
+        return f"Could not find target_ROI for target ({entry.attributes.name}) in GTF {self.gtf_file_path or ''}"
+
+
+# entries of a GTF with their index in the GTF, and the BED targets of their seqnames
+_GTFPartition = Tuple[List[Tuple[int, GTF.Entry]], Dict[str, BedTargetIntervals]]
+
+
+# Cleaned entries of one partition of a GTF: the new attributes of every entry by its index in the GTF, the first
+# exception raised while cleaning the entries (cleaning stops there, after the target ROIs of the entries before it are
+# looked up) and the target ROI errors by entry index.
+class _CleanedGTFPartition:
+    def __init__(self) -> None:
+        self.attributes: List[Tuple[int, Dict[str, str]]] = []
+        self.error: Optional[Tuple[int, Exception]] = None
+        self.target_roi_errors: List[Tuple[int, str]] = []
+
+
+# Plan of the clean_gtf call a worker process works for. It is handed to the workers once through the pool initializer,
+# while each partition is sent only to the worker that cleans it.
+_worker_gtf_cleaning: Dict[str, GTFCleaningPlan] = {}
+
+
+def _initialize_gtf_cleaning_worker(plan: GTFCleaningPlan) -> None:
+    _worker_gtf_cleaning["plan"] = plan
+
+
+def _clean_worker_gtf_partition(partition: _GTFPartition) -> _CleanedGTFPartition:
+    return _clean_gtf_partition(_worker_gtf_cleaning["plan"], partition)
+
+
+def _clean_gtf_partition(plan: GTFCleaningPlan, partition: _GTFPartition) -> _CleanedGTFPartition:
+    indexed_entries, bed_targets = partition
+    cleaned_partition = _CleanedGTFPartition()
+    # entries whose target ROI is looked up in the BED targets, resolved together after all entries are cleaned
+    target_roi_entries: List[Tuple[int, GTF.Entry, Dict[str, str]]] = []
+
+    for entry_index, entry in indexed_entries:
+        try:
+            new_attributes, needs_target_roi = plan.clean_attributes(entry)
+        except Exception as e:
+            cleaned_partition.error = (entry_index, e)
+            break
+        if needs_target_roi:
+            target_roi_entries.append((entry_index, entry, new_attributes))
+        cleaned_partition.attributes.append((entry_index, new_attributes))
+
+    entries = [entry for _, entry, _ in target_roi_entries]
+    errors, target_indices = locate_target_rois(entries, bed_targets, plan.max_distance, plan.bed_file_path)
+    for (entry_index, entry, new_attributes), error, target_index in zip(target_roi_entries, errors, target_indices):
+        if error is None and target_index < 0:
+            error = plan.target_roi_error(entry)
+        if error is not None:
+            cleaned_partition.target_roi_errors.append((entry_index, error))
+        else:
+            new_attributes["target_ROI"] = plan.target_roi(bed_targets[entry.seqname], target_index)
+    return cleaned_partition
+
+
+# Cleans the GTF entries that are not replaced by an entry of a base GTF. Entries are cleaned independently of each
+# other, so large GTFs are partitioned by seqname and the partitions are cleaned by max_workers processes (one process
+# per CPU by default, or in-process if max_workers is 1 or the GTF has fewer than parallel_entry_threshold entries).
+# The cleaned entries are then merged in their original order, so de-duplication and alternate mappings are the same
+# however the entries were partitioned. Like cleaning the entries one by one, the exception raised is the one of the
+# first failing entry in GTF order, whether its attributes or its target ROI lookup failed.
+def clean_gtf(gtf: GTF, base_gtfs: Optional[Set[GTF]], workflow: WorkflowType, disease: DiseaseType,
+              bed: Optional[Union[BED, ColumnarBED]], max_distance: int, gtf_target_roi_buffer: Optional[int],
+              analysis_version: str, bed_targets: Optional[Dict[str, BedTargetIntervals]] = None,
+              max_workers: Optional[int] = None, parallel_entry_threshold: int = 50000) -> GTF:
     cleaned_entries: Dict[str, GTF.Entry] = {}
     alternate_mappings: Dict[str, GTF.Entry] = {}
 
-    is_variantplex = workflow in [WorkflowType.VARIANTPLEXSTANDARD, WorkflowType.VARIANTPLEXHS,
-                                  WorkflowType.VARIANTPLEXHGC,
-                                  WorkflowType.VARIANTPLEXHGC2]
     added_targets = set()
     if base_gtfs is not None:
         for base_gtf in base_gtfs:
@@ -185,87 +444,53 @@ def clean_gtf(gtf: GTF, base_gtfs: Optional[Set[GTF]], workflow: WorkflowType, d
                 cleaned_entries[entry.attributes["name"]] = entry
                 added_targets.add(entry.attributes.name)
 
-    bed_targets = _get_bed_targets(bed)
-
-    for entry in gtf.entries:
-        if entry.attributes.name in added_targets:
-            continue
-        new_attributes = {}
-        name = entry.attributes.items["name"]
-        gene_id = entry.attributes.items.get("gene_id", "")
-        if gene_id in aliased_gene_names_lookup:
-            name = name.replace(gene_id, aliased_gene_names_lookup[gene_id], 1)
-            gene_id = aliased_gene_names_lookup[gene_id]
-        new_attributes["name"] = name
-        new_attributes["gene_id"] = gene_id
-        exon_number = entry.attributes.items.get("exon_number", "")
-        new_attributes["exon_number"] = exon_number
-        transcript_id = entry.attributes.items.get("transcript_id", "")
-        new_attributes["transcript_id"] = transcript_id
-
-        if entry.attributes.name in special_function_flags_lookup:
-            function_flags = ",".join(
-                entry.attributes.function.union(special_function_flags_lookup[entry.attributes.name]))
-        else:
-            function_flags = entry.attributes.items["function"]
-
-        # Ignore CNV_NO_DISPLAY if analysis version is 6.x
-        if int(analysis_version.split(".")[0]) < 7:
-            function_flags = function_flags.split(",")
-            if "CNV_NO_DISPLAY" in function_flags:
-                function_flags.remove("CNV_NO_DISPLAY")
-            function_flags = ",".join(function_flags)
-
-        new_attributes["function"] = function_flags
-
-        if "variant" in entry.attributes.items:
-            new_attributes["variant"] = entry.attributes.items["variant"]
-        if "target_ROI" in entry.attributes.items:
-            new_attributes = entry.attributes.items["target_ROI"]
-
-        has_snv_function = "SNV" in new_attributes["function"]
-        if "target_ROI" not in new_attributes and is_variantplex and has_snv_function:
-            if gtf_target_roi_buffer is not None:
-                padding = gtf_target_roi_buffer
-            elif disease in [DiseaseType.GERMLINE, DiseaseType.SOLIDTUMOR, DiseaseType.SARCOMA]:
-                padding = 10
-            elif disease in [DiseaseType.BLOODCANCERS]:
-                padding = 20
-            else:
-                raise Exception(f"Unrecognized disease type {disease}")
-
-            if entry.attributes.name in special_target_roi_lookup:
-                new_attributes["target_ROI"] = special_target_roi_lookup[entry.attributes.name]
-            else:
-                target_roi_found = False
-                for distance in range(0, max_distance + 1):
-                    if entry.strand == "+":
-                        coordinate = distance + entry.end
-                    elif entry.strand == "-":
-                        coordinate = entry.start - distance
-                    else:
-                        raise Exception(f"Unsupported strand type \"{entry.strand}\" detected in coverage BED file")
-                    if entry.seqname not in bed_targets:
-                        raise Exception(
-                            f"GTF seqname ({entry.seqname}) not found in BED file {bed.file_path or ''}. Try increasing the Max Target ROI Distance.")
-                    if coordinate in bed_targets[entry.seqname]:
-                        new_attributes["target_ROI"] = str(
-                            bed_targets[entry.seqname][coordinate].pad(padding_size=padding))
-                        target_roi_found = True
-                        break
-
-                if not target_roi_found:
-                    raise Exception(
-                        f"Could not find target_ROI for target ({entry.attributes.name}) in GTF {gtf.file_path or ''}")
-
+    # merged BED targets can be given instead of the BED itself for coverage files too large to load
+    if bed_targets is None:
+        bed_targets = _get_bed_targets(bed)
+    plan = GTFCleaningPlan(workflow, disease, max_distance, gtf_target_roi_buffer, analysis_version,
+                           bed.file_path if bed is not None else None, gtf.file_path)
+
+    # without base GTFs the attributes are first parsed by the processes cleaning the entries
+    indexed_entries = [(entry_index, entry) for entry_index, entry in enumerate(gtf.entries)
+                       if not added_targets or entry.attributes.name not in added_targets]
+    partitions: Dict[str, _GTFPartition] = {}
+    worker_count = max_workers if max_workers is not None else os.cpu_count() or 1
+    if worker_count > 1 and len(indexed_entries) >= parallel_entry_threshold:
+        for entry_index, entry in indexed_entries:
+            if entry.seqname not in partitions:
+                partitions[entry.seqname] = ([], {entry.seqname: bed_targets[entry.seqname]}
+                                             if entry.seqname in bed_targets else {})
+            partitions[entry.seqname][0].append((entry_index, entry))
+
+    if len(partitions) < 2:
+        cleaned_partitions = [_clean_gtf_partition(plan, (indexed_entries, bed_targets))]
+    else:
+        # largest partitions first, so a large chromosome does not start last
+        sorted_partitions = sorted(partitions.values(), key=lambda partition: -len(partition[0]))
+        with ProcessPoolExecutor(max_workers=min(worker_count, len(sorted_partitions)),
+                                 initializer=_initialize_gtf_cleaning_worker, initargs=(plan,)) as executor:
+            cleaned_partitions = list(executor.map(_clean_worker_gtf_partition, sorted_partitions))
+
+    # the exception of the first failing entry in GTF order, whether cleaning or the target ROI lookup failed
+    errors: List[Tuple[int, Exception]] = [cleaned_partition.error for cleaned_partition in cleaned_partitions
+                                           if cleaned_partition.error is not None]
+    errors.extend((entry_index, Exception(target_roi_error)) for cleaned_partition in cleaned_partitions
+                  for entry_index, target_roi_error in cleaned_partition.target_roi_errors)
+    if errors:
+        raise min(errors, key=itemgetter(0))[1]
+
+    cleaned_attributes = sorted((indexed_attributes for cleaned_partition in cleaned_partitions
+                                 for indexed_attributes in cleaned_partition.attributes), key=itemgetter(0))
+    for entry_index, new_attributes in cleaned_attributes:
+        entry = gtf.entries[entry_index]
         new_entry = GTF.Entry(seqname=entry.seqname, source=entry.source, feature=entry.feature, start=entry.start,
                               end=entry.end, score=entry.score, strand=entry.strand, frame=entry.frame,
                               attributes=new_attributes)
         if new_entry.attributes["name"] in cleaned_entries:
             continue
         new_entry_key = new_entry.attributes["name"]
-        if new_entry_key in alternate_gtf_mappings:
-            alternate_mappings.update(alternate_gtf_mappings[new_entry_key])
+        if new_entry_key in plan.alternate_mappings:
+            alternate_mappings.update(plan.alternate_mappings[new_entry_key])
         cleaned_entries[new_entry.attributes["name"]] = new_entry
 
     for entry in cleaned_entries.values():
@@ -280,7 +505,80 @@ def clean_gtf(gtf: GTF, base_gtfs: Optional[Set[GTF]], workflow: WorkflowType, d
     return GTF(entries=list(cleaned_entries.values()), design_id=gtf.id, file_path=None)
 
 
-def clean_gtf_step(logger: Logger, panel_info: PanelInfo, raw_gtf: GTF, bed: BED, catalog_gtfs: Set[GTF], output_directory: str) -> GTF:
+# Cleans a GTF file into output_file_path one entry at a time, the same way as clean_gtf, without loading the GTF or
+# keeping the cleaned entries: only the names written so far, the names of the base GTF entries and the pending
+# alternate mappings are kept in memory. Target ROIs are looked up per entry, so an exception is raised for the first
+# failing entry of the file, whatever the reason. The output is written to a temporary file and only replaces
+# output_file_path once the whole GTF is cleaned. Returns the number of entries written.
+def clean_gtf_file(gtf_file_path: str, output_file_path: str, base_gtfs: Optional[Set[GTF]], plan: GTFCleaningPlan,
+                   bed_targets: Dict[str, BedTargetIntervals], strict: bool = False) -> int:
+    base_entries: Dict[str, GTF.Entry] = {}
+    if base_gtfs is not None:
+        for base_gtf in base_gtfs:
+            for entry in base_gtf.entries:
+                base_entries[entry.attributes["name"]] = entry
+    written_names: Set[str] = set()
+    alternate_mappings: Dict[str, GTF.Entry] = {}
+
+    output_directory = os.path.dirname(output_file_path)
+    if output_directory and not os.path.exists(output_directory):
+        os.makedirs(output_directory)
+    temporary_file_path = output_file_path + ".tmp"
+    try:
+        with open(temporary_file_path, "w") as sw:
+            for name, entry in base_entries.items():
+                sw.write(str(entry) + "\n")
+                written_names.add(name)
+
+            for entry in iter_gtf_entries(gtf_file_path, strict):
+                if entry.attributes.name in base_entries:
+                    continue
+                new_attributes, needs_target_roi = plan.clean_attributes(entry)
+                if needs_target_roi:
+                    # same lookup as locate_target_rois, with one bisect per entry
+                    target_index = -1
+                    if plan.max_distance >= 0:
+                        if entry.strand == "+":
+                            coordinate = entry.end
+                        elif entry.strand == "-":
+                            coordinate = entry.start
+                        else:
+                            raise Exception(_get_unsupported_strand_error(entry))
+                        if entry.seqname not in bed_targets:
+                            raise Exception(_get_missing_seqname_error(entry, plan.bed_file_path))
+                        target_index = bed_targets[entry.seqname].walk_to_index(coordinate, entry.strand,
+                                                                                plan.max_distance)
+                    if target_index < 0:
+                        raise Exception(plan.target_roi_error(entry))
+                    new_attributes["target_ROI"] = plan.target_roi(bed_targets[entry.seqname], target_index)
+                if new_attributes["name"] in written_names:
+                    continue
+                if new_attributes["name"] in plan.alternate_mappings:
+                    alternate_mappings.update(plan.alternate_mappings[new_attributes["name"]])
+                sw.write(str(GTF.Entry(seqname=entry.seqname, source=entry.source, feature=entry.feature,
+                                       start=entry.start, end=entry.end, score=entry.score, strand=entry.strand,
+                                       frame=entry.frame, attributes=new_attributes)) + "\n")
+                written_names.add(new_attributes["name"])
+
+            for entry_key, alternate_mapping_entry in alternate_mappings.items():
+                if entry_key in written_names or alternate_mapping_entry.attributes["name"] in written_names:
+                    continue
+                sw.write(str(alternate_mapping_entry) + "\n")
+                written_names.add(alternate_mapping_entry.attributes["name"])
+        os.replace(temporary_file_path, output_file_path)
+    except Exception:
+        if os.path.exists(temporary_file_path):
+            os.remove(temporary_file_path)
+        raise
+    return len(written_names)
+
+
+# With streaming, raw_gtf should be opened with open_gtf: the raw GTF file is cleaned into the cleaned GTF file with
+# clean_gtf_file and the cleaned GTF is returned opened the same way, so neither is held in memory.
+def clean_gtf_step(logger: Logger, panel_info: PanelInfo, raw_gtf: GTF, bed: Optional[Union[BED, ColumnarBED]],
+                   catalog_gtfs: Set[GTF], output_directory: str,
+                   bed_targets: Optional[Dict[str, BedTargetIntervals]] = None,
+                   max_workers: Optional[int] = None, streaming: bool = False, strict: bool = False) -> GTF:
     logger.message("Cleaning GTF file...")
     if panel_info is None:
         logger.warning("No Panel Info config file provided, skipping GTF cleaning.")
@@ -289,14 +587,32 @@ def clean_gtf_step(logger: Logger, panel_info: PanelInfo, raw_gtf: GTF, bed: BED
     else:
         if panel_info.workflow in [WorkflowType.VARIANTPLEXSTANDARD, WorkflowType.VARIANTPLEXHS,
                                    WorkflowType.VARIANTPLEXHGC, WorkflowType.VARIANTPLEXHGC2] \
-                and any("SNV" in entry.attributes.function for entry in raw_gtf.entries) and bed is None:
+                and bed is None and bed_targets is None and raw_gtf.function_mask & snv_flag:
             logger.warning("No target coverage file provided for calculating target_ROI, skipping GTF cleaning.")
+        elif streaming:
+            file_name, extension = os.path.splitext(os.path.basename(raw_gtf.file_path))
+            cleaned_gtf_file_path = os.path.join(output_directory, f"{file_name}.cleaned{extension}")
+            logger.message(f"Cleaning {raw_gtf.file_path} into {cleaned_gtf_file_path}")
+            plan = GTFCleaningPlan(workflow=panel_info.workflow, disease=panel_info.disease,
+                                   max_distance=panel_info.max_target_roi_distance,
+                                   gtf_target_roi_buffer=panel_info.gtf_roi_target_buffer,
+                                   analysis_version=panel_info.analysis_version,
+                                   bed_file_path=bed.file_path if bed is not None else None,
+                                   gtf_file_path=raw_gtf.file_path)
+            if bed_targets is None:
+                bed_targets = _get_bed_targets(bed) if bed is not None else {}
+            clean_gtf_file(raw_gtf.file_path, cleaned_gtf_file_path, catalog_gtfs, plan, bed_targets, strict)
+            logger.message("GTF file successfully cleaned.")
+            cleaned_gtf = open_gtf(cleaned_gtf_file_path)
+            cleaned_gtf.id = raw_gtf.id
+            return cleaned_gtf
         else:
             cleaned_gtf = clean_gtf(gtf=raw_gtf, base_gtfs=catalog_gtfs, workflow=panel_info.workflow,
                                     disease=panel_info.disease, bed=bed,
                                     max_distance=panel_info.max_target_roi_distance,
                                     gtf_target_roi_buffer=panel_info.gtf_roi_target_buffer,
-                                    analysis_version=panel_info.analysis_version)
+                                    analysis_version=panel_info.analysis_version, bed_targets=bed_targets,
+                                    max_workers=max_workers)
             logger.message("GTF file successfully cleaned.")
             file_name, extension = os.path.splitext(os.path.basename(raw_gtf.file_path))
             cleaned_gtf.file_path = os.path.join(output_directory, f"{file_name}.cleaned{extension}")
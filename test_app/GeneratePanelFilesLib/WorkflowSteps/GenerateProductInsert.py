@@ -1,8 +1,12 @@
 import os
 from datetime import datetime
+from functools import reduce
+from operator import or_
 
 from AMPPanelDesignLib.CTF import CTF
 from AMPPanelDesignLib.Enums import DiseaseType, WorkflowType
+from AMPPanelDesignLib.FunctionFlags import cnv_flag, cnv_no_display_flag, dna_anomaly_flag, \
+    internal_tandem_duplication_flag, snv_flag
 from AMPPanelDesignLib.GTF import GTF
 from AMPPanelDesignLib.PanelInfo import PanelInfo
 from AMPPanelDesignLib.ProductInsert import FusionPlexTemplate, LiquidPlexTemplate, VariantPlexHGC2Template, \
@@ -23,18 +27,13 @@ def generate_product_insert_step(logger, panel_info, gtf, ctf, output_directory)
         month = datetime.now().strftime("%B")
         year = datetime.now().strftime("%Y")
         blood_cancer = panel_info.disease is DiseaseType.BLOODCANCERS
-        snv = False
-        cnv = False
-        sv = False
-        for entry in gtf.entries:
-            if "SNV" in entry.attributes.function:
-                snv = True
-            if "CNV" in entry.attributes.function and "CNV_NO_DISPLAY" not in entry.attributes.function:
-                cnv = True
-            if any(flag in entry.attributes.function for flag in ["DNA_ANOMALY", "INTERNAL_TANDEM_DUPLICATION"]):
-                sv = True
-            if snv and cnv and sv:
-                break
+        # CNV targets only count when the same entry is not also flagged CNV_NO_DISPLAY
+        function_mask = reduce(or_, (entry.attributes.function_mask & ~cnv_flag
+                                     if entry.attributes.function_mask & cnv_no_display_flag
+                                     else entry.attributes.function_mask for entry in gtf.entries), 0)
+        snv = bool(function_mask & snv_flag)
+        cnv = bool(function_mask & cnv_flag)
+        sv = bool(function_mask & (dna_anomaly_flag | internal_tandem_duplication_flag))
 
         if panel_info.workflow is WorkflowType.FUSIONPLEX:
             product_insert = FusionPlexTemplate(panel_name=panel_info.panel_name,
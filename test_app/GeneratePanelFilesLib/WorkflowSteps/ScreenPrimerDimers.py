@@ -0,0 +1,41 @@
+import os
+from typing import Dict, List
+
+from AMPPanelDesignLib.CTF import CTF
+from AMPPanelDesignLib.PanelInfo import PanelInfo, RawMaterialInfo
+from AMPPanelDesignLib.PrimerDimers import PrimerDimer, find_primer_dimers, write_primer_dimer_report
+from GeneratePanelFilesLib.Logger import Logger
+
+
+def screen_primer_dimers_step(logger: Logger, panel_info: PanelInfo, gsp1_raw_materials: List[RawMaterialInfo],
+                              spike_in_ctfs: List[CTF], ctf_repository: Dict[str, CTF], output_directory: str,
+                              min_match_length: int = 8) -> List[PrimerDimer]:
+    logger.message("Screening pooled primers for cross-pool primer dimers...")
+    if panel_info is None:
+        logger.warning("No Panel Info config file provided, skipping primer dimer screening.")
+        return []
+    elif ctf_repository is None:
+        logger.warning("No CTF repository folder provided, skipping primer dimer screening.")
+        return []
+
+    # every inventoried design and spike-in that ends up in the bulk intermediates is a separate pool
+    pools: Dict[str, CTF] = {}
+    for raw_material in gsp1_raw_materials:
+        if not raw_material.is_spike_in and raw_material.design_id in ctf_repository:
+            pools[raw_material.design_id] = ctf_repository[raw_material.design_id]
+    for spike_in_ctf in spike_in_ctfs:
+        pools[spike_in_ctf.id] = spike_in_ctf
+    if len(pools) < 2:
+        logger.message("Panel uses a single primer pool, no cross-pool primer dimers possible.")
+        return []
+
+    primer_dimers = find_primer_dimers(list(pools.values()), min_match_length=min_match_length)
+    primer_dimer_file_path = os.path.join(output_directory, f"{panel_info.panel_id}.primer_dimers.txt")
+    logger.message(f"Writing cross-pool primer dimer report to {primer_dimer_file_path}")
+    write_primer_dimer_report(primer_dimers, primer_dimer_file_path)
+    if primer_dimers:
+        logger.warning(f"Found {len(primer_dimers)} cross-pool primer pair(s) with >= {min_match_length} bases of 3' "
+                       f"complementarity across {len(pools)} pools. Longest match: {primer_dimers[0].match_length} "
+                       f"bases ({primer_dimers[0].three_prime_primer.name} [{primer_dimers[0].three_prime_pool}] / "
+                       f"{primer_dimers[0].partner_primer.name} [{primer_dimers[0].partner_pool}])")
+    return primer_dimers
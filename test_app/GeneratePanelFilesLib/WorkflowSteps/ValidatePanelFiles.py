@@ -0,0 +1,151 @@
+import os
+from typing import Dict, List, Optional, Set, Tuple, Union
+
+from AMPPanelDesignLib.BED import BED, ColumnarBED
+from AMPPanelDesignLib.CTF import CTF, PrimerPair
+from AMPPanelDesignLib.Enums import WorkflowType
+from AMPPanelDesignLib.FunctionFlags import snv_flag
+from AMPPanelDesignLib.GTF import GTF
+from AMPPanelDesignLib.PanelInfo import PanelInfo
+from GeneratePanelFilesLib.Logger import Logger
+from GeneratePanelFilesLib.WorkflowSteps.CleanGTF import BedTargetIntervals, _get_bed_targets, locate_target_rois, \
+    special_function_flags_lookup, special_target_roi_lookup
+
+# workflows whose SNV targets get a target_ROI from the coverage BED during GTF cleaning
+target_roi_workflows = [WorkflowType.VARIANTPLEXSTANDARD, WorkflowType.VARIANTPLEXHS, WorkflowType.VARIANTPLEXHGC,
+                        WorkflowType.VARIANTPLEXHGC2]
+
+
+class PanelFileDiscrepancy:
+    # missing_primer_bind: a CTF GSP2 primer has no primer_bind entry of the same name in the GTF
+    # coordinate_mismatch: the primer_bind entry of a GSP2 primer is on another chromosome, strand or position
+    # unmatched_primer_bind: a GTF primer_bind entry does not belong to any GSP2 primer of the CTF
+    # unreachable_target: GTF cleaning will not find a target_ROI for an SNV target
+    columns = ["discrepancy_type", "name", "details"]
+
+    def __init__(self, discrepancy_type: str, name: str, details: str) -> None:
+        self.discrepancy_type: str = discrepancy_type
+        self.name: str = name
+        self.details: str = details
+
+    def __str__(self) -> str:
+        return "\t".join([self.discrepancy_type, self.name, self.details])
+
+
+# (seqname, strand, start, end) of a GTF primer_bind entry
+_PrimerBindCoordinates = Tuple[str, str, int, int]
+
+
+def _get_coordinate_mismatch(primer_pair: PrimerPair, coordinates: _PrimerBindCoordinates) -> Optional[str]:
+    seqname, strand, start, end = coordinates
+    parsed_name = primer_pair.gsp2.parsed_name
+    if parsed_name.has_coordinates and parsed_name.chromosome != seqname:
+        return f"CTF chromosome {parsed_name.chromosome}, GTF seqname {seqname}"
+    if parsed_name.has_coordinates and parsed_name.strand != strand:
+        return f"CTF strand {parsed_name.strand}, GTF strand {strand}"
+    # CTF coordinates are 0-based with an exclusive stop, GTF coordinates are 1-based and inclusive
+    if start != primer_pair.gsp2_start + 1 or end != primer_pair.gsp2_stop:
+        return f"CTF {primer_pair.gsp2_start}-{primer_pair.gsp2_stop}, GTF {start}-{end}"
+    return None
+
+
+# Checks that the CTF and GTF of a panel describe the same GSP2 primers and that GTF cleaning will find a target_ROI for
+# every SNV target. The CTF GSP2 primers are joined to the GTF primer_bind entries on their names through a hash table
+# and the coordinates of every joined pair are compared. SNV targets are located in the coverage BED targets with the
+# sorted sweep used by GTF cleaning. All discrepancies are returned instead of stopping at the first one.
+def validate_panel_files(ctf: Optional[CTF], gtf: GTF, workflow: WorkflowType, max_distance: int,
+                         bed_targets: Optional[Dict[str, BedTargetIntervals]],
+                         bed_file_path: Optional[str] = None) -> List[PanelFileDiscrepancy]:
+    discrepancies: List[PanelFileDiscrepancy] = []
+
+    # only the coordinates of the primer_bind entries are kept, so a GTF opened with open_gtf is not loaded
+    primer_bind_coordinates: Dict[str, List[_PrimerBindCoordinates]] = {}
+    for entry in gtf.entries:
+        if entry.feature == "primer_bind":
+            if entry.attributes.name not in primer_bind_coordinates:
+                primer_bind_coordinates[entry.attributes.name] = []
+            primer_bind_coordinates[entry.attributes.name].append((entry.seqname, entry.strand, entry.start,
+                                                                   entry.end))
+
+    if ctf is not None:
+        gsp2_names: Set[str] = set()
+        for primer_pair in ctf.primer_pairs:
+            if primer_pair.gsp2_name in gsp2_names:
+                continue
+            gsp2_names.add(primer_pair.gsp2_name)
+            entry_coordinates = primer_bind_coordinates.get(primer_pair.gsp2_name)
+            if entry_coordinates is None:
+                discrepancies.append(PanelFileDiscrepancy("missing_primer_bind", primer_pair.gsp2_name,
+                                                          f"not found in GTF {gtf.file_path or ''}"))
+                continue
+            coordinate_mismatches = [_get_coordinate_mismatch(primer_pair, coordinates)
+                                     for coordinates in entry_coordinates]
+            if None not in coordinate_mismatches:
+                discrepancies.append(PanelFileDiscrepancy("coordinate_mismatch", primer_pair.gsp2_name,
+                                                          coordinate_mismatches[0]))
+
+        for name in primer_bind_coordinates:
+            if name not in gsp2_names:
+                discrepancies.append(PanelFileDiscrepancy("unmatched_primer_bind", name,
+                                                          f"not a GSP2 primer of CTF {ctf.file_path or ctf.id}"))
+
+    if workflow in target_roi_workflows and bed_targets is not None:
+        # the same entries GTF cleaning looks up in the BED targets
+        target_entries = []
+        for entry in gtf.entries:
+            function_flags = entry.attributes.function_mask | special_function_flags_lookup.get(entry.attributes.name, 0)
+            if function_flags & snv_flag and "target_ROI" not in entry.attributes.items \
+                    and entry.attributes.name not in special_target_roi_lookup:
+                target_entries.append(entry)
+        errors, target_indices = locate_target_rois(target_entries, bed_targets, max_distance, bed_file_path)
+        for entry, error, target_index in zip(target_entries, errors, target_indices):
+            if error is not None:
+                discrepancies.append(PanelFileDiscrepancy("unreachable_target", entry.attributes.name, error))
+            elif target_index < 0:
+                discrepancies.append(PanelFileDiscrepancy(
+                    "unreachable_target", entry.attributes.name,
+                    f"no BED target within {max_distance} bases of {entry.seqname}:{entry.start}-{entry.end} "
+                    f"({entry.strand})"))
+
+    return discrepancies
+
+
+def write_panel_file_discrepancies(discrepancies: List[PanelFileDiscrepancy], file_path: str) -> None:
+    output_directory = os.path.dirname(file_path)
+    if output_directory and not os.path.exists(output_directory):
+        os.makedirs(output_directory)
+
+    with open(file_path, "w") as sw:
+        sw.write("\t".join(PanelFileDiscrepancy.columns) + "\n")
+        for discrepancy in discrepancies:
+            sw.write(str(discrepancy) + "\n")
+
+
+def validate_panel_files_step(logger: Logger, panel_info: PanelInfo, ctf: Optional[CTF], gtf: Optional[GTF],
+                              bed: Optional[Union[BED, ColumnarBED]], output_directory: str,
+                              bed_targets: Optional[Dict[str, BedTargetIntervals]] = None) -> List[PanelFileDiscrepancy]:
+    logger.message("Validating CTF, GTF and target coverage files...")
+    if panel_info is None:
+        logger.warning("No Panel Info config file provided, skipping panel file validation.")
+        return []
+    elif gtf is None:
+        logger.warning("No GTF file provided, skipping panel file validation.")
+        return []
+
+    if bed_targets is None and bed is not None:
+        bed_targets = _get_bed_targets(bed)
+    discrepancies = validate_panel_files(ctf, gtf, panel_info.workflow, panel_info.max_target_roi_distance,
+                                         bed_targets, bed.file_path if bed is not None else None)
+    if not discrepancies:
+        logger.message("No discrepancies found between the panel files.")
+        return discrepancies
+
+    validation_file_path = os.path.join(output_directory, f"{panel_info.panel_id}.validation.txt")
+    write_panel_file_discrepancies(discrepancies, validation_file_path)
+    discrepancy_counts: Dict[str, int] = {}
+    for discrepancy in discrepancies:
+        discrepancy_counts[discrepancy.discrepancy_type] = discrepancy_counts.get(discrepancy.discrepancy_type, 0) + 1
+    logger.warning(f"Found {len(discrepancies)} discrepancies between the panel files "
+                   f"({', '.join(f'{count} {discrepancy_type}' for discrepancy_type, count in discrepancy_counts.items())})"
+                   f". See {validation_file_path}")
+    return discrepancies
@@ -0,0 +1,61 @@
+import argparse
+import os
+
+from AMPPanelDesignLib.CTF import load_all_ctfs
+from AMPPanelDesignLib.Enums import WorkflowType
+from AMPPanelDesignLib.IncidenceMatrix import DesignIncidenceMatrix, DesignOverlap
+from GeneratePanelFilesLib.Logger import Logger
+from GeneratePanelFilesLib.WorkflowSteps.CalculateRawMaterialVolumes import get_matching_molecule_type
+
+
+if __name__ == '__main__':
+    workflow_lookup = {workflow.value.config_name.casefold(): workflow for workflow in WorkflowType}
+
+    parser = argparse.ArgumentParser(description="Reports the primer pair overlap between all inventoried designs.")
+    parser.add_argument("-r", "--design-repository-folder", required=True, type=str,
+                        help="Path to the folder containing CTF and GTF files for all inventoried designs.")
+    parser.add_argument("-w", "--workflow", required=False, type=str.casefold, choices=list(workflow_lookup),
+                        default=None,
+                        help="OPTIONAL: Only analyze designs with a molecule type matching this workflow.")
+    parser.add_argument("-m", "--min-shared-primer-pairs", required=False, type=int, default=1,
+                        help="OPTIONAL: Minimum number of shared primer pairs of reported design pairs. Defaults to 1.")
+    parser.add_argument("-c", "--min-containment", required=False, type=float, default=0.9,
+                        help="OPTIONAL: Minimum fraction of the smaller design shared with the other design for two "
+                             "designs to be considered redundant. Defaults to 0.9.")
+    parser.add_argument("-o", "--output-dir", required=True, type=str,
+                        help="Output directory path.")
+    parser.add_argument("--verbose", action='store_true',
+                        help="OPTIONAL: Enables verbose activity logging to stdout.")
+
+    args = parser.parse_args()
+    logger = Logger(is_verbose=args.verbose)
+    if not os.path.exists(args.output_dir):
+        os.makedirs(args.output_dir)
+
+    logger.message("Loading design repository and building incidence matrix...")
+    molecule_type = get_matching_molecule_type(workflow_lookup[args.workflow]) if args.workflow else None
+    incidence_matrix = DesignIncidenceMatrix(load_all_ctfs(args.design_repository_folder), molecule_type)
+    logger.message(f"Built {len(incidence_matrix.design_ids)} x {incidence_matrix.primer_pair_count} incidence matrix "
+                   f"with {incidence_matrix.matrix.nnz} entries")
+
+    logger.message("Calculating pairwise design overlap...")
+    design_overlap_file_path = os.path.join(args.output_dir, "design_overlap.txt")
+    with open(design_overlap_file_path, "w") as sw:
+        sw.write("\t".join(DesignOverlap.columns) + "\n")
+        for design_overlap in incidence_matrix.design_overlaps(args.min_shared_primer_pairs):
+            sw.write(str(design_overlap) + "\n")
+
+    primer_reuse_file_path = os.path.join(args.output_dir, "primer_pair_reuse_histogram.txt")
+    with open(primer_reuse_file_path, "w") as sw:
+        sw.write("design_count\tprimer_pairs\n")
+        for design_count, primer_pairs in incidence_matrix.primer_reuse_histogram().items():
+            sw.write(f"{design_count}\t{primer_pairs}\n")
+
+    redundancy_clusters = incidence_matrix.redundancy_clusters(args.min_containment)
+    redundancy_clusters_file_path = os.path.join(args.output_dir, "redundancy_clusters.txt")
+    with open(redundancy_clusters_file_path, "w") as sw:
+        sw.write("cluster\tdesign_count\tdesign_ids\n")
+        for cluster_number, cluster in enumerate(redundancy_clusters, start=1):
+            sw.write(f"{cluster_number}\t{len(cluster)}\t{','.join(cluster)}\n")
+    logger.message(f"Found {len(redundancy_clusters)} redundancy cluster(s). Reports written to {args.output_dir}",
+                   force_display=True)
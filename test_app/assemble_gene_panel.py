@@ -0,0 +1,65 @@
+import argparse
+import os
+
+from AMPPanelDesignLib.CTF import load_all_ctfs
+from AMPPanelDesignLib.Enums import WorkflowType
+from AMPPanelDesignLib.GeneIndex import GeneIndex
+from GeneratePanelFilesLib.Logger import Logger
+from GeneratePanelFilesLib.WorkflowSteps.CalculateRawMaterialVolumes import get_matching_molecule_type
+from GeneratePanelFilesLib.WorkflowSteps.CleanCTF import aliased_gene_names_lookup
+
+
+def load_gene_list(gene_list_file: str):
+    genes = []
+    with open(gene_list_file, "r") as sr:
+        for line in sr:
+            if line.startswith("#") or line.isspace() or not line:
+                continue
+            genes.append(line.strip().split("\t")[0])
+    return genes
+
+
+if __name__ == '__main__':
+    workflow_lookup = {workflow.value.config_name.casefold(): workflow for workflow in WorkflowType}
+
+    parser = argparse.ArgumentParser(description="Assembles a raw CTF for a list of genes from the design repository.")
+    parser.add_argument("-r", "--design-repository-folder", required=True, type=str,
+                        help="Path to the folder containing CTF and GTF files for all inventoried designs.")
+    parser.add_argument("-w", "--workflow", required=True, type=str.casefold, choices=list(workflow_lookup),
+                        help="Workflow of the panel. Only primer pairs from designs with a matching molecule type are "
+                             "used.")
+    parser.add_argument("-g", "--gene", action="append", required=False, type=str, default=None,
+                        help="Gene to include in the panel. Option can be used multiple times to include multiple "
+                             "genes.")
+    parser.add_argument("-l", "--gene-list-file", required=False, type=str, default=None,
+                        help="Path to a file with one gene per line to include in the panel.")
+    parser.add_argument("-i", "--design-id", required=True, type=str,
+                        help="Design ID of the assembled CTF. Used to name the output file.")
+    parser.add_argument("-n", "--project-name", required=False, type=str, default="",
+                        help="OPTIONAL: Project name written to the assembled CTF header.")
+    parser.add_argument("-o", "--output-dir", required=True, type=str,
+                        help="Output directory path.")
+    parser.add_argument("--verbose", action='store_true',
+                        help="OPTIONAL: Enables verbose activity logging to stdout.")
+
+    args = parser.parse_args()
+    logger = Logger(is_verbose=args.verbose)
+    genes = (args.gene or []) + (load_gene_list(args.gene_list_file) if args.gene_list_file else [])
+    if not genes:
+        parser.error("At least one gene must be provided with --gene or --gene-list-file")
+
+    logger.message("Loading design repository and building gene index...")
+    gene_index = GeneIndex(load_all_ctfs(args.design_repository_folder), aliased_gene_names_lookup)
+
+    ctf, missing_genes = gene_index.assemble_ctf(design_id=args.design_id, genes=genes,
+                                                 molecule_type=get_matching_molecule_type(
+                                                     workflow_lookup[args.workflow]),
+                                                 project_name=args.project_name)
+    if missing_genes:
+        logger.warning(f"No {args.workflow} primer pairs found in the design repository for: "
+                       f"{', '.join(missing_genes)}")
+
+    ctf_file_path = os.path.join(args.output_dir, f"{args.design_id}_assembled.ctf")
+    logger.message(f"Writing assembled CTF with {len(ctf.primer_pairs)} primer pairs to {ctf_file_path}",
+                   force_display=True)
+    ctf.write(ctf_file_path)
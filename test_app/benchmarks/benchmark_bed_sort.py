@@ -0,0 +1,71 @@
+import argparse
+import os
+import random
+import resource
+import tempfile
+import time
+
+from AMPPanelDesignLib.BED import load_columnar_bed
+from GeneratePanelFilesLib.WorkflowSteps.CleanGTF import _get_bed_targets, sort_and_merge_bed_targets
+
+
+# Times the out-of-core sort and merge of BED targets on a synthetic, unsorted coverage BED of the requested size and
+# reports the peak resident memory of the process. The in-memory merge can be run for comparison on sizes that fit.
+# Run from the test_app folder: python -m benchmarks.benchmark_bed_sort --size-mb 4096
+
+def _write_unsorted_bed(bed_file: str, size_bytes: int, rng: random.Random) -> int:
+    chromosomes = [f"chr{chromosome_number}" for chromosome_number in range(1, 23)] + ["chrX", "chrY"]
+    line_count = 0
+    written_bytes = 0
+    with open(bed_file, "w") as sw:
+        while written_bytes < size_bytes:
+            lines = []
+            for _ in range(10000):
+                start = rng.randrange(0, 250000000)
+                lines.append(f"{rng.choice(chromosomes)}\t{start}\t{start + rng.randint(50, 400)}\ttarget\t0\t+\n")
+            block = "".join(lines)
+            sw.write(block)
+            written_bytes += len(block)
+            line_count += len(lines)
+    return line_count
+
+
+def _peak_memory_mb() -> float:
+    # ru_maxrss is reported in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmarks the out-of-core sort and merge of coverage BED files.")
+    parser.add_argument("--size-mb", type=int, default=2048,
+                        help="Size of the synthetic BED file in MiB. Defaults to 2048.")
+    parser.add_argument("--buffer-size", type=int, default=1000000,
+                        help="Number of BED intervals sorted in memory at a time. Defaults to 1000000.")
+    parser.add_argument("--temp-dir", type=str, default=None,
+                        help="Folder for the synthetic BED and the sort runs. Defaults to the system temp folder.")
+    parser.add_argument("--compare-in-memory", action='store_true',
+                        help="Also loads the whole BED and merges it in memory, and checks both results match.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir=args.temp_dir) as benchmark_directory:
+        bed_file = os.path.join(benchmark_directory, "coverage.bed")
+        start_time = time.perf_counter()
+        line_count = _write_unsorted_bed(bed_file, args.size_mb * 1024 * 1024, random.Random(args.seed))
+        print(f"wrote {line_count} intervals ({os.path.getsize(bed_file) / 1024 / 1024:.0f} MiB) in "
+              f"{time.perf_counter() - start_time:.1f}s")
+
+        start_time = time.perf_counter()
+        bed_targets = sort_and_merge_bed_targets(bed_file, args.buffer_size, benchmark_directory)
+        print(f"external sort and merge: {time.perf_counter() - start_time:.1f}s, "
+              f"{sum(len(intervals) for intervals in bed_targets.values())} merged intervals, "
+              f"peak memory {_peak_memory_mb():.0f} MiB")
+
+        if args.compare_in_memory:
+            start_time = time.perf_counter()
+            in_memory_bed_targets = _get_bed_targets(load_columnar_bed(bed_file, write_index=False))
+            print(f"in-memory load and merge: {time.perf_counter() - start_time:.1f}s, "
+                  f"peak memory {_peak_memory_mb():.0f} MiB")
+            for chrom, intervals in in_memory_bed_targets.items():
+                if intervals.starts != bed_targets[chrom].starts or intervals.ends != bed_targets[chrom].ends:
+                    raise Exception(f"External and in-memory BED targets differ on {chrom}")
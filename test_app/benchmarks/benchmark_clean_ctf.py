@@ -0,0 +1,126 @@
+import argparse
+import random
+import time
+import tracemalloc
+from decimal import Decimal
+from typing import Callable, Dict, List, Tuple
+
+from AMPPanelDesignLib.CTF import CTF, PrimerPair, Primer
+from GeneratePanelFilesLib.WorkflowSteps.CleanCTF import aliased_gene_names_lookup, alternate_ctf_mappings, clean_ctf
+
+
+# Times CTF cleaning of a synthetic CTF, once by copying every primer pair (the previous clean_ctf behaviour) and once
+# with the copy-on-write cleaner, and reports the memory allocated by each with tracemalloc.
+# Run from the test_app folder: python -m benchmarks.benchmark_clean_ctf
+
+def _make_ctf(primer_pair_count: int, aliased_fraction: float, rng: random.Random) -> CTF:
+    aliased_genes = sorted(aliased_gene_names_lookup)
+    genes = [f"GENE{gene_number}" for gene_number in range(1000)]
+    primer_pairs = []
+    gsp1_primers: Dict[str, Primer] = {}
+    for primer_pair_index in range(primer_pair_count):
+        gene = rng.choice(aliased_genes) if rng.random() < aliased_fraction else rng.choice(genes)
+        chromosome = f"chr{rng.randint(1, 22)}"
+        strand = rng.choice("+-")
+        # several GSP2 primers share a GSP1 primer, as in real designs
+        gsp1_start = rng.randint(1, 10000) * 1000
+        gsp1_name = f"{gene}_{chromosome}_{gsp1_start}_24_{strand}_A1_GSP1"
+        if gsp1_name not in gsp1_primers:
+            gsp1_primers[gsp1_name] = Primer(start=gsp1_start, stop=gsp1_start + 24, name=gsp1_name,
+                                             sequence="ACGT" * 6, boost_level=Decimal("1.0"))
+        gsp2_start = gsp1_start + rng.randint(30, 200)
+        primer_pairs.append(PrimerPair(gene_name=gene, ncbi_reference_sequence="NM_000000.1", target_exon="1",
+                                       target_chromosome=chromosome, target_start=str(gsp2_start),
+                                       target_stop=str(gsp2_start + 100), target_strand=strand,
+                                       target_name=f"target{primer_pair_index}", assay_type="SNV",
+                                       direction=strand, gsp1=gsp1_primers[gsp1_name], gsp1_tail=False,
+                                       gsp2=Primer(start=gsp2_start, stop=gsp2_start + 25,
+                                                   name=f"{gene}_{chromosome}_{gsp2_start}_25_{strand}_A1_GSP2",
+                                                   sequence="TGCA" * 6, boost_level=Decimal("1.0")),
+                                       cds_only=False, primer_pair_functions="SNV", snp_id_locations="",
+                                       primer_pair_notes=""))
+    return CTF(design_id="benchmark", file_path=None, header={}, primer_pairs=primer_pairs)
+
+
+def _clean_ctf_copying(ctf: CTF) -> CTF:
+    cleaned_primer_pairs: List[PrimerPair] = []
+    alternate_mappings: Dict[Tuple[str, str], PrimerPair] = {}
+    for primer_pair in ctf.primer_pairs:
+        gene_name = primer_pair.gene_name
+        gsp1_name = primer_pair.gsp1_name
+        gsp2_name = primer_pair.gsp2_name
+        if gene_name in aliased_gene_names_lookup:
+            gene_alias = aliased_gene_names_lookup[gene_name]
+            gsp1_name = gsp1_name.replace(gene_name, gene_alias, 1)
+            gsp2_name = gsp2_name.replace(gene_name, gene_alias, 1)
+            gene_name = gene_alias
+        new_primer_pair = PrimerPair(gene_name=gene_name,
+                                     ncbi_reference_sequence=primer_pair.ncbi_reference_sequence,
+                                     target_exon=primer_pair.target_exon,
+                                     target_chromosome=primer_pair.target_chromosome,
+                                     target_start=primer_pair.target_start,
+                                     target_stop=primer_pair.target_stop,
+                                     target_strand=primer_pair.target_strand,
+                                     target_name=primer_pair.target_name,
+                                     assay_type=primer_pair.assay_type,
+                                     direction=primer_pair.direction,
+                                     gsp1=Primer(start=primer_pair.gsp1.start,
+                                                 stop=primer_pair.gsp1.stop,
+                                                 name=gsp1_name,
+                                                 sequence=primer_pair.gsp1.sequence,
+                                                 boost_level=primer_pair.gsp1.boost_level),
+                                     gsp1_tail=primer_pair.gsp1_tail,
+                                     gsp2=Primer(start=primer_pair.gsp2.start,
+                                                 stop=primer_pair.gsp2.stop,
+                                                 name=gsp2_name,
+                                                 sequence=primer_pair.gsp2.sequence,
+                                                 boost_level=primer_pair.gsp2.boost_level),
+                                     cds_only=primer_pair.cds_only,
+                                     primer_pair_functions=primer_pair.primer_pair_functions,
+                                     snp_id_locations=primer_pair.snp_id_locations,
+                                     primer_pair_notes=primer_pair.primer_pair_notes)
+        new_primer_pair_key = (new_primer_pair.gsp1_name, new_primer_pair.gsp2_name)
+        if new_primer_pair_key in alternate_ctf_mappings:
+            alternate_mappings.update(alternate_ctf_mappings[new_primer_pair_key])
+        cleaned_primer_pairs.append(new_primer_pair)
+    for primer_pair in cleaned_primer_pairs:
+        primer_pair_key = (primer_pair.gsp1_name, primer_pair.gsp2_name)
+        if primer_pair_key in alternate_mappings:
+            alternate_mappings.pop(primer_pair_key)
+    for alternate_mapping_primer_pair in alternate_mappings.values():
+        cleaned_primer_pairs.append(alternate_mapping_primer_pair)
+    return CTF(design_id=ctf.id, file_path=None, header=ctf.header.items, primer_pairs=cleaned_primer_pairs)
+
+
+def _measure(label: str, cleaner: Callable[[CTF], CTF], ctf: CTF, repeats: int) -> CTF:
+    cleaned_ctf = None
+    start_time = time.perf_counter()
+    for _ in range(repeats):
+        cleaned_ctf = cleaner(ctf)
+    elapsed = (time.perf_counter() - start_time) / repeats
+    # allocations are measured in a separate run, as tracing slows down the cleaner
+    tracemalloc.start()
+    retained_ctf = cleaner(ctf)
+    retained_size, peak_size = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del retained_ctf
+    print(f"{label}: {elapsed:.3f}s, {retained_size / 2 ** 20:.1f} MiB retained, {peak_size / 2 ** 20:.1f} MiB peak")
+    return cleaned_ctf
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmarks copy-on-write CTF cleaning.")
+    parser.add_argument("--primer-pairs", type=int, default=200000)
+    parser.add_argument("--aliased-fraction", type=float, default=0.02)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    ctf = _make_ctf(args.primer_pairs, args.aliased_fraction, random.Random(args.seed))
+    print(f"{len(ctf.primer_pairs)} primer pairs, {args.aliased_fraction:.1%} of genes aliased")
+
+    copied_ctf = _measure("copy every primer pair", _clean_ctf_copying, ctf, args.repeats)
+    cleaned_ctf = _measure("copy-on-write", clean_ctf, ctf, args.repeats)
+    if [str(primer_pair) for primer_pair in copied_ctf.primer_pairs] \
+            != [str(primer_pair) for primer_pair in cleaned_ctf.primer_pairs]:
+        raise Exception("Copy-on-write cleaned CTF differs from copying every primer pair")
@@ -0,0 +1,94 @@
+import argparse
+import random
+import time
+
+from AMPPanelDesignLib.BED import BED
+from AMPPanelDesignLib.Enums import WorkflowType, DiseaseType
+from AMPPanelDesignLib.GTF import GTF
+from GeneratePanelFilesLib.WorkflowSteps.CleanGTF import _get_bed_targets, clean_gtf, locate_target_rois
+
+
+# Times target ROI resolution for a synthetic GTF of SNV primer_bind entries against a synthetic coverage BED, once by
+# probing every base up to the maximum distance (the previous clean_gtf behaviour) and once with the batch resolver.
+# Run from the test_app folder: python -m benchmarks.benchmark_target_roi
+
+def _make_bed(chromosome_count: int, intervals_per_chromosome: int, rng: random.Random) -> BED:
+    entries = []
+    for chromosome_number in range(1, chromosome_count + 1):
+        position = 0
+        for _ in range(intervals_per_chromosome):
+            position += rng.randint(50, 400)
+            end = position + rng.randint(60, 250)
+            entries.append(BED.Entry(chrom=f"chr{chromosome_number}", chrom_start=position, chrom_end=end, name="",
+                                     score="", strand="", thick_start=position, thick_end=end))
+            position = end
+    return BED(None, [], entries)
+
+
+def _make_gtf(bed: BED, entry_count: int, max_distance: int, rng: random.Random) -> GTF:
+    entries = []
+    for entry_index in range(entry_count):
+        bed_entry = rng.choice(bed.entries)
+        strand = rng.choice("+-")
+        # primer ends between max_distance bases before and a few bases inside the targeted interval
+        offset = rng.randint(-5, max_distance)
+        if strand == "+":
+            end = bed_entry.chrom_start - offset
+            start = end - 24
+        else:
+            start = bed_entry.chrom_end + offset
+            end = start + 24
+        entries.append(GTF.Entry(seqname=bed_entry.chrom, source="ArcherDX", feature="primer_bind", start=start,
+                                 end=end, score=".", strand=strand, frame=".",
+                                 attributes={"name": f"GENE{entry_index}_{bed_entry.chrom}_{start}_25_{strand}_A1_GSP2",
+                                             "gene_id": f"GENE{entry_index}", "function": "SNV"}))
+    return GTF(entries=entries, design_id="benchmark", file_path=None)
+
+
+def _probe_every_base(entries, paddings, bed_targets, max_distance):
+    target_rois = []
+    for entry, padding in zip(entries, paddings):
+        for distance in range(0, max_distance + 1):
+            coordinate = entry.end + distance if entry.strand == "+" else entry.start - distance
+            bed_target = bed_targets[entry.seqname].find(coordinate)
+            if bed_target is not None:
+                target_rois.append(str(bed_target.pad(padding_size=padding)))
+                break
+    return target_rois
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmarks target ROI resolution of GTF cleaning.")
+    parser.add_argument("--gtf-entries", type=int, default=50000)
+    parser.add_argument("--chromosomes", type=int, default=24)
+    parser.add_argument("--intervals-per-chromosome", type=int, default=20000)
+    parser.add_argument("--max-distance", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    bed = _make_bed(args.chromosomes, args.intervals_per_chromosome, rng)
+    gtf = _make_gtf(bed, args.gtf_entries, args.max_distance, rng)
+    print(f"{len(gtf.entries)} GTF entries, {len(bed.entries)} BED intervals, max distance {args.max_distance}")
+
+    start_time = time.perf_counter()
+    bed_targets = _get_bed_targets(bed)
+    print(f"merge BED targets: {time.perf_counter() - start_time:.3f}s")
+
+    paddings = [10] * len(gtf.entries)
+    start_time = time.perf_counter()
+    probed_target_rois = _probe_every_base(gtf.entries, paddings, bed_targets, args.max_distance)
+    print(f"probe every base: {time.perf_counter() - start_time:.3f}s")
+
+    start_time = time.perf_counter()
+    _, target_indices = locate_target_rois(gtf.entries, bed_targets, args.max_distance, None)
+    resolved_target_rois = [str(bed_targets[entry.seqname].target(target_index).pad(padding_size=padding))
+                            for entry, target_index, padding in zip(gtf.entries, target_indices, paddings)
+                            if target_index >= 0]
+    print(f"batch resolver: {time.perf_counter() - start_time:.3f}s")
+    if probed_target_rois != resolved_target_rois:
+        raise Exception("Batch resolver target ROIs differ from probing every base")
+
+    start_time = time.perf_counter()
+    clean_gtf(gtf, None, WorkflowType.VARIANTPLEXSTANDARD, DiseaseType.SOLIDTUMOR, bed, args.max_distance, None, "7.0")
+    print(f"clean_gtf: {time.perf_counter() - start_time:.3f}s")
@@ -0,0 +1,49 @@
+import argparse
+
+from AMPPanelDesignLib.CTF import load_all_ctfs, load_ctf
+from AMPPanelDesignLib.PrimerQC import PrimerQCSpec, check_primers, write_primer_qc_report
+from GeneratePanelFilesLib.Logger import Logger
+
+
+if __name__ == '__main__':
+    default_spec = PrimerQCSpec()
+
+    parser = argparse.ArgumentParser(description="Reports GC content, length, homopolymer runs, 3' end stability and "
+                                                 "melting temperature of every primer in CTF files.")
+    ctf_group = parser.add_mutually_exclusive_group(required=True)
+    ctf_group.add_argument("-c", "--ctf", action="append", type=str, default=None,
+                           help="Path to a CTF file to check. Option can be used multiple times.")
+    ctf_group.add_argument("-r", "--design-repository-folder", type=str, default=None,
+                           help="Path to a folder of CTF files to check, e.g. the design repository.")
+    parser.add_argument("-o", "--output-file", required=True, type=str,
+                        help="Path of the primer QC report.")
+    parser.add_argument("--min-length", type=int, default=default_spec.min_length)
+    parser.add_argument("--max-length", type=int, default=default_spec.max_length)
+    parser.add_argument("--min-gc", type=float, default=default_spec.min_gc_content)
+    parser.add_argument("--max-gc", type=float, default=default_spec.max_gc_content)
+    parser.add_argument("--max-homopolymer", type=int, default=default_spec.max_homopolymer)
+    parser.add_argument("--min-three-prime-dg", type=float, default=default_spec.min_three_prime_delta_g,
+                        help="Most stable allowed free energy (kcal/mol) of the last 5 bases of the 3' end.")
+    parser.add_argument("--min-tm", type=float, default=default_spec.min_tm)
+    parser.add_argument("--max-tm", type=float, default=default_spec.max_tm)
+    parser.add_argument("--verbose", action='store_true',
+                        help="OPTIONAL: Enables verbose activity logging to stdout.")
+
+    args = parser.parse_args()
+    logger = Logger(is_verbose=args.verbose)
+    spec = PrimerQCSpec(min_length=args.min_length, max_length=args.max_length, min_gc_content=args.min_gc,
+                        max_gc_content=args.max_gc, max_homopolymer=args.max_homopolymer,
+                        min_three_prime_delta_g=args.min_three_prime_dg, min_tm=args.min_tm, max_tm=args.max_tm)
+
+    logger.message("Loading CTF files...")
+    if args.design_repository_folder:
+        ctfs = [ctf for _, ctf in sorted(load_all_ctfs(args.design_repository_folder).items())]
+    else:
+        ctfs = [load_ctf(ctf_file_path) for ctf_file_path in args.ctf]
+
+    logger.message("Checking primers...")
+    records = check_primers(ctfs, spec)
+    write_primer_qc_report(records, args.output_file)
+    failed_records = sum(1 for record in records if not record.passed)
+    logger.message(f"{failed_records} of {len(records)} primers are out of spec. Report written to {args.output_file}",
+                   force_display=True)
@@ -0,0 +1,53 @@
+import argparse
+import os
+
+from AMPPanelDesignLib.BED import load_bed
+from AMPPanelDesignLib.CTF import load_all_ctfs
+from AMPPanelDesignLib.Enums import WorkflowType
+from GeneratePanelFilesLib.Logger import Logger
+from GeneratePanelFilesLib.PanelComposition import compose_panel
+from GeneratePanelFilesLib.WorkflowSteps.CalculateRawMaterialVolumes import get_matching_molecule_type
+
+
+if __name__ == '__main__':
+    workflow_lookup = {workflow.value.config_name.casefold(): workflow for workflow in WorkflowType}
+
+    parser = argparse.ArgumentParser(description="Composes a raw CTF that covers the regions in a BED file out of "
+                                                 "inventoried designs.")
+    parser.add_argument("-b", "--bed-file", required=True, type=str,
+                        help="Path to the BED file with the requested target regions.")
+    parser.add_argument("-r", "--design-repository-folder", required=True, type=str,
+                        help="Path to the folder containing CTF and GTF files for all inventoried designs.")
+    parser.add_argument("-w", "--workflow", required=True, type=str.casefold, choices=list(workflow_lookup),
+                        help="Workflow of the panel. Only designs with a matching molecule type are used.")
+    parser.add_argument("-i", "--design-id", required=True, type=str,
+                        help="Design ID of the composed CTF. Used to name the output files.")
+    parser.add_argument("-n", "--project-name", required=False, type=str, default="",
+                        help="OPTIONAL: Project name written to the composed CTF header.")
+    parser.add_argument("-o", "--output-dir", required=True, type=str,
+                        help="Output directory path.")
+    parser.add_argument("--verbose", action='store_true',
+                        help="OPTIONAL: Enables verbose activity logging to stdout.")
+
+    args = parser.parse_args()
+    logger = Logger(is_verbose=args.verbose)
+
+    logger.message("Loading requested regions and design repository...")
+    bed = load_bed(args.bed_file)
+    ctf_repository = load_all_ctfs(args.design_repository_folder)
+
+    logger.message("Selecting inventoried designs...")
+    composition = compose_panel(design_id=args.design_id, project_name=args.project_name, bed=bed,
+                                ctf_repository=ctf_repository,
+                                molecule_type=get_matching_molecule_type(workflow_lookup[args.workflow]))
+
+    ctf_file_path = os.path.join(args.output_dir, f"{args.design_id}_composed.ctf")
+    logger.message(f"Writing composed CTF built from {len(composition.selected_designs)} design(s) to {ctf_file_path}",
+                   force_display=True)
+    composition.ctf.write(ctf_file_path)
+
+    if composition.uncovered_regions:
+        uncovered_regions_file_path = os.path.join(args.output_dir, f"{args.design_id}_uncovered_regions.bed")
+        logger.warning(f"{len(composition.uncovered_regions)} requested region(s) are not covered by any inventoried "
+                       f"design. Writing them to {uncovered_regions_file_path}")
+        composition.write_uncovered_regions(uncovered_regions_file_path)
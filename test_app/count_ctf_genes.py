@@ -35,7 +35,7 @@ if __name__ == '__main__':
         for entry in ctf.primer_pairs:
             if entry.gsp1_name in blacklisted_primers:
                 continue
-            gene_name = entry.gsp1_name.split("_")[0]
+            gene_name = entry.gsp1.gene
             if gene_name not in ctf_gene_set:
                 ctf_gene_set.add(gene_name)
                 if gene_name not in gene_counts:
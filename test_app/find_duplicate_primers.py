@@ -0,0 +1,35 @@
+import argparse
+
+from AMPPanelDesignLib.CTF import load_all_ctfs
+from AMPPanelDesignLib.DuplicatePrimers import find_duplicate_primers, write_primer_collision_report
+from GeneratePanelFilesLib.Logger import Logger
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Finds primers with different names but identical, reverse "
+                                                 "complementary or contained sequences across the design repository.")
+    parser.add_argument("-r", "--design-repository-folder", required=True, type=str,
+                        help="Path to the folder containing CTF and GTF files for all inventoried designs.")
+    parser.add_argument("-o", "--output-file", required=True, type=str,
+                        help="Path of the primer collision report.")
+    parser.add_argument("-m", "--min-contained-length", required=False, type=int, default=15,
+                        help="OPTIONAL: Minimum length of primers reported as contained in another primer. "
+                             "Defaults to 15.")
+    parser.add_argument("--verbose", action='store_true',
+                        help="OPTIONAL: Enables verbose activity logging to stdout.")
+
+    args = parser.parse_args()
+    logger = Logger(is_verbose=args.verbose)
+
+    logger.message("Loading design repository...")
+    ctf_repository = load_all_ctfs(args.design_repository_folder)
+
+    logger.message("Searching for duplicate primer sequences...")
+    collisions = find_duplicate_primers((ctf for _, ctf in sorted(ctf_repository.items())), args.min_contained_length)
+    write_primer_collision_report(collisions, args.output_file)
+    collision_counts = {}
+    for collision in collisions:
+        collision_counts[collision.collision_type] = collision_counts.get(collision.collision_type, 0) + 1
+    logger.message(f"Found {len(collisions)} primer collision(s) "
+                   f"({', '.join(f'{count} {collision_type}' for collision_type, count in collision_counts.items())}). "
+                   f"Report written to {args.output_file}", force_display=True)
@@ -0,0 +1,66 @@
+import argparse
+import os
+import sys
+
+from AMPPanelDesignLib.CTF import load_all_ctfs, load_ctf
+from AMPPanelDesignLib.Enums import WorkflowType
+from AMPPanelDesignLib.SimilaritySearch import DesignSimilarityIndex, SimilarDesign
+from GeneratePanelFilesLib.Logger import Logger
+from GeneratePanelFilesLib.WorkflowSteps.CalculateRawMaterialVolumes import get_matching_molecule_type
+
+
+if __name__ == '__main__':
+    workflow_lookup = {workflow.value.config_name.casefold(): workflow for workflow in WorkflowType}
+
+    parser = argparse.ArgumentParser(description="Finds the inventoried designs whose primer pairs overlap the most with "
+                                                 "a CTF.")
+    parser.add_argument("-c", "--ctf", required=True, type=str,
+                        help="Path to the CTF to search for.")
+    parser.add_argument("-r", "--design-repository-folder", required=True, type=str,
+                        help="Path to the folder containing CTF and GTF files for all inventoried designs.")
+    parser.add_argument("-w", "--workflow", required=False, type=str.casefold, choices=list(workflow_lookup),
+                        default=None,
+                        help="OPTIONAL: Only search designs with a molecule type matching this workflow.")
+    parser.add_argument("-n", "--max-results", required=False, type=int, default=10,
+                        help="OPTIONAL: Maximum number of designs to report. Defaults to 10.")
+    parser.add_argument("-m", "--min-jaccard", required=False, type=float, default=0.0,
+                        help="OPTIONAL: Minimum Jaccard similarity of reported designs. Defaults to 0.")
+    parser.add_argument("--lsh-bands", required=False, type=int, default=64,
+                        help="OPTIONAL: Number of LSH bands. More bands find designs with a lower similarity at the cost "
+                             "of more candidates to compare. Defaults to 64.")
+    parser.add_argument("--lsh-rows-per-band", required=False, type=int, default=2,
+                        help="OPTIONAL: Number of MinHash values per LSH band. Bands x rows must be a power of 2. "
+                             "Defaults to 2.")
+    parser.add_argument("-o", "--output-file", required=False, type=str, default=None,
+                        help="OPTIONAL: Path of the results file. Results are written to stdout by default.")
+    parser.add_argument("--verbose", action='store_true',
+                        help="OPTIONAL: Enables verbose activity logging to stdout.")
+
+    args = parser.parse_args()
+    logger = Logger(is_verbose=args.verbose)
+
+    logger.message("Loading design repository and building similarity index...")
+    molecule_type = get_matching_molecule_type(workflow_lookup[args.workflow]) if args.workflow else None
+    similarity_index = DesignSimilarityIndex(load_all_ctfs(args.design_repository_folder), molecule_type,
+                                             bands=args.lsh_bands, rows_per_band=args.lsh_rows_per_band)
+    logger.message(f"Indexed {len(similarity_index)} designs")
+
+    similar_designs = similarity_index.query(load_ctf(args.ctf), max_results=args.max_results,
+                                             min_jaccard=args.min_jaccard)
+    if not similar_designs:
+        logger.warning(f"No similar inventoried designs found for {args.ctf}")
+
+    if args.output_file:
+        output_directory = os.path.dirname(args.output_file)
+        if output_directory and not os.path.exists(output_directory):
+            os.makedirs(output_directory)
+        sw = open(args.output_file, "w")
+    else:
+        sw = sys.stdout
+    try:
+        sw.write("\t".join(SimilarDesign.columns) + "\n")
+        for similar_design in similar_designs:
+            sw.write(str(similar_design) + "\n")
+    finally:
+        if sw is not sys.stdout:
+            sw.close()
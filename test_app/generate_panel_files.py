@@ -2,20 +2,26 @@ import argparse
 import os
 from typing import Optional, Set
 
-from AMPPanelDesignLib.BED import load_bed
+from AMPPanelDesignLib.BED import load_columnar_bed
 from AMPPanelDesignLib.CTF import load_ctf, load_all_ctfs
-from AMPPanelDesignLib.GTF import load_gtf, load_all_gtfs
+from AMPPanelDesignLib.GTF import load_gtf, index_all_gtfs, open_gtf
 from AMPPanelDesignLib.InventoryTracking import load_inventory_tracking
 from AMPPanelDesignLib.PanelInfo import load_panel_info
+from AMPPanelDesignLib.PrimerQC import PrimerQCSpec
 from GeneratePanelFilesLib.Logger import Logger
+from GeneratePanelFilesLib.PanelFileSession import PanelFileSession
 from GeneratePanelFilesLib.WorkflowSteps.BuildBOM import build_bom_step
+from GeneratePanelFilesLib.WorkflowSteps.CalculatePanelStats import calculate_panel_stats_step
 from GeneratePanelFilesLib.WorkflowSteps.CalculateRawMaterialVolumes import calculate_raw_material_volumes_step
 from GeneratePanelFilesLib.WorkflowSteps.CheckRawMaterialInventory import check_raw_material_inventory
 from GeneratePanelFilesLib.WorkflowSteps.CleanCTF import clean_ctf_step
-from GeneratePanelFilesLib.WorkflowSteps.CleanGTF import clean_gtf_step
+from GeneratePanelFilesLib.WorkflowSteps.CleanGTF import _get_bed_targets, clean_gtf_step, sort_and_merge_bed_targets
 from GeneratePanelFilesLib.WorkflowSteps.GenerateProductInsert import generate_product_insert_step
+from GeneratePanelFilesLib.WorkflowSteps.ScreenPrimerDimers import screen_primer_dimers_step
+from GeneratePanelFilesLib.WorkflowSteps.ValidatePanelFiles import validate_panel_files_step
 
-def load_arg_dict(recipe_options):
+# session keeps the design repositories and design solvers of the GUI between runs (see PanelFileSession)
+def load_arg_dict(recipe_options, session: Optional[PanelFileSession] = None):
     print('inside generate_panel_files')
     print(recipe_options)
 
@@ -25,7 +31,8 @@ def load_arg_dict(recipe_options):
     bed_file_path: Optional[str] = args.BED_filepath
     design_repository_folder_path: Optional[str] = args.design_repo_folder
     spike_in_folder_path: Optional[str] = args.spikein_folder
-    ignore_ctf_set: Optional[Set[str]] = None  # set(args.ignore_ctf) if args.ignore_ctf is not None else set()
+    ignore_ctf_set: Optional[Set[str]] = set(args.ctfs_to_ignore) if args.ctfs_to_ignore else set()
+    pinned_ctf_set: Optional[Set[str]] = set(args.custom_pick_ctfs) if args.custom_pick_ctfs else set()
     panel_info_file_path: Optional[str] = args.panel_info_filepath
     inventory_tracking_file_path: Optional[str] = None  # args.inventory_tracking_file
     do_clean_ctf: bool = not args.disable_CTF_cleaning
@@ -35,6 +42,9 @@ def load_arg_dict(recipe_options):
     do_generate_dbom: bool = not args.disable_dbom_gen
     do_generate_odoo_bom: bool = not args.disable_odoo_bom_file_gen
     do_generate_label_info: bool = not args.disable_label_info_file_gen
+    primer_qc_spec: Optional[PrimerQCSpec] = PrimerQCSpec() if args.primer_qc else None
+    # GTF cleaning stays in-process unless the operator asks for more worker processes
+    gtf_clean_workers: int = args.gtf_clean_workers or 1
     do_build_bom: bool = do_generate_dbom or do_generate_odoo_bom
     logger: Logger = Logger(is_verbose=args.verbose_logging)
     output_directory: str = args.output_dir
@@ -44,12 +54,16 @@ def load_arg_dict(recipe_options):
     panel_info = load_panel_info(panel_info_file_path) if panel_info_file_path is not None else None
     ctf = load_ctf(ctf_file_path) if ctf_file_path is not None else None
     gtf = load_gtf(gtf_file_path) if gtf_file_path is not None else None
-    bed = load_bed(bed_file_path) if bed_file_path is not None else None
-    ctf_repository = load_all_ctfs(design_repository_folder_path,
-                                   ignore_ctf_set) if design_repository_folder_path is not None else None
-    spike_in_repository = load_all_ctfs(spike_in_folder_path,
-                                        ignore_ctf_set) if spike_in_folder_path is not None else None
-    gtf_repository = load_all_gtfs(design_repository_folder_path) if design_repository_folder_path is not None else None
+    bed = load_columnar_bed(bed_file_path) if bed_file_path is not None else None
+    # merged once for both panel file validation and GTF cleaning
+    bed_targets = _get_bed_targets(bed) if bed is not None and gtf is not None else None
+    if session is None:
+        session = PanelFileSession()
+    ctf_repository = session.load_ctf_repository(design_repository_folder_path) \
+        if design_repository_folder_path is not None else None
+    spike_in_repository = session.load_ctf_repository(spike_in_folder_path) if spike_in_folder_path is not None else None
+    gtf_repository = session.index_gtf_repository(design_repository_folder_path) \
+        if design_repository_folder_path is not None else None
     inventory_tracking = load_inventory_tracking(
         inventory_tracking_file_path) if inventory_tracking_file_path is not None else None
     spike_in_ctfs = []
@@ -62,18 +76,27 @@ def load_arg_dict(recipe_options):
         logger.warning(f"CTF ID ({ctf.id}) and Panel ID found inside {panel_info.file_path} ({panel_info.panel_id}) "
                        f"are not the same. Defaulting to {panel_info.panel_id} for creating filenames.")
 
+    validate_panel_files_step(logger, panel_info, ctf, gtf, bed, output_directory, bed_targets)
+
     if do_clean_ctf:
-        ctf = clean_ctf_step(logger, ctf, output_directory)
+        ctf = clean_ctf_step(logger, ctf, output_directory, primer_qc_spec)
 
     if do_calculate_volumes:
+        solver = session.get_solver(ctf, panel_info.workflow, design_repository_folder_path, spike_in_folder_path,
+                                    logger) \
+            if panel_info is not None and ctf is not None and ctf_repository is not None else None
         gsp1_raw_materials, gsp2_raw_materials, spike_in_ctfs = \
             calculate_raw_material_volumes_step(logger, panel_info, ctf, ctf_repository, spike_in_repository,
-                                                output_directory)
+                                                output_directory, pinned_designs=pinned_ctf_set,
+                                                excluded_designs=ignore_ctf_set, solver=solver)
         # needed for GTF cleaning step
         for raw_material in gsp1_raw_materials:
             if raw_material.is_catalog_panel and raw_material.design_id is not None:
                 catalog_gtfs.add(gtf_repository[raw_material.design_id])
 
+        screen_primer_dimers_step(logger, panel_info, gsp1_raw_materials, spike_in_ctfs, ctf_repository,
+                                  output_directory)
+
         check_raw_material_inventory(logger, panel_info, gsp1_raw_materials, gsp2_raw_materials, inventory_tracking,
                                      output_directory)
 
@@ -82,7 +105,10 @@ def load_arg_dict(recipe_options):
                        output_directory)
 
     if do_clean_gtf:
-        gtf = clean_gtf_step(logger, panel_info, gtf, bed, catalog_gtfs, output_directory)
+        gtf = clean_gtf_step(logger, panel_info, gtf, bed, catalog_gtfs, output_directory, bed_targets,
+                             max_workers=gtf_clean_workers)
+
+    calculate_panel_stats_step(logger, panel_info, gtf, bed, output_directory)
 
     if do_generate_product_insert and panel_info.supplementary_module_reactions is None:
         product_insert = generate_product_insert_step(logger, panel_info, gtf, ctf, output_directory)
@@ -102,7 +128,7 @@ def load_arg_dict(recipe_options):
                 spike_in_ctf_path = os.path.join(output_directory, f"{panel_info.panel_id}_{ctf.id}.ctf")
                 ctf_gene_set = set()
                 for entry in ctf.primer_pairs:
-                    gene_name = entry.gsp1_name.split("_")[0]
+                    gene_name = entry.gsp1.gene
                     if gene_name not in ctf_gene_set:
                         ctf_gene_set.add(gene_name)
                         if gene_name not in gene_counts:
@@ -138,10 +164,16 @@ if __name__ == '__main__':
     parser.add_argument("-s", "--spike-in-folder", required=False, type=str, default=None,
                         help="Path to the folder containing CTF files for all inventoried designs.")
     parser.add_argument("-i", "--ignore-ctf", action="append", required=False, type=str, default=None,
-                        help="Path to a CTF file that will be ignored during raw material volume calculation. "
-                             "Option can be used multiple times to ignore multiple CTFs.")
+                        help="Path to a CTF file (or a design ID) that will be ignored during raw material volume "
+                             "calculation. Option can be used multiple times to ignore multiple CTFs.")
+    parser.add_argument("--pin-ctf", action="append", required=False, type=str, default=None,
+                        help="Path to a CTF file (or a design ID) that must be used as a raw material during raw "
+                             "material volume calculation. Option can be used multiple times to pin multiple CTFs.")
     parser.add_argument("-t", "--inventory-tracking-file", required=False, type=str, default=None,
                         help="Path to the GLI inventory tracking file.")
+    parser.add_argument("--solver-cache-mb", required=False, type=int, default=None,
+                        help="OPTIONAL: Memory cap in MiB for the subgraph solution cache used while choosing "
+                             "inventoried designs. Least recently used solutions are evicted once the cap is reached.")
     parser.add_argument("-o", "--output-dir", required=True, type=str,
                         help="Output directory path. Will create one sub-directory per panel configuration file.")
     parser.add_argument("--no-ctf-clean", action='store_true',
@@ -158,6 +190,26 @@ if __name__ == '__main__':
                         help="OPTIONAL: Disables Odoo BOM file generation.")
     parser.add_argument("--no-label-info", action='store_true',
                         help="OPTIONAL: Disables label info file generation.")
+    parser.add_argument("--no-dimer-screen", action='store_true',
+                        help="OPTIONAL: Disables screening primers of different pools for 3' complementarity.")
+    parser.add_argument("--primer-qc", action='store_true',
+                        help="OPTIONAL: Checks the primers of the cleaned CTF against the default primer QC spec and "
+                             "writes a primer QC report next to the cleaned CTF.")
+    parser.add_argument("--no-panel-stats", action='store_true',
+                        help="OPTIONAL: Disables panel footprint and coverage statistics.")
+    parser.add_argument("--strict-gtf", action='store_true',
+                        help="OPTIONAL: Parses all GTF attributes while loading and fails on duplicate attributes.")
+    parser.add_argument("--bed-sort-buffer", required=False, type=int, default=None,
+                        help="OPTIONAL: Sorts and merges the target coverage BED file out of core instead of loading "
+                             "it, keeping at most this many BED intervals in memory at a time. Use for coverage files "
+                             "that are too large to load.")
+    parser.add_argument("--gtf-clean-workers", required=False, type=int, default=None,
+                        help="OPTIONAL: Number of processes cleaning large GTF files, one per chromosome at a time. "
+                             "Defaults to one per CPU.")
+    parser.add_argument("--stream-gtf-clean", action='store_true',
+                        help="OPTIONAL: Cleans the GTF file line by line straight into the cleaned GTF file instead of "
+                             "building the cleaned GTF in memory. Neither the GTF nor the cleaned GTF is loaded; "
+                             "the steps that need their entries read them from the files.")
     parser.add_argument("--verbose", action='store_true',
                         help="OPTIONAL: Enables verbose activity logging to stdout.")
 
@@ -168,6 +220,7 @@ if __name__ == '__main__':
     design_repository_folder_path: Optional[str] = args.design_repository_folder
     spike_in_folder_path: Optional[str] = args.spike_in_folder
     ignore_ctf_set: Optional[Set[str]] = set(args.ignore_ctf) if args.ignore_ctf is not None else set()
+    pinned_ctf_set: Optional[Set[str]] = set(args.pin_ctf) if args.pin_ctf is not None else set()
     panel_info_file_path: Optional[str] = args.panel_info_file
     inventory_tracking_file_path: Optional[str] = args.inventory_tracking_file
     do_clean_ctf: bool = not args.no_ctf_clean
@@ -177,17 +230,39 @@ if __name__ == '__main__':
     do_generate_dbom: bool = not args.no_dbom
     do_generate_odoo_bom: bool = not args.no_odoo_bom
     do_generate_label_info: bool = not args.no_label_info
+    do_screen_primer_dimers: bool = not args.no_dimer_screen
+    do_calculate_panel_stats: bool = not args.no_panel_stats
+    primer_qc_spec: Optional[PrimerQCSpec] = PrimerQCSpec() if args.primer_qc else None
+    strict_gtf: bool = args.strict_gtf
+    bed_sort_buffer_size: Optional[int] = args.bed_sort_buffer
+    gtf_clean_workers: Optional[int] = args.gtf_clean_workers
+    stream_gtf_clean: bool = args.stream_gtf_clean
     do_build_bom: bool = do_generate_dbom or do_generate_odoo_bom
     logger: Logger = Logger(is_verbose=args.verbose)
     output_directory: str = args.output_dir
+    max_solver_cache_bytes: Optional[int] = args.solver_cache_mb * 1024 * 1024 if args.solver_cache_mb else None
 
     panel_info = load_panel_info(panel_info_file_path) if panel_info_file_path is not None else None
     ctf = load_ctf(ctf_file_path) if ctf_file_path is not None else None
-    gtf = load_gtf(gtf_file_path) if gtf_file_path is not None else None
-    bed = load_bed(bed_file_path) if bed_file_path is not None else None
-    ctf_repository = load_all_ctfs(design_repository_folder_path, ignore_ctf_set) if design_repository_folder_path is not None else None
-    spike_in_repository = load_all_ctfs(spike_in_folder_path, ignore_ctf_set) if spike_in_folder_path is not None else None
-    gtf_repository = load_all_gtfs(design_repository_folder_path) if design_repository_folder_path is not None else None
+    # when the GTF is cleaned streaming, its entries are read from the file by every step that needs them
+    if gtf_file_path is None:
+        gtf = None
+    elif stream_gtf_clean:
+        gtf = open_gtf(gtf_file_path, strict_gtf)
+    else:
+        gtf = load_gtf(gtf_file_path, strict_gtf)
+    bed = load_columnar_bed(bed_file_path) \
+        if bed_file_path is not None and bed_sort_buffer_size is None else None
+    # merged once for both panel file validation and GTF cleaning, out of core for coverage files too large to load
+    if bed is not None:
+        bed_targets = _get_bed_targets(bed) if gtf is not None else None
+    else:
+        bed_targets = sort_and_merge_bed_targets(bed_file_path, bed_sort_buffer_size) \
+            if bed_file_path is not None and bed_sort_buffer_size is not None else None
+    ctf_repository = load_all_ctfs(design_repository_folder_path) if design_repository_folder_path is not None else None
+    spike_in_repository = load_all_ctfs(spike_in_folder_path) if spike_in_folder_path is not None else None
+    gtf_repository = index_all_gtfs(design_repository_folder_path, strict_gtf) \
+        if design_repository_folder_path is not None else None
     inventory_tracking = load_inventory_tracking(inventory_tracking_file_path) if inventory_tracking_file_path is not None else None
     spike_in_ctfs = []
     catalog_gtfs = set()
@@ -199,18 +274,24 @@ if __name__ == '__main__':
         logger.warning(f"CTF ID ({ctf.id}) and Panel ID found inside {panel_info.file_path} ({panel_info.panel_id}) "
                        f"are not the same. Defaulting to {panel_info.panel_id} for creating filenames.")
 
+    validate_panel_files_step(logger, panel_info, ctf, gtf, bed, output_directory, bed_targets)
+
     if do_clean_ctf:
-        ctf = clean_ctf_step(logger, ctf, output_directory)
+        ctf = clean_ctf_step(logger, ctf, output_directory, primer_qc_spec)
 
     if do_calculate_volumes:
         gsp1_raw_materials, gsp2_raw_materials, spike_in_ctfs = \
             calculate_raw_material_volumes_step(logger, panel_info, ctf, ctf_repository, spike_in_repository,
-                                                output_directory)
+                                                output_directory, max_solver_cache_bytes, pinned_ctf_set,
+                                                ignore_ctf_set)
         # needed for GTF cleaning step
         for raw_material in gsp1_raw_materials:
             if raw_material.is_catalog_panel and raw_material.design_id is not None:
                 catalog_gtfs.add(gtf_repository[raw_material.design_id])
 
+        if do_screen_primer_dimers:
+            screen_primer_dimers_step(logger, panel_info, gsp1_raw_materials, spike_in_ctfs, ctf_repository,
+                                      output_directory)
 
         check_raw_material_inventory(logger, panel_info, gsp1_raw_materials, gsp2_raw_materials, inventory_tracking,
                                      output_directory)
@@ -219,7 +300,11 @@ if __name__ == '__main__':
         build_bom_step(logger, panel_info, do_generate_dbom, do_generate_odoo_bom, do_generate_label_info, output_directory)
 
     if do_clean_gtf:
-        gtf = clean_gtf_step(logger, panel_info, gtf, bed, catalog_gtfs, output_directory)
+        gtf = clean_gtf_step(logger, panel_info, gtf, bed, catalog_gtfs, output_directory, bed_targets,
+                             gtf_clean_workers, stream_gtf_clean, strict_gtf)
+
+    if do_calculate_panel_stats:
+        calculate_panel_stats_step(logger, panel_info, gtf, bed, output_directory)
 
     if do_generate_product_insert and panel_info.supplementary_module_reactions is None:
         product_insert = generate_product_insert_step(logger, panel_info, gtf, ctf, output_directory)
@@ -239,7 +324,7 @@ if __name__ == '__main__':
                 spike_in_ctf_path = os.path.join(output_directory, f"{panel_info.panel_id}_{ctf.id}.ctf")
                 ctf_gene_set = set()
                 for entry in ctf.primer_pairs:
-                    gene_name = entry.gsp1_name.split("_")[0]
+                    gene_name = entry.gsp1.gene
                     if gene_name not in ctf_gene_set:
                         ctf_gene_set.add(gene_name)
                         if gene_name not in gene_counts:
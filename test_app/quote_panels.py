@@ -0,0 +1,51 @@
+import argparse
+import sys
+
+from AMPPanelDesignLib.CTF import load_all_ctfs
+from AMPPanelDesignLib.Enums import WorkflowType, DiseaseType
+from GeneratePanelFilesLib.QuotePanels import find_candidate_ctfs, quote_ctfs, write_quote_results
+
+
+if __name__ == '__main__':
+    workflow_lookup = {workflow.value.config_name.casefold(): workflow for workflow in WorkflowType}
+    disease_lookup = {disease.value.casefold(): disease for disease in DiseaseType}
+
+    parser = argparse.ArgumentParser(description="Quotes the inventoried parts and spike-in pools needed for a batch of "
+                                                 "candidate CTFs without generating any panel files.")
+    parser.add_argument("-c", "--candidate-folder", required=True, type=str,
+                        help="Path to the folder containing the candidate CTF files.")
+    parser.add_argument("-r", "--design-repository-folder", required=True, type=str,
+                        help="Path to the folder containing CTF and GTF files for all inventoried designs.")
+    parser.add_argument("-s", "--spike-in-folder", required=False, type=str, default=None,
+                        help="Path to the folder containing CTF files for all inventoried spike-in designs.")
+    parser.add_argument("-w", "--workflow", required=True, type=str.casefold, choices=list(workflow_lookup),
+                        help="Workflow used for all candidates.")
+    parser.add_argument("-d", "--disease", required=False, type=str.casefold, default="solid tumor",
+                        choices=list(disease_lookup), help="Disease used for all candidates. Defaults to Solid Tumor.")
+    parser.add_argument("-i", "--ignore-ctf", action="append", required=False, type=str, default=None,
+                        help="Path to a CTF file (or a design ID) that will not be used as a raw material. "
+                             "Option can be used multiple times to ignore multiple CTFs.")
+    parser.add_argument("-j", "--jobs", required=False, type=int, default=None,
+                        help="OPTIONAL: Number of worker processes. Defaults to the number of CPUs.")
+    parser.add_argument("-o", "--output-file", required=False, type=str, default=None,
+                        help="OPTIONAL: Path to the output summary table. If no output file is provided, then the "
+                             "summary table will be written to STDOUT")
+    parser.add_argument("--no-ctf-clean", action='store_true',
+                        help="OPTIONAL: Disables CTF cleaning before quoting.")
+
+    args = parser.parse_args()
+
+    ctf_repository = load_all_ctfs(args.design_repository_folder)
+    spike_in_repository = load_all_ctfs(args.spike_in_folder) if args.spike_in_folder is not None else None
+    candidate_ctf_paths = find_candidate_ctfs(args.candidate_folder)
+    results = quote_ctfs(candidate_ctf_paths, workflow=workflow_lookup[args.workflow],
+                         disease=disease_lookup[args.disease], ctf_repository=ctf_repository,
+                         spike_in_repository=spike_in_repository,
+                         excluded_designs=set(args.ignore_ctf) if args.ignore_ctf is not None else None,
+                         do_clean_ctf=not args.no_ctf_clean, max_workers=args.jobs)
+
+    if args.output_file:
+        with open(args.output_file, "w") as sw:
+            write_quote_results(sw, results)
+    else:
+        write_quote_results(sys.stdout, results)
@@ -5,9 +5,11 @@ from PyQt5.QtCore import *
 from PyQt5.QtWidgets import QLineEdit, QListView
 from PyQt5.QtGui import QStandardItemModel, QStandardItem
 import sys
+from typing import List
 
 from dataclasses import dataclass, asdict
 import generate_panel_files
+from GeneratePanelFilesLib.PanelFileSession import PanelFileSession
 from datetime import datetime
 
 from office365.runtime.auth.user_credential import UserCredential
@@ -33,7 +35,11 @@ class RecipeOptionsInterface:
     disable_odoo_bom_file_gen: bool = None
     disable_label_info_file_gen: bool = None
     verbose_logging: bool = None
+    primer_qc: bool = False
+    gtf_clean_workers: int = 1
     output_dir: str = None
+    custom_pick_ctfs: List[str] = None
+    ctfs_to_ignore: List[str] = None
 
 @dataclass
 class WIOptionsInterface:
@@ -82,6 +88,8 @@ class FormLogic(baseUIWidget, baseUIClass):
         self.setupUi(self)
         self.ctx = self.connect_to_sharepoint()
         self.open_orders_url = "/sites/IDTArcherEngineering/Shared Documents/2_Open_Orders_Test"
+        # design repositories and solvers reused by the next recipe generation, e.g. after changing pinned CTFs
+        self.panel_file_session = PanelFileSession()
 
         # Recipe Gen Inputs
         self.recipe_gen_line_edits = [
@@ -208,6 +216,10 @@ class FormLogic(baseUIWidget, baseUIClass):
         disable_label_info_file_gen_val = self.check_box_disable_label_info_file_gen.isChecked()
         verbose_logging_val = self.check_box_verbose_logging.isChecked()
 
+        # List Views
+        custom_pick_ctfs_val = self.get_list_view_items(self.list_view_custom_pick_CTFS)
+        ctfs_to_ignore_val = self.get_list_view_items(self.list_view_CTFS_to_ignore)
+
         recipe_options = RecipeOptionsInterface(CTF_filepath=CTF_filepath_val,
                                                 GTF_filepath=GTF_filepath_val,
                                                 BED_filepath=BED_filepath_val,
@@ -222,15 +234,20 @@ class FormLogic(baseUIWidget, baseUIClass):
                                                 disable_odoo_bom_file_gen=disable_odoo_bom_file_gen_val,
                                                 disable_label_info_file_gen=disable_label_info_file_gen_val,
                                                 verbose_logging=verbose_logging_val,
-                                                output_dir=output_dir_val)
+                                                output_dir=output_dir_val,
+                                                custom_pick_ctfs=custom_pick_ctfs_val,
+                                                ctfs_to_ignore=ctfs_to_ignore_val)
 
-        generate_panel_files.load_arg_dict(recipe_options)
+        generate_panel_files.load_arg_dict(recipe_options, self.panel_file_session)
         # upload_file_to_sharepoint(file_to_upload = "C:\\Users\\mfields\\Desktop\\amp-panel-toolkit-python3-20230127\\requirements.txt", url = self.open_orders_url)
 
     # Converted to lambda
     # def clr_list_view(self, list_view):
     #     list_view.model.removeRows(0, list_view.model.rowCount())
 
+    def get_list_view_items(self, list_view):
+        return [list_view.model.item(row).text() for row in range(list_view.model.rowCount())]
+
     # Consider turning this into lambda or turning the lambda for clear all back into a function
     def remove_selected_item_from_list_view(self, list_view):
         print(list_view.selected_item)